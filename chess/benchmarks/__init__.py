@@ -0,0 +1,4 @@
+import os
+
+# Benchmarks build games outside the server, on its settings.
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "llm_chess_app.settings")
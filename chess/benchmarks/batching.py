@@ -0,0 +1,67 @@
+"""
+Throughput of cross-game micro-batching.
+
+Many games ask a fake model backend for moves at the same time. The backend
+serves ``--concurrency`` calls at once and a batch costs the same as a single
+prompt. Without batching every game queues for a slot; with the
+BatchScheduler the waiting prompts share one call. This models a backend
+with a real batch endpoint: the Ollama and OpenAI clients have none, which
+is why LLM_BATCHING is off by default.
+
+Usage (from the ``chess`` directory):
+    python -m benchmarks.batching --games 200 --plies 4 --latency 0.2
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import logging
+import time
+
+from llm_chess_app.ai_chess_app import Move, create_ai_chess_app
+from llm_chess_app.batching import BatchScheduler
+from llm_chess_app.fake_llm import FakeChessLLM
+
+
+async def run(games, plies, llm, batch_scheduler):
+    iterables = []
+    for _ in range(games):
+        chess_app = create_ai_chess_app(llm, None, batch_scheduler=batch_scheduler)
+        chess_app.comment = False
+        iterables.append(chess_app.get_iterable())
+
+    async def play(chess_iter):
+        for _ in range(plies):
+            await chess_iter.anext()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(play(chess_iter) for chess_iter in iterables))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--plies", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, default=2, help="calls the fake backend serves at once")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-wait", type=float, default=0.005)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    moves = args.games * args.plies
+    for batched in (False, True):
+        llm = FakeChessLLM(latency=args.latency, concurrency=args.concurrency)
+        scheduler = BatchScheduler(llm.with_structured_output(Move), args.batch_size, args.max_wait) if batched else None
+        with contextlib.redirect_stdout(io.StringIO()):
+            elapsed = asyncio.run(run(args.games, args.plies, llm, scheduler))
+        label = "batched" if batched else "unbatched"
+        print(f"{label:>9}: {moves} moves in {elapsed:.2f}s -> {moves / elapsed:.1f} moves/s")
+        if scheduler is not None:
+            stats = scheduler.stats()
+            print(f"           {stats['batches']} batches, mean size {stats['mean_batch_size']:.1f}, fill {stats['mean_fill']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Checkpoint size as a game grows.
+
+After every ply, serializes the latest checkpoint of a game and the
+equivalent state in the previous list-of-FENs layout (board_states, UCI
+moves, messages, comments). The sum over all plies is what a checkpointer
+keeping every step would store.
+
+Usage (from the ``chess`` directory):
+    python -m benchmarks.checkpoint_size --plies 200
+"""
+import argparse
+import contextlib
+import io
+import logging
+
+from llm_chess_app.ai_chess_app import ChessAgent, Chess, create_llm_ai_player, get_board_states, get_moves
+from llm_chess_app.checkpointer import BoundedMemorySaver
+from llm_chess_app.fake_llm import FakeChessLLM
+
+
+def legacy_state(state):
+    return {"turn": state["turn"], "winner": state["winner"], "user_input": state.get("user_input"),
+            "board_states": get_board_states(state), "moves": get_moves(state),
+            "messages": state["messages"], "comments": state["comments"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--plies", type=int, default=200)
+    parser.add_argument("--every", type=int, default=25)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    checkpointer = BoundedMemorySaver()
+    ai_player = create_llm_ai_player(ChessAgent(FakeChessLLM()))
+    chess_app = Chess(ai_player=ai_player, comment=False, max_moves=args.plies + 1)
+    chess_app.set_config({"configurable": {"thread_id": "size"}, "recursion_limit": 10 * args.plies})
+    chess_iter = chess_app.get_iterable(checkpointer=checkpointer)
+
+    total = legacy_total = 0
+    for ply in range(1, args.plies + 1):
+        with contextlib.redirect_stdout(io.StringIO()):
+            chess_iter.next()
+        checkpoint = checkpointer.get(chess_iter.config)
+        size = len(checkpointer.serde.dumps(checkpoint))
+        legacy_size = len(checkpointer.serde.dumps(legacy_state(checkpoint["channel_values"])))
+        total += size
+        legacy_total += legacy_size
+        if ply % args.every == 0:
+            print(f"ply {ply:4d}: checkpoint {size:7d} B (legacy layout {legacy_size:7d} B)")
+    print(f"all plies: {total / 1024:.0f} KiB (legacy layout {legacy_total / 1024:.0f} KiB)")
+
+
+if __name__ == "__main__":
+    main()
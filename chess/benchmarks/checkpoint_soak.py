@@ -0,0 +1,68 @@
+"""
+Soak test for the shared checkpointer.
+
+Plays short games back to back for ``--duration`` seconds and samples resident
+memory. Games are either released when they end, as ChessServer.disconnect
+does, or abandoned (``--abandon``) so that only LRU/TTL eviction reclaims
+them. RSS should level off after warm-up instead of climbing.
+
+Usage (from the ``chess`` directory):
+    python -m benchmarks.checkpoint_soak --duration 86400 --interval 600
+"""
+import argparse
+import contextlib
+import io
+import logging
+import resource
+import time
+
+from llm_chess_app.ai_chess_app import create_ai_chess_app
+from llm_chess_app.checkpointer import get_checkpointer
+from llm_chess_app.fake_llm import FakeChessLLM
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10
+
+
+def play_game(llm, plies, abandon):
+    chess_app = create_ai_chess_app(llm, None)
+    chess_app.comment = False
+    chess_iter = chess_app.get_iterable()
+    for _ in range(plies):
+        chess_iter.next()
+    if not abandon:
+        chess_iter.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--interval", type=float, default=5)
+    parser.add_argument("--plies", type=int, default=8)
+    parser.add_argument("--abandon", action="store_true", help="never release games, rely on eviction")
+    parser.add_argument("--max-threads", type=int, default=None)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    checkpointer = get_checkpointer()
+    if args.max_threads is not None:
+        checkpointer.max_threads = args.max_threads
+    llm = FakeChessLLM()
+    games = 0
+    start = next_sample = time.monotonic()
+    while time.monotonic() - start < args.duration:
+        with contextlib.redirect_stdout(io.StringIO()):
+            play_game(llm, args.plies, args.abandon)
+        games += 1
+        if time.monotonic() >= next_sample:
+            print(f"{time.monotonic() - start:8.0f}s games={games:7d} threads={len(checkpointer.last_access):6d} rss={rss_mb():8.1f}MB", flush=True)
+            next_sample += args.interval
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Load test for the async move pipeline.
+
+Plays many games concurrently on one event loop against a fake LLM with a
+fixed latency and reports how many AI moves per second the loop sustains.
+With blocking moves the wall time grows linearly with the number of games;
+with the async pipeline it stays close to ``plies * latency``.
+
+Usage (from the ``chess`` directory):
+    python -m benchmarks.concurrent_games --games 200 --plies 4 --latency 0.5
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from llm_chess_app.ai_chess_app import create_ai_chess_app
+from llm_chess_app.fake_llm import FakeChessLLM
+
+
+def new_game(llm, index):
+    config = {"configurable": {"thread_id": str(index)}, "recursion_limit": 500}
+    chess_app = create_ai_chess_app(llm, None, config=config)
+    chess_app.comment = False
+    return chess_app.get_iterable()
+
+
+async def play(chess_iter, plies):
+    for _ in range(plies):
+        await chess_iter.anext()
+
+
+def run_blocking(llm, games, plies):
+    iterables = [new_game(llm, i) for i in range(games)]
+    start = time.perf_counter()
+    for chess_iter in iterables:
+        for _ in range(plies):
+            chess_iter.next()
+    return time.perf_counter() - start
+
+
+async def run_async(llm, games, plies):
+    iterables = [new_game(llm, i) for i in range(games)]
+    start = time.perf_counter()
+    await asyncio.gather(*(play(chess_iter, plies) for chess_iter in iterables))
+    return time.perf_counter() - start
+
+
+def report(label, games, plies, elapsed):
+    moves = games * plies
+    print(f"{label:>8}: {games} games x {plies} plies in {elapsed:.2f}s -> {moves / elapsed:.1f} moves/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--plies", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.5, help="fake LLM latency in seconds")
+    parser.add_argument("--blocking-games", type=int, default=4, help="games for the blocking baseline")
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    llm = FakeChessLLM(latency=args.latency)
+    elapsed = run_blocking(llm, args.blocking_games, args.plies)
+    report("blocking", args.blocking_games, args.plies, elapsed)
+    elapsed = asyncio.run(run_async(llm, args.games, args.plies))
+    report("async", args.games, args.plies, elapsed)
+
+
+if __name__ == "__main__":
+    main()
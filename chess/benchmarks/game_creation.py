@@ -0,0 +1,62 @@
+"""
+Game-creation latency and allocations.
+
+Measures Chess construction plus get_iterable with the process-wide compiled
+graph, against building and compiling a fresh graph per game as was done
+before the cache.
+
+Usage (from the ``chess`` directory):
+    python -m benchmarks.game_creation --games 500
+"""
+import argparse
+import logging
+import time
+import tracemalloc
+
+from llm_chess_app.ai_chess_app import ChessAgent, Chess, build_workflow, create_llm_ai_player
+from llm_chess_app.checkpointer import get_checkpointer
+from llm_chess_app.fake_llm import FakeChessLLM
+
+
+def create_cached(ai_player):
+    chess_app = Chess(ai_player=ai_player)
+    return chess_app.get_iterable()
+
+
+def create_uncompiled(ai_player):
+    chess_app = Chess(ai_player=ai_player)
+    build_workflow().compile(checkpointer=get_checkpointer(), interrupt_before=["interruption_node"])
+    return chess_app.get_iterable()
+
+
+def measure(create, ai_player, games):
+    create(ai_player) # warm up
+    start = time.perf_counter()
+    for _ in range(games):
+        create(ai_player)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(10):
+        create(ai_player)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename") if stat.size_diff > 0)
+    return elapsed / games, allocated / 10
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=500)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    ai_player = create_llm_ai_player(ChessAgent(FakeChessLLM()))
+    for label, create in (("compile", create_uncompiled), ("cached", create_cached)):
+        latency, allocated = measure(create, ai_player, args.games)
+        print(f"{label:>8}: {1e6 * latency:9.1f} us/game, {allocated / 1024:8.1f} KiB retained/game")
+
+
+if __name__ == "__main__":
+    main()
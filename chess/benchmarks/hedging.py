@@ -0,0 +1,97 @@
+"""
+Tail latency of hedged move requests.
+
+Two simulated model backends answer with log-normal latencies and now and
+then stall, like a local Llama server swapping or a remote API queueing.
+Moves are requested from the primary alone, then through
+create_hedged_player with the adaptive delay, which asks the secondary as
+well when the primary is slower than its recent LLM_HEDGE_QUANTILE latency.
+Cost is the number of backend calls started per move.
+
+Usage (from the ``chess`` directory):
+    python -m benchmarks.hedging --moves 2000 --stall-rate 0.03
+"""
+import argparse
+import asyncio
+import functools
+import logging
+import random
+import statistics
+import time
+
+import chess
+
+from llm_chess_app.ai_chess_app import call_player_async, create_hedged_player
+from llm_chess_app.hedging import LatencyTracker, adaptive_delay
+from llm_chess_app.position import analyse
+
+
+def create_backend(median, sigma, stall_rate, stall, seed, calls):
+    rng = random.Random(seed)
+
+    def latency():
+        calls.append(1)
+        return stall if rng.random() < stall_rate else median * rng.lognormvariate(0, sigma)
+
+    def player(board):
+        time.sleep(latency())
+        return analyse(board).legal_moves[0].uci(), ""
+
+    async def aplay(board):
+        await asyncio.sleep(latency())
+        return analyse(board).legal_moves[0].uci(), ""
+
+    player.aplay = aplay
+    return player
+
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+async def run(player, moves, concurrency):
+    board = chess.Board()
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def move():
+        async with semaphore:
+            start = time.perf_counter()
+            await call_player_async(player, board)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(move() for _ in range(moves)))
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--moves", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64, help="moves requested at once")
+    parser.add_argument("--primary", type=float, default=0.1, help="median primary latency, seconds")
+    parser.add_argument("--secondary", type=float, default=0.15, help="median secondary latency, seconds")
+    parser.add_argument("--sigma", type=float, default=0.5, help="log-normal spread of the latencies")
+    parser.add_argument("--stall-rate", type=float, default=0.03, help="fraction of calls that stall")
+    parser.add_argument("--stall", type=float, default=3.0, help="seconds a stalled call takes")
+    parser.add_argument("--quantile", type=float, default=0.9, help="primary latency quantile used as the hedge delay")
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    for hedged in (False, True):
+        calls = []
+        backends = [("primary", create_backend(args.primary, args.sigma, args.stall_rate, args.stall, 1, calls),
+                     LatencyTracker()),
+                    ("secondary", create_backend(args.secondary, args.sigma, args.stall_rate, args.stall, 2, calls),
+                     LatencyTracker())]
+        player = backends[0][1]
+        if hedged:
+            player = create_hedged_player(backends, delay=functools.partial(adaptive_delay, quantile=args.quantile))
+        latencies = asyncio.run(run(player, args.moves, args.concurrency))
+        label = "hedged" if hedged else "primary"
+        print(f"{label:>8}: p50 {1000 * percentile(latencies, 50):7.1f} ms  "
+              f"p99 {1000 * percentile(latencies, 99):7.1f} ms  mean {1000 * statistics.fmean(latencies):7.1f} ms  "
+              f"{len(calls) / args.moves:.2f} calls/move")
+
+
+if __name__ == "__main__":
+    main()
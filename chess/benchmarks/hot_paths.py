@@ -0,0 +1,244 @@
+"""
+Micro-benchmarks of the game loop hot paths.
+
+Times Chess.make_move, the board_node termination checks, the chess work of a
+whole ply (board_node and player_node called directly, with an engine-like
+player replaying the recorded game, and with one that also builds the model
+prompt as an LLM player does), ChessIterable.next,
+game start-up (create_ai_chess_app + get_iterable) and full Chess.invoke
+self-play games, all against the deterministic FakeChessLLM so only framework
+overhead is measured. Every case reports the median wall time and the
+memory still allocated after the run, both per ply (per game for start-up),
+and the tracemalloc peak of the whole run.
+
+Results can be saved as JSON and compared against an earlier run; the script
+exits non-zero when a case got slower than the tolerance allows, which makes
+it usable as a CI gate.
+
+Usage (from the ``chess`` directory):
+    python -m benchmarks.hot_paths --plies 60 --repeat 7 --save baseline.json
+    python -m benchmarks.hot_paths --compare baseline.json --tolerance 0.25
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import chess
+
+from llm_chess_app.ai_chess_app import Chess, ChessAgent, create_ai_chess_app, create_llm_ai_player
+from llm_chess_app.fake_llm import FakeChessLLM
+from llm_chess_app.prompts import PromptBuilder
+
+
+def fake_player(seed=0):
+    return create_llm_ai_player(ChessAgent(FakeChessLLM(seed=seed)))
+
+
+def record_game(plies, seed=0):
+    """Return the UCI moves of a deterministic fake self-play game."""
+    player = fake_player(seed)
+    board = chess.Board()
+    moves = []
+    while len(moves) < plies and not board.is_game_over():
+        move, _ = player(board)
+        board.push_uci(move)
+        moves.append(move)
+    return moves
+
+
+def case_make_move(moves):
+    chess_app = Chess(ai_player=fake_player())
+
+    def setup():
+        chess_app.board = chess.Board()
+        return chess_app
+
+    def run(chess_app):
+        for move in moves:
+            chess_app.make_move(move)
+
+    return setup, run, len(moves)
+
+
+def case_board_node(moves):
+    chess_app = Chess(ai_player=fake_player(), comment=False)
+    positions = []
+    board = chess.Board()
+    for move in moves:
+        board.push_uci(move)
+        positions.append((board.copy(), {"turn": "white", "winner": "", "comments": [""], "messages": [("system", "")],
+                                         "board_state": board.fen()}))
+
+    def setup():
+        # Fresh boards, so no position analysed in an earlier run is reused.
+        return [(board.copy(), state) for board, state in positions]
+
+    def run(positions):
+        for board, state in positions:
+            chess_app.board = board
+            chess_app.board_node(state)
+
+    return setup, run, len(positions)
+
+
+def replay_player(moves, prompt_builder=None):
+    def player(board):
+        if prompt_builder is not None:
+            prompt_builder.build(board)
+        return moves[len(board.move_stack)], ""
+    return player
+
+
+def case_ply(moves, prompt_builder=None):
+    def setup():
+        chess_app = Chess(ai_player=replay_player(moves, prompt_builder), comment=False, max_moves=len(moves) + 1)
+        return chess_app, chess_app.initial_state(chess_app.board.fen())
+
+    def run(args):
+        chess_app, state = args
+        state = {**state, "user_input": None}
+        for _ in moves:
+            state.update(chess_app.board_node(state))
+            update = chess_app.player_node(state)
+            state.update({key: value for key, value in update.items() if key not in ("moves", "comments", "messages")})
+            state["messages"] = update["messages"]
+            state["comments"] = update["comments"]
+
+    return setup, run, len(moves)
+
+
+def case_ply_llm(moves):
+    return case_ply(moves, PromptBuilder())
+
+
+def case_iterable_next(moves):
+    plies = len(moves)
+
+    def setup():
+        chess_app = Chess(ai_player=fake_player(), comment=False, max_moves=plies + 1)
+        chess_app.set_config({"configurable": {"thread_id": "bench"}, "recursion_limit": 10 * plies})
+        chess_iter = chess_app.get_iterable()
+        chess_iter.release()
+        return chess_iter
+
+    def run(chess_iter):
+        for _ in range(plies):
+            chess_iter.next()
+        chess_iter.release()
+
+    return setup, run, plies
+
+
+def case_get_iterable(moves, games=50):
+    llm = FakeChessLLM()
+
+    def run(_):
+        for _ in range(games):
+            create_ai_chess_app(llm, None).get_iterable().release()
+
+    return lambda: None, run, games
+
+
+def case_self_play(moves):
+    plies = len(moves)
+
+    def setup():
+        chess_app = Chess(ai_player=fake_player(), comment=False, max_moves=plies - 1)
+        chess_app.set_config({"configurable": {"thread_id": "bench"}, "recursion_limit": 10 * plies})
+        return chess_app
+
+    def run(chess_app):
+        chess_app.invoke()
+
+    return setup, run, plies
+
+
+CASES = {
+    "make_move": (case_make_move, "ply"),
+    "board_node": (case_board_node, "ply"),
+    "ply": (case_ply, "ply"),
+    "ply_llm": (case_ply_llm, "ply"),
+    "iterable_next": (case_iterable_next, "ply"),
+    "get_iterable": (case_get_iterable, "game"),
+    "self_play": (case_self_play, "ply"),
+}
+
+
+def measure(setup, run, units, repeat):
+    run(setup()) # warm up
+    times = []
+    for _ in range(repeat):
+        arg = setup()
+        start = time.perf_counter()
+        run(arg)
+        times.append((time.perf_counter() - start) / units)
+
+    arg = setup()
+    tracemalloc.start()
+    run(arg)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": statistics.median(times), "retained_bytes": retained / units, "peak_bytes": peak}
+
+
+def run_cases(names, plies=60, repeat=7, report=None):
+    """Measure the named cases on a recorded game of ``plies`` plies and return their results by name."""
+    moves = record_game(plies)
+    results = {}
+    for name in names:
+        make_case, unit = CASES[name]
+        # board_node prints every position, keep the report readable.
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            setup, run, units = make_case(moves)
+            results[name] = {**measure(setup, run, units, repeat), "unit": unit}
+        result = results[name]
+        if report is not None:
+            report(f"{name:>14}: {1e6 * result['seconds']:9.1f} us/{unit:<4} "
+                   f"{result['retained_bytes'] / 1024:8.2f} KiB retained/{unit:<4} "
+                   f"{result['peak_bytes'] / 1024:8.1f} KiB peak")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    failed = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["seconds"] / baseline[name]["seconds"]
+        print(f"{name:>14}: {ratio:5.2f}x baseline")
+        if ratio > 1 + tolerance:
+            failed.append(name)
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--plies", type=int, default=60, help="plies of the recorded game each case replays")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=list(CASES))
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before failing")
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    results = run_cases(args.cases, args.plies, args.repeat, report=print)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            failed = compare(results, json.load(f), args.tolerance)
+        if failed:
+            print(f"slower than baseline by more than {args.tolerance:.0%}: {', '.join(failed)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Import-time budget of a server worker.
+
+Imports ``--module`` (the ASGI application by default) in fresh interpreters
+with ``-X importtime`` and reports the median total import time and the
+slowest top-level imports. Exits with status 1 when:
+- the median is over ``--budget-ms``, or
+- a model backend is imported at startup. Backends must only load when a game
+  first asks for that model type (see llm_chess_app/llm_clients.py).
+chessapi/tests.py runs the same checks as a test.
+
+Usage (from the ``chess`` directory):
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --budget-ms 1500 --runs 5 --top 15
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+# Modules only a game with the matching model may import.
+LAZY_MODULES = ("langchain_openai", "openai", "langchain_experimental", "langchain_community.chat_models",
+                "langchain.hub", "langchain.agents", "tiktoken")
+
+LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def measure(module):
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": "llm_chess_app.settings"}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            env=env, capture_output=True, text=True, check=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            imports.append((match.group(4), int(match.group(2)), len(match.group(3))))
+    return imports
+
+
+def run(module, runs=3):
+    """Return the median import time of module in ms and the imports of the last run."""
+    totals = []
+    for _ in range(runs):
+        imports = measure(module)
+        totals.append(next(us for name, us, depth in imports if name == module and depth == 1))
+    return statistics.median(totals) / 1000, imports
+
+
+def eager_backends(imports):
+    """The LAZY_MODULES among imports."""
+    return [prefix for prefix in LAZY_MODULES if any(name == prefix or name.startswith(prefix + ".")
+                                                     for name, _, _ in imports)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="llm_chess_app.asgi")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--budget-ms", type=float, default=1500.0)
+    parser.add_argument("--top", type=int, default=10, help="slowest direct imports to list")
+    args = parser.parse_args()
+
+    total_ms, imports = run(args.module, args.runs)
+
+    children = [(name, us) for name, us, depth in imports if depth == 3]
+    print(f"import {args.module}: {total_ms:.0f} ms median of {args.runs} (budget {args.budget_ms:.0f} ms)")
+    for name, us in sorted(children, key=lambda item: -item[1])[:args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    failed = False
+    eager = eager_backends(imports)
+    if eager:
+        print(f"model backends imported at startup: {', '.join(eager)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"over budget by {total_ms - args.budget_ms:.0f} ms")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
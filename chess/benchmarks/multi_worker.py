@@ -0,0 +1,198 @@
+"""
+Multi-worker check: one game played across several ChessServer processes.
+
+Starts ``--workers`` daphne processes that share a checkpoint file
+(CHESS_CHECKPOINT_PATH) and a channel layer file (CHESS_CHANNEL_LAYER_PATH)
+in a temporary directory. It then plays one game against the fake model. Every
+turn reconnects to the next worker in turn, resumes the game by id and makes a
+human move and an AI move, so consecutive turns are served by different
+processes. A watcher socket on the last worker follows the game and must see
+every move through the channel layer. The workers record the game in a
+database of their own, whose Game row must end at the last ply and position.
+
+Each reply is checked against a local board. The script exits with status 1
+if a worker lost the game, returned an illegal move, the watcher missed an
+update or the recorded game is not the one played. chessapi/tests.py runs
+it as a test.
+
+Usage (from the ``chess`` directory):
+    python -m benchmarks.multi_worker --workers 2 --turns 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+import chess
+
+from benchmarks.ws_load import wait_for_server
+
+LLM_CONFIG = {"model": "fake", "api_key": ""}
+CHESS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def worker_env(state_dir, latency):
+    return {**os.environ, "FAKE_LLM_LATENCY": str(latency), "DJANGO_SETTINGS_MODULE": "llm_chess_app.settings",
+            "CHESS_CHECKPOINT_PATH": os.path.join(state_dir, "checkpoints.sqlite3"),
+            "CHESS_CHANNEL_LAYER_PATH": os.path.join(state_dir, "channels.sqlite3"),
+            "CHESS_DATABASE_PATH": os.path.join(state_dir, "db.sqlite3")}
+
+
+def spawn_worker(port, state_dir, latency):
+    env = worker_env(state_dir, latency)
+    return subprocess.Popen([sys.executable, "-m", "daphne", "-b", "127.0.0.1", "-p", str(port), "llm_chess_app.asgi:application"],
+                            env=env, cwd=CHESS_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def receive(ws, kind, timeout=30):
+    while True:
+        message = await ws.receive(timeout=timeout)
+        if message.type != aiohttp.WSMsgType.TEXT:
+            raise ConnectionError(f"socket closed ({message.type.name})")
+        data = json.loads(message.data)
+        if data.get("message") == "error":
+            raise RuntimeError(f"server error: {data}")
+        if data.get("message") == kind:
+            return data
+
+
+async def play_move(ws, board, move):
+    await ws.send_str(json.dumps({"message": "next_move", "move": move}))
+    data = await receive(ws, "next_move_received")
+    played = chess.Move(chess.parse_square(data["move"]["from"]), chess.parse_square(data["move"]["to"]))
+    # Promotions come back without a piece; queen is what the server plays.
+    if chess.Move(played.from_square, played.to_square, chess.QUEEN) in board.legal_moves:
+        played.promotion = chess.QUEEN
+    if played not in board.legal_moves:
+        raise RuntimeError(f"illegal move {played} in {board.fen()}")
+    board.push(played)
+    if board.board_fen() != chess.Board(data["board_state"]).board_fen():
+        raise RuntimeError(f"worker diverged: expected {board.fen()}, got {data['board_state']}")
+    return played
+
+
+def resume_message(game):
+    return json.dumps({"message": "resume", "game_id": game["game_id"], "resume_token": game["resume_token"],
+                       "llm_config": LLM_CONFIG})
+
+
+async def watch(session, url, game, updates):
+    async with session.ws_connect(url) as ws:
+        await ws.send_str(resume_message(game))
+        await receive(ws, "game_resumed")
+        updates.append(None)
+        while True:
+            data = await receive(ws, "game_update", timeout=None)
+            updates.append(data["board_state"])
+
+
+async def play(args, urls):
+    rng = random.Random(args.seed)
+    board = chess.Board()
+    updates = []
+    async with aiohttp.ClientSession() as session:
+        async with session.ws_connect(urls[0]) as ws:
+            await ws.send_str(json.dumps({"message": "start", "llm_config": LLM_CONFIG, "board_state": "",
+                                          "options": {"white_player": "human", "black_player": "ai"}}))
+            game = await receive(ws, "game_started")
+        game_id = game["game_id"]
+        print(f"game {game_id} started on {urls[0]}")
+        watcher = asyncio.ensure_future(watch(session, urls[-1], game, updates))
+        while not updates:
+            await asyncio.sleep(0.05)
+
+        moves = 0
+        try:
+            for turn in range(args.turns):
+                if board.is_game_over():
+                    break
+                url = urls[(turn + 1) % len(urls)]
+                start = time.perf_counter()
+                async with session.ws_connect(url) as ws:
+                    await ws.send_str(resume_message(game))
+                    resumed = await receive(ws, "game_resumed")
+                    if resumed["board_state"] != board.fen():
+                        raise RuntimeError(f"{url} resumed at {resumed['board_state']}, expected {board.fen()}")
+                    move = rng.choice(list(board.legal_moves))
+                    played = [await play_move(ws, board, {"from": chess.SQUARE_NAMES[move.from_square],
+                                                          "to": chess.SQUARE_NAMES[move.to_square]})]
+                    if not board.is_game_over():
+                        played.append(await play_move(ws, board, {"from": "", "to": ""}))
+                moves += len(played)
+                print(f"turn {turn + 1:3d} on {url}: {' '.join(move.uci() for move in played):<10} "
+                      f"{1000 * (time.perf_counter() - start):7.1f} ms")
+
+            deadline = time.monotonic() + 5
+            while len(updates) - 1 < moves and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+        finally:
+            watcher.cancel()
+    seen = len(updates) - 1
+    print(f"{moves} moves over {len(urls)} workers, final position {board.fen()}")
+    print(f"watcher on {urls[-1]} saw {seen}/{moves} moves")
+    return game_id, board, seen == moves and (not updates[1:] or updates[-1] == board.fen())
+
+
+async def recorded_game(database, game_id, plies, timeout=5.0):
+    """
+    The (ply_count, board_state) recorded for game_id once it reached plies
+    and every worker had time to write what it still held, or at the timeout.
+    """
+    def read():
+        with sqlite3.connect(database) as conn:
+            return conn.execute("SELECT ply_count, board_state FROM chessapi_game WHERE id = ?", (game_id,)).fetchone()
+
+    deadline = time.monotonic() + timeout
+    row = read()
+    while (row is None or row[0] < plies) and time.monotonic() < deadline:
+        # Workers write moves behind, every GAME_RECORDER_FLUSH_INTERVAL.
+        await asyncio.sleep(0.1)
+        row = read()
+    # A slower worker flushing an older batch must not move the game back.
+    await asyncio.sleep(1.0)
+    return read()
+
+
+async def run(args, ports=None):
+    """Play the game and return whether every check passed."""
+    state_dir = tempfile.mkdtemp(prefix="chess-workers-")
+    # Games are recorded by every worker, so the database must exist first.
+    subprocess.run([sys.executable, "manage.py", "migrate", "--verbosity", "0"], check=True,
+                   env=worker_env(state_dir, args.latency), cwd=CHESS_DIR)
+    ports = ports or [args.port + i for i in range(args.workers)]
+    workers = [spawn_worker(port, state_dir, args.latency) for port in ports]
+    urls = [f"ws://127.0.0.1:{port}/chess/" for port in ports]
+    try:
+        for url in urls:
+            await wait_for_server(url)
+        game_id, board, ok = await play(args, urls)
+        row = await recorded_game(os.path.join(state_dir, "db.sqlite3"), game_id, board.ply())
+        print(f"recorded game: {row[0] if row else 'missing'} plies, {row[1] if row else ''}")
+        return ok and row == (board.ply(), board.fen())
+    finally:
+        for worker in workers:
+            worker.terminate()
+            worker.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--turns", type=int, default=10, help="human/AI move pairs, each on the next worker")
+    parser.add_argument("--port", type=int, default=8770, help="port of the first worker")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake model latency in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if not asyncio.run(run(args)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Prompt size per move for each prompt builder.
+
+Plays ``--games`` seeded random self-play games and builds the prompt of every
+position they reach with the legacy prompt, the compact prompt, and the compact
+prompt with a ``--history`` window of recent moves. For each builder it reports:
+- the tokens per prompt (p50, mean and max),
+- how many of them are the fixed instructions every prompt starts with,
+- the time to build one prompt.
+
+Tokens are counted with tiktoken's cl100k_base encoding when it can be
+loaded, and estimated at four characters per token otherwise.
+
+Prompt size says nothing about strength; compare that on real models with
+the tournament harness, e.g.
+    python manage.py tournament llm:model=ollama-llama3.1,prompt=legacy llm:model=ollama-llama3.1 --games 20
+
+Usage (from the ``chess`` directory):
+    python -m benchmarks.prompt_tokens --games 20 --history 8
+"""
+import argparse
+import logging
+import random
+import statistics
+import time
+
+import chess
+
+from llm_chess_app.metrics import estimate_tokens
+from llm_chess_app.prompts import LegacyPromptBuilder, PromptBuilder
+
+
+def get_counter():
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return estimate_tokens, "estimated"
+    return (lambda text: len(encoding.encode(text))), "cl100k_base"
+
+
+def positions(games, max_plies, seed):
+    rng = random.Random(seed)
+    for _ in range(games):
+        board = chess.Board()
+        while not board.is_game_over() and len(board.move_stack) < max_plies:
+            yield board
+            board.push(rng.choice(list(board.legal_moves)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--max-plies", type=int, default=120)
+    parser.add_argument("--history", type=int, default=8, help="recent plies in the windowed compact prompt")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    count, method = get_counter()
+    builders = {"legacy": LegacyPromptBuilder(), "compact": PromptBuilder(),
+                f"compact+{args.history}": PromptBuilder(history=args.history)}
+    tokens = {name: [] for name in builders}
+    seconds = {name: 0.0 for name in builders}
+    for board in positions(args.games, args.max_plies, args.seed):
+        for name, builder in builders.items():
+            start = time.perf_counter()
+            prompt = builder.build(board)
+            seconds[name] += time.perf_counter() - start
+            tokens[name].append(count(prompt))
+
+    print(f"{len(tokens['legacy'])} positions, tokens {method}")
+    print(f"{'prompt':<12} {'p50':>6} {'mean':>7} {'max':>6} {'prefix':>7} {'build':>9}")
+    for name, builder in builders.items():
+        values = tokens[name]
+        print(f"{name:<12} {statistics.median(values):6.0f} {statistics.fmean(values):7.1f} {max(values):6d} "
+              f"{count(builder.prefix) if builder.prefix else 0:7d} {1e6 * seconds[name] / len(values):7.1f}us")
+
+
+if __name__ == "__main__":
+    main()
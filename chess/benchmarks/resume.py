@@ -0,0 +1,62 @@
+"""
+Per-move overhead of ChessIterable.next as a game grows.
+
+ChessIterable resumes from the interrupt checkpoint, so the time per move
+should stay flat from the opening to the endgame. The fake LLM answers
+instantly, so the numbers are pure framework overhead.
+
+Usage (from the ``chess`` directory):
+    python -m benchmarks.resume --plies 120 --bucket 20
+"""
+import argparse
+import contextlib
+import io
+import logging
+import time
+
+from llm_chess_app.ai_chess_app import ChessAgent, Chess, create_llm_ai_player
+from llm_chess_app.fake_llm import FakeChessLLM
+
+
+def new_game(plies):
+    ai_player = create_llm_ai_player(ChessAgent(FakeChessLLM()))
+    chess_app = Chess(ai_player=ai_player, comment=False, max_moves=plies + 1)
+    chess_app.set_config({"configurable": {"thread_id": "bench"}, "recursion_limit": 10 * plies})
+    return chess_app.get_iterable()
+
+
+def per_move_times(step, plies):
+    chess_iter = new_game(plies)
+    times = []
+    for _ in range(plies):
+        start = time.perf_counter()
+        result = step(chess_iter)
+        times.append(time.perf_counter() - start)
+        if result is None:
+            break
+    return times
+
+
+def report(label, times, bucket):
+    cells = []
+    for i in range(0, len(times), bucket):
+        chunk = times[i:i + bucket]
+        cells.append(f"{1000 * sum(chunk) / len(chunk):6.2f}")
+    print(f"{label:>12}: " + " ".join(cells) + "  (ms/move per bucket)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--plies", type=int, default=120)
+    parser.add_argument("--bucket", type=int, default=20)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        incremental = per_move_times(lambda chess_iter: chess_iter.next(), args.plies)
+    report("incremental", incremental, args.bucket)
+    print(f"total: {sum(incremental):.2f}s for {len(incremental)} plies")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Websocket load generator and capacity test for ChessServer.
+
+Opens ``--clients`` simulated players against the ``chess/`` route. Each one
+starts a game with the fake model, then alternates a random human move with
+a request for the AI reply, waiting an exponentially distributed think time
+(mean ``--think`` seconds) before every human move. Connections are spread
+over ``--ramp`` seconds.
+
+With ``--ponder`` the games ask the server to ponder, and ``--predictable``
+is the share of human moves taken from the likely replies the server ponders
+(the rest stay random), so the AI move latency shows what pondering saves.
+
+Reports p50/p99 latency of human and AI moves, completed moves per second,
+the error rate (failed connects, timeouts, dropped sockets) and the server's
+resident memory, sampled from /proc while the test runs.
+
+With ``--spawn`` the script starts daphne on ``llm_chess_app.asgi`` itself with
+FAKE_LLM_LATENCY set; otherwise point ``--url`` at a server started with
+FAKE_LLM_LATENCY and give ``--server-pid`` to sample its memory.
+
+Usage (from the ``chess`` directory):
+    python -m benchmarks.ws_load --spawn --clients 1000 --moves 10 --latency 0.5 --think 1
+    python -m benchmarks.ws_load --url ws://127.0.0.1:8000/chess/ --server-pid 1234
+    python -m benchmarks.ws_load --spawn --clients 50 --latency 1 --think 2 --ponder --predictable 0.7
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+import aiohttp
+import chess
+
+from llm_chess_app.ponder import likely_replies
+
+
+def rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/statm") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() / 2 ** 20
+    except (OSError, TypeError):
+        return None
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = {"human": [], "ai": []}
+        self.errors = {}
+        self.games = 0
+        self.rss = []
+
+    def error(self, kind):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+
+async def client(session, url, index, args, stats):
+    rng = random.Random(index)
+    await asyncio.sleep(rng.uniform(0, args.ramp))
+    try:
+        async with session.ws_connect(url, timeout=args.timeout, max_msg_size=0) as ws:
+            board = chess.Board()
+            await start_game(ws, board, args)
+            stats.games += 1
+            for _ in range(args.moves):
+                if board.is_game_over():
+                    await start_game(ws, board, args)
+                    stats.games += 1
+                await asyncio.sleep(rng.expovariate(1 / args.think) if args.think else 0)
+                if rng.random() < args.predictable:
+                    move = rng.choice(likely_replies(board, args.ponder_width))
+                else:
+                    move = rng.choice(list(board.legal_moves))
+                await request_move(ws, board, {"from": chess.SQUARE_NAMES[move.from_square],
+                                               "to": chess.SQUARE_NAMES[move.to_square]}, "human", args, stats)
+                if not board.is_game_over():
+                    await request_move(ws, board, {"from": "", "to": ""}, "ai", args, stats)
+    except asyncio.TimeoutError:
+        stats.error("timeout")
+    except (aiohttp.ClientError, ConnectionError, RuntimeError) as e:
+        stats.error(type(e).__name__)
+
+
+async def start_game(ws, board, args):
+    board.reset()
+    await ws.send_str(json.dumps({"message": "start", "ponder": args.ponder, "llm_config": {"model": "fake", "api_key": ""},
+                                  "options": {"white_player": "human", "black_player": "ai"}, "board_state": ""}))
+
+
+async def request_move(ws, board, move, kind, args, stats):
+    start = time.perf_counter()
+    await ws.send_str(json.dumps({"message": "next_move", "move": move}))
+    while True:
+        message = await ws.receive(timeout=args.timeout)
+        if message.type != aiohttp.WSMsgType.TEXT:
+            raise ConnectionError(f"socket closed ({message.type.name})")
+        data = json.loads(message.data)
+        if data.get("message") == "next_move_received":
+            break
+    stats.latencies[kind].append(time.perf_counter() - start)
+    board.set_fen(data["board_state"])
+
+
+async def sample_memory(pid, stats, interval=1.0):
+    while True:
+        rss = rss_mb(pid)
+        if rss is not None:
+            stats.rss.append(rss)
+        await asyncio.sleep(interval)
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1] if len(values) > 1 else values[0]
+
+
+def report(stats, clients, elapsed):
+    moves = sum(len(values) for values in stats.latencies.values())
+    errors = sum(stats.errors.values())
+    print(f"{clients} clients, {stats.games} games, {moves} moves in {elapsed:.1f}s -> {moves / elapsed:.1f} moves/s")
+    for kind, values in stats.latencies.items():
+        print(f"{kind:>6} move latency: p50 {1000 * percentile(values, 50):8.1f} ms  "
+              f"p99 {1000 * percentile(values, 99):8.1f} ms  ({len(values)} moves)")
+    print(f"errors: {errors}/{clients} clients ({errors / clients:.1%}) {stats.errors or ''}")
+    if stats.rss:
+        print(f"server rss: start {stats.rss[0]:.1f}MB  peak {max(stats.rss):.1f}MB  end {stats.rss[-1]:.1f}MB")
+
+
+def spawn_server(port, latency):
+    env = {**os.environ, "FAKE_LLM_LATENCY": str(latency), "DJANGO_SETTINGS_MODULE": "llm_chess_app.settings"}
+    server = subprocess.Popen([sys.executable, "-m", "daphne", "-b", "127.0.0.1", "-p", str(port), "llm_chess_app.asgi:application"],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return server
+
+
+async def wait_for_server(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.ws_connect(url):
+                    return
+            except aiohttp.ClientError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.2)
+
+
+async def run(args):
+    server = None
+    pid = args.server_pid
+    if args.spawn:
+        server = spawn_server(args.port, args.latency)
+        pid = server.pid
+        args.url = f"ws://127.0.0.1:{args.port}/chess/"
+    try:
+        await wait_for_server(args.url)
+        stats = Stats()
+        sampler = asyncio.ensure_future(sample_memory(pid, stats)) if pid else None
+        connector = aiohttp.TCPConnector(limit=0)
+        start = time.perf_counter()
+        async with aiohttp.ClientSession(connector=connector) as session:
+            await asyncio.gather(*(client(session, args.url, i, args, stats) for i in range(args.clients)))
+        elapsed = time.perf_counter() - start
+        if sampler is not None:
+            stats.rss.append(rss_mb(pid))
+            sampler.cancel()
+        report(stats, args.clients, elapsed)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="ws://127.0.0.1:8000/chess/")
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--moves", type=int, default=10, help="human/AI move pairs per client")
+    parser.add_argument("--think", type=float, default=1.0, help="mean human think time in seconds")
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which clients connect")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for any reply")
+    parser.add_argument("--spawn", action="store_true", help="start a daphne server for the test")
+    parser.add_argument("--port", type=int, default=8765, help="port of the spawned server")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake model latency of the spawned server")
+    parser.add_argument("--server-pid", type=int, help="pid of an external server to sample memory from")
+    parser.add_argument("--ponder", action="store_true", help="ask the server to ponder on the human's time")
+    parser.add_argument("--predictable", type=float, default=0.0,
+                        help="share of human moves picked from the likely replies instead of at random")
+    parser.add_argument("--ponder-width", type=int, default=3, help="the server's PONDER_WIDTH")
+    args = parser.parse_args()
+    # Thousands of sockets need more than the default 1024 descriptors.
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from llm_chess_app.opening_book import build_book
+
+
+class Command(BaseCommand):
+    help = "Build a Polyglot opening book from one or more PGN files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("pgn", nargs="+", help="PGN files to read")
+        parser.add_argument("--output", required=True, help="path of the .bin book to write")
+        parser.add_argument("--max-ply", type=int, default=16)
+        parser.add_argument("--min-count", type=int, default=1)
+
+    def handle(self, *args, **options):
+        games, entries = build_book(options["pgn"], options["output"], max_ply=options["max_ply"], min_count=options["min_count"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {entries} entries from {games} games to {options['output']}"))
@@ -0,0 +1,78 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from llm_chess_app.evaluation import Evaluation, summary
+from llm_chess_app.tournament import parse_player_spec
+
+
+class Command(BaseCommand):
+    help = ("Score players' moves against the engine on positions sampled from a PGN file of any size: "
+            "average centipawn loss, blunder rate and illegal-move rate per player. Results are written per "
+            "chunk of games to the output directory; rerun the same command to resume an interrupted run.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("pgn", help="PGN file to sample positions from")
+        parser.add_argument("players", nargs="+", help="player specs as for the tournament command")
+        parser.add_argument("--output", required=True, help="directory of the results and the resume checkpoint")
+        parser.add_argument("--workers", type=int, default=None,
+                            help="worker processes (default: one per CPU, 0: evaluate in this process)")
+        parser.add_argument("--concurrency", type=int, default=8, help="positions in flight per worker")
+        parser.add_argument("--sample-rate", type=float, default=0.1, help="fraction of the positions to evaluate")
+        parser.add_argument("--min-ply", type=int, default=8, help="skip the opening plies")
+        parser.add_argument("--max-per-game", type=int, default=10, help="positions sampled per game at most")
+        parser.add_argument("--chunk-games", type=int, default=200, help="games per chunk, the unit of resumption")
+        parser.add_argument("--blunder-cp", type=int, default=300, help="centipawn loss counted as a blunder")
+        parser.add_argument("--engine", default=settings.STOCKFISH_PATH, help="UCI engine scoring the moves")
+        parser.add_argument("--engine-limit", type=json.loads, default=settings.ENGINE_LIMIT,
+                            help='search limit of every evaluation as JSON, e.g. \'{"depth": 12}\'')
+        parser.add_argument("--engine-processes", type=int, default=1, help="engine processes per worker")
+        parser.add_argument("--format", choices=("parquet", "csv"), help="parquet when pyarrow is installed, else csv")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            players = [parse_player_spec(spec) for spec in options["players"]]
+        except ValueError as e:
+            raise CommandError(e)
+        names = [player["name"] for player in players]
+        if len(set(names)) != len(names):
+            raise CommandError("give players distinct names (use name=... to tell them apart)")
+        if options["format"] == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise CommandError("--format parquet needs pyarrow: pip install pyarrow")
+
+        try:
+            evaluation = Evaluation(options["pgn"], options["output"], players, options["engine"],
+                                    options["engine_limit"],
+                                    sample_rate=options["sample_rate"], min_ply=options["min_ply"],
+                                    max_per_game=options["max_per_game"], games_per_chunk=options["chunk_games"],
+                                    blunder_cp=options["blunder_cp"], seed=options["seed"],
+                                    concurrency=options["concurrency"], engine_processes=options["engine_processes"],
+                                    file_format=options["format"])
+        except OSError as e:
+            raise CommandError(e)
+
+        def progress(entry, resumed):
+            if options["verbosity"] >= 1:
+                positions = max((stats["positions"] for stats in entry["stats"].values()), default=0)
+                self.stdout.write(f"chunk {entry['chunk']}: {positions} positions"
+                                  + (" (done in an earlier run)" if resumed else ""))
+
+        try:
+            total, chunks, elapsed = evaluation.run(workers=options["workers"], on_chunk=progress)
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+
+        positions = sum(stats["positions"] for stats in total.values())
+        self.stdout.write(f"\n{chunks} chunks evaluated in {elapsed:.1f}s, {positions} moves scored in total")
+        self.stdout.write(f"\n{'player':<32} {'positions':>9} {'acpl':>7} {'blunder':>8} {'illegal':>8} "
+                          f"{'best':>6} {'human':>6} {'errors':>6} {'sec/move':>8}")
+        for row in summary(total):
+            self.stdout.write(f"{row['player']:<32} {row['positions']:>9} {row['acpl']:>7.1f} "
+                              f"{row['blunder_rate']:>8.1%} {row['illegal_rate']:>8.1%} {row['best_rate']:>6.1%} "
+                              f"{row['played_rate']:>6.1%} {row['errors']:>6} {row['seconds']:>8.3f}")
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
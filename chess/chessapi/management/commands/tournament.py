@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from llm_chess_app.tournament import parse_player_spec, run_tournament, schedule, standings
+
+
+class Command(BaseCommand):
+    help = ("Play a headless round-robin tournament between players such as random, "
+            "stockfish:skill=3,depth=8, llm:model=ollama-llama3.1,prompt=legacy or fake:latency=0.1, "
+            "write the games to PGN and print Elo-style standings.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("players", nargs="+", help="player specs, at least two")
+        parser.add_argument("--games", type=int, default=2, help="games per pair, colors alternate")
+        parser.add_argument("--workers", type=int, default=None,
+                            help="worker processes (default: one per CPU, 0: play in this process)")
+        parser.add_argument("--max-plies", type=int, default=200, help="adjudicate a draw after this many plies")
+        parser.add_argument("--pgn", help="PGN file the games are appended to as they finish")
+        parser.add_argument("--fen", help="start every game from this position")
+        parser.add_argument("--book", default=settings.OPENING_BOOK_PATH, help="Polyglot book in front of every player")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            players = [parse_player_spec(spec) for spec in options["players"]]
+        except ValueError as e:
+            raise CommandError(e)
+        names = [player["name"] for player in players]
+        if len(players) < 2 or len(set(names)) != len(names):
+            raise CommandError("give at least two players with distinct names (use name=... to tell them apart)")
+
+        tasks = schedule(players, options["games"], options["max_plies"], start_fen=options["fen"],
+                         seed=options["seed"], book_path=options["book"], engine_path=settings.STOCKFISH_PATH,
+                         engine_limit=settings.ENGINE_LIMIT)
+        done = iter(range(1, len(tasks) + 1))
+
+        def progress(result):
+            if options["verbosity"] >= 1:
+                self.stdout.write(f"[{next(done)}/{len(tasks)}] {result['white']} - {result['black']} "
+                                  f"{result['result']} ({result['plies']} plies, {result['elapsed']:.1f}s)")
+
+        results, elapsed = run_tournament(tasks, workers=options["workers"], pgn_path=options["pgn"], on_result=progress)
+
+        plies = sum(result["plies"] for result in results)
+        self.stdout.write(f"\n{len(results)} games, {plies} plies in {elapsed:.1f}s: "
+                          f"{len(results) / elapsed * 60:.1f} games/min, {plies / elapsed:.1f} plies/s")
+        self.stdout.write(f"\n{'player':<32} {'elo':>6} {'games':>6} {'+':>4} {'=':>4} {'-':>4} {'score':>7}")
+        for row in standings(results):
+            self.stdout.write(f"{row['name']:<32} {row['elo']:>6.0f} {row['games']:>6} {row['wins']:>4} "
+                              f"{row['draws']:>4} {row['losses']:>4} {row['score'] / row['games']:>6.1%}")
+        if options["pgn"]:
+            self.stdout.write(self.style.SUCCESS(f"Games written to {options['pgn']}"))
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.13 on 2026-10-18 06:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Game',
+            fields=[
+                ('id', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('player', models.CharField(blank=True, default='', help_text='name the client plays under', max_length=64)),
+                ('white_player', models.CharField(default='human', max_length=16)),
+                ('black_player', models.CharField(default='ai', max_length=16)),
+                ('model', models.CharField(max_length=64)),
+                ('start_fen', models.CharField(max_length=100)),
+                ('board_state', models.CharField(max_length=100)),
+                ('ply_count', models.PositiveIntegerField(default=0)),
+                ('result', models.CharField(blank=True, default='', max_length=7)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Move',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ply', models.PositiveIntegerField()),
+                ('uci', models.CharField(max_length=5)),
+                ('comment', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='moves', to='chessapi.game')),
+            ],
+            options={
+                'ordering': ['game', 'ply'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['-created_at', '-id'], name='game_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['player', '-created_at'], name='game_player_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['model', '-created_at'], name='game_model_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='move',
+            constraint=models.UniqueConstraint(fields=('game', 'ply'), name='move_game_ply_unique'),
+        ),
+    ]
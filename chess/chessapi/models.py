@@ -1,3 +1,43 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class Game(models.Model):
+    """A game played through ChessServer. The id is the game's first checkpoint thread id."""
+    id = models.CharField(primary_key=True, max_length=64)
+    player = models.CharField(max_length=64, blank=True, default='', help_text="name the client plays under")
+    white_player = models.CharField(max_length=16, default='human')
+    black_player = models.CharField(max_length=16, default='ai')
+    model = models.CharField(max_length=64)
+    start_fen = models.CharField(max_length=100)
+    board_state = models.CharField(max_length=100)
+    ply_count = models.PositiveIntegerField(default=0)
+    result = models.CharField(max_length=7, blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='game_created_idx'),
+            models.Index(fields=['player', '-created_at'], name='game_player_created_idx'),
+            models.Index(fields=['model', '-created_at'], name='game_model_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.id} ({self.model}, {self.result or 'in progress'})"
+
+
+class Move(models.Model):
+    game = models.ForeignKey(Game, related_name='moves', on_delete=models.CASCADE)
+    ply = models.PositiveIntegerField()
+    uci = models.CharField(max_length=5)
+    comment = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['game', 'ply']
+        constraints = [models.UniqueConstraint(fields=['game', 'ply'], name='move_game_ply_unique')]
+
+    def __str__(self):
+        return f"{self.game_id} #{self.ply} {self.uci}"
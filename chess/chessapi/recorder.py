@@ -0,0 +1,149 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import Game, Move
+
+_STOP = object()
+
+
+class GameRecorder:
+    """
+    Write-behind persistence of games and moves.
+
+    ChessServer hands events to ``game_started`` and ``move_made``, which only
+    put them on a queue, so the websocket path never waits on the database. A
+    background thread drains the queue and writes each batch (up to
+    ``batch_size`` events or ``flush_interval`` seconds' worth) in one
+    transaction: ``bulk_create`` for games and moves and, per game, an update
+    that only ever moves its ply count forward, whichever worker writes
+    last. Events still queued when a worker dies are lost; everything older
+    than ``flush_interval`` is on disk.
+
+    Args:
+        batch_size (int): Most events written per transaction.
+        flush_interval (float): Longest an event waits in the queue.
+        max_queue (int): Events held before new ones are dropped.
+    """
+
+    def __init__(self, batch_size=200, flush_interval=0.5, max_queue=100000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(max_queue)
+        self.thread = None
+        self.lock = threading.Lock()
+        self.dropped = 0
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="game-recorder", daemon=True)
+                self.thread.start()
+                atexit.register(self.close)
+
+    def submit(self, event):
+        self.start()
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            logging.error("game recorder queue is full, dropping an event.")
+
+    def game_started(self, game_id, model, start_fen, player='', white_player='human', black_player='ai'):
+        now = timezone.now()
+        # Client-supplied labels, cut to the column sizes.
+        self.submit(("game", game_id, {"model": str(model)[:64], "start_fen": start_fen, "board_state": start_fen,
+                                       "player": str(player)[:64], "white_player": str(white_player)[:16],
+                                       "black_player": str(black_player)[:16], "created_at": now,
+                                       "updated_at": now}))
+
+    def move_made(self, game_id, ply, uci, comment, board_state, result=''):
+        self.submit(("move", game_id, {"ply": ply, "uci": uci, "comment": comment, "board_state": board_state,
+                                       "result": result, "created_at": timezone.now()}))
+
+    def run(self):
+        while True:
+            event = self.queue.get()
+            batch = [event]
+            deadline = time.monotonic() + self.flush_interval
+            while event is not _STOP and len(batch) < self.batch_size:
+                try:
+                    event = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                batch.append(event)
+            events = [event for event in batch if event is not _STOP]
+            try:
+                if events:
+                    self.write(events)
+            except Exception:
+                logging.exception("failed to write %d game events.", len(events))
+            finally:
+                close_old_connections()
+                for _ in batch:
+                    self.queue.task_done()
+            if len(events) < len(batch):
+                return
+
+    def write(self, events):
+        new_games = {}
+        updates = {}
+        moves = []
+        for kind, game_id, fields in events:
+            if kind == "game":
+                new_games[game_id] = Game(id=game_id, **fields)
+                continue
+            moves.append(Move(game_id=game_id, ply=fields["ply"], uci=fields["uci"], comment=fields["comment"],
+                              created_at=fields["created_at"]))
+            state = {"board_state": fields["board_state"], "ply_count": fields["ply"], "result": fields["result"],
+                     "updated_at": fields["created_at"]}
+            if game_id in new_games:
+                if fields["ply"] > new_games[game_id].ply_count:
+                    for name, value in state.items():
+                        setattr(new_games[game_id], name, value)
+            elif fields["ply"] > updates.get(game_id, {}).get("ply_count", -1):
+                updates[game_id] = state
+
+        with transaction.atomic():
+            Game.objects.bulk_create(new_games.values(), ignore_conflicts=True)
+            for game_id, state in updates.items():
+                # Another worker or an older batch may have written a later ply already: never go back.
+                Game.objects.filter(id=game_id, ply_count__lt=state["ply_count"]).update(**state)
+            Move.objects.bulk_create(moves, ignore_conflicts=True)
+
+    def flush(self):
+        """Block until every event submitted so far is written."""
+        if self.thread is not None:
+            self.queue.join()
+
+    def close(self):
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is not None and thread.is_alive():
+            self.queue.put(_STOP)
+            thread.join()
+
+
+def load_game(game_id):
+    """Return a persisted game and its moves in order, or (None, [])."""
+    game = Game.objects.filter(id=game_id).first()
+    if game is None:
+        return None, []
+    return game, list(game.moves.order_by('ply'))
+
+
+_recorder = None
+
+
+def get_game_recorder():
+    global _recorder
+    if _recorder is None and settings.GAME_RECORDING:
+        _recorder = GameRecorder(batch_size=settings.GAME_RECORDER_BATCH_SIZE,
+                                 flush_interval=settings.GAME_RECORDER_FLUSH_INTERVAL)
+    return _recorder
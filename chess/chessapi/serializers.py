@@ -0,0 +1,23 @@
+from rest_framework import serializers
+
+from .models import Game, Move
+
+
+class MoveSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Move
+        fields = ['ply', 'uci', 'comment', 'created_at']
+
+
+class GameSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Game
+        fields = ['id', 'player', 'white_player', 'black_player', 'model', 'start_fen', 'board_state',
+                  'ply_count', 'result', 'created_at', 'updated_at']
+
+
+class GameDetailSerializer(GameSerializer):
+    moves = MoveSerializer(many=True, read_only=True)
+
+    class Meta(GameSerializer.Meta):
+        fields = GameSerializer.Meta.fields + ['moves']
@@ -1,3 +1,1106 @@
-from django.test import TestCase
+import argparse
+import asyncio
+import contextlib
+import csv
+import glob
+import http.server
+import io
+import json
+import math
+import os
+import re
+import socket
+import subprocess
+import sys
+import shutil
+import tempfile
+import threading
+import time
+import unittest.mock
+from collections import Counter
+from unittest import skipUnless
 
-# Create your tests here.
+import chess
+import chess.engine
+import chess.polyglot
+import httpx
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from benchmarks import hot_paths, import_time, multi_worker
+from chessapi.models import Game
+from chessapi.recorder import GameRecorder, load_game
+
+from llm_chess_app import engine_pool, fake_engine, metrics
+from llm_chess_app.ai_chess_app import (Chess, ChessAgent, Move, create_ai_chess_app, create_hedged_player,
+                                        create_llm_ai_player, create_stock_fish_ai_player)
+from llm_chess_app.analysis import analyse_positions, fen_positions
+from llm_chess_app.batching import BatchScheduler
+from llm_chess_app.channel_layer import SQLiteChannelLayer
+from llm_chess_app.checkpointer import BoundedMemorySaver, SharedSqliteSaver, get_checkpointer
+from llm_chess_app.chessllm import ChessServer, get_hedge_llm
+from llm_chess_app.engine_pool import EnginePool, EnginePoolBusy
+from llm_chess_app.evaluation import Evaluation, evaluate_chunk
+from llm_chess_app.fake_llm import FakeChessLLM
+from llm_chess_app.game_record import decode_move, decode_moves, encode_move, iter_board_states
+from llm_chess_app.hedging import LatencyTracker
+from llm_chess_app.llm_clients import LLMClientRegistry, LoopAsyncClient
+from llm_chess_app.move_cache import MoveCache
+from llm_chess_app.move_resolver import resolve_move
+from llm_chess_app.opening_book import OpeningBook, build_book
+from llm_chess_app.position import analyse
+from llm_chess_app.prompts import PromptBuilder
+from llm_chess_app.tournament import standings
+
+
+class MoveCacheTests(SimpleTestCase):
+    def test_san_answer_is_stored_as_uci_and_hits(self):
+        cache = MoveCache(seed=0)
+        board = chess.Board()
+        cache.put(board, "model", "v1", "Nf3", "Develops.")
+        self.assertEqual(cache.get(board, "model", "v1"), ("g1f3", "Develops."))
+        self.assertEqual(cache.stats()["hit_rate"], 1.0)
+
+    def test_spellings_of_one_move_are_one_variant(self):
+        cache = MoveCache(seed=0)
+        board = chess.Board()
+        for answer in ("Nf3", "g1f3", "Ng1-f3", "knight to f3"):
+            cache.put(board, "model", "v1", answer, "")
+        self.assertEqual(cache.load(cache.key(board, "model", "v1")), [("g1f3", "")])
+
+    def test_unresolvable_answers_are_not_stored(self):
+        cache = MoveCache(seed=0, max_variants=2)
+        board = chess.Board()
+        cache.put(board, "model", "v1", "e4", "")
+        cache.put(board, "model", "v1", "d4", "")
+        for answer in ("e2e5", "garbage", "", None, "Qh5"):
+            cache.put(board, "model", "v1", answer, "")
+        variants = cache.load(cache.key(board, "model", "v1"))
+        self.assertEqual(sorted(move for move, _ in variants), ["d2d4", "e2e4"])
+
+    def test_miss_for_other_position_model_or_prompt(self):
+        cache = MoveCache(seed=0)
+        board = chess.Board()
+        cache.put(board, "model", "v1", "e4", "")
+        self.assertIsNone(cache.get(board, "other", "v1"))
+        self.assertIsNone(cache.get(board, "model", "v2"))
+        board.push_san("e4")
+        self.assertIsNone(cache.get(board, "model", "v1"))
+
+    def test_entries_survive_reopening(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cache.sqlite3")
+            cache = MoveCache(path=path, seed=0)
+            cache.put(chess.Board(), "model", "v1", "Nc3", "")
+            cache.close()
+            cache = MoveCache(path=path, seed=0)
+            self.assertEqual(cache.get(chess.Board(), "model", "v1"), ("b1c3", ""))
+            cache.close()
+
+
+class CachedPlayerTests(SimpleTestCase):
+    def test_async_player_reads_and_fills_the_cache_off_the_event_loop(self):
+        cache = MoveCache(seed=0)
+        calls = []
+        get = cache.get
+
+        def tracking_get(*args):
+            calls.append(threading.current_thread())
+            return get(*args)
+
+        cache.get = tracking_get
+        player = create_llm_ai_player(ChessAgent(FakeChessLLM(latency=0.0)), cache=cache)
+        board = chess.Board()
+        first = asyncio.run(player.aplay(board))
+        second = asyncio.run(player.aplay(board))
+        self.assertEqual(resolve_move(board, first[0]).uci(), second[0])
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(len(calls), 2)
+        self.assertTrue(all(thread is not threading.main_thread() for thread in calls))
+
+
+class StreamedMoveTests(SimpleTestCase):
+    def stream_first_move(self, llm):
+        events = []
+
+        async def listener(event):
+            events.append(event)
+
+        async def run():
+            chess_iter = create_ai_chess_app(llm, None).get_iterable()
+            try:
+                await chess_iter.anext(listener=listener)
+            finally:
+                chess_iter.release()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(run())
+        return events
+
+    def test_move_and_comment_stream_in_either_order(self):
+        expected = FakeChessLLM(seed=5).with_structured_output(Move).answer("")
+        for comment_first in (False, True):
+            with self.subTest(comment_first=comment_first):
+                events = self.stream_first_move(FakeChessLLM(seed=5, comment_first=comment_first))
+                self.assertEqual(events[0]["type"], "move")
+                self.assertEqual(events[0]["move"], chess.Move.from_uci(expected.move))
+                self.assertEqual("".join(event["delta"] for event in events[1:]), expected.comment)
+
+
+class UserMoveTests(SimpleTestCase):
+    def play_user_move(self, move):
+        game = create_ai_chess_app(FakeChessLLM(), None)
+        game.set_player("white", "user")
+        game.user_player = lambda board: move
+        played = []
+        game.ponderer = unittest.mock.Mock(played=lambda board: played.append(threading.current_thread()))
+
+        async def run():
+            chess_iter = game.get_iterable()
+            try:
+                await chess_iter.anext()
+            finally:
+                chess_iter.release()
+            return threading.current_thread()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            loop_thread = asyncio.run(run())
+        return game, played, loop_thread
+
+    def test_read_move_is_played_on_the_event_loop(self):
+        game, played, loop_thread = self.play_user_move("e2e4")
+        self.assertEqual(game.board.move_stack, [chess.Move.from_uci("e2e4")])
+        self.assertEqual(played, [loop_thread])
+
+    def test_invalid_read_move_is_logged_and_the_ai_moves(self):
+        with self.assertLogs(level="WARNING") as logs:
+            game, played, _ = self.play_user_move("e2e5")
+        self.assertIn("invalid move: ai will make a move for you.", "\n".join(logs.output))
+        self.assertEqual(len(game.board.move_stack), 1)
+        self.assertEqual(played, [])
+
+
+class HedgedPlayerTests(SimpleTestCase):
+    def test_cancelled_call_records_how_long_it_ran(self):
+        def backend(seconds):
+            def player(board):
+                raise NotImplementedError
+
+            async def aplay(board):
+                await asyncio.sleep(seconds)
+                return "e2e4", ""
+            player.aplay = aplay
+            return player
+
+        primary, secondary = LatencyTracker(), LatencyTracker()
+        player = create_hedged_player([("primary", backend(5.0), primary), ("secondary", backend(0.0), secondary)],
+                                      delay=lambda tracker: 0.1)
+        self.assertEqual(asyncio.run(player.aplay(chess.Board())), ("e2e4", ""))
+        self.assertEqual(len(primary.samples), 1)
+        self.assertGreaterEqual(primary.samples[0], 0.1)
+        self.assertLess(primary.samples[0], 5.0)
+        self.assertEqual(len(secondary.samples), 1)
+
+
+class BatchSchedulerTests(SimpleTestCase):
+    def submit_together(self, scheduler, boards):
+        agent = ChessAgent(FakeChessLLM(), batch_scheduler=scheduler)
+
+        async def main():
+            return await asyncio.gather(*(agent.ainvoke(board) for board in boards))
+        return asyncio.run(main())
+
+    def test_requests_arriving_together_share_one_call(self):
+        llm = FakeChessLLM(seed=3)
+        runnable = llm.with_structured_output(Move)
+        scheduler = BatchScheduler(runnable, max_batch_size=8, max_wait=0.05, model="fake-3")
+        boards = [chess.Board()]
+        for san in ["e4", "e5", "Nf3"]:
+            boards.append(boards[-1].copy())
+            boards[-1].push_san(san)
+        with unittest.mock.patch.object(runnable, "abatch", wraps=runnable.abatch) as abatch:
+            moves = self.submit_together(scheduler, boards)
+        abatch.assert_called_once()
+        self.assertEqual(len(abatch.call_args.args[0]), 4)
+        self.assertEqual([move.move for move in moves], [runnable.answer(prompt).move for prompt in abatch.call_args.args[0]])
+        self.assertEqual(scheduler.stats()["batch_sizes"], {4: 1})
+        self.assertIn('chess_llm_batch_fill_bucket{model="fake-3",le="0.5"} 1', metrics.render())
+
+    def test_each_event_loop_batches_its_own_requests(self):
+        runnable = FakeChessLLM().with_structured_output(Move)
+        scheduler = BatchScheduler(runnable, max_batch_size=8, max_wait=0.1)
+        results = []
+
+        def worker():
+            results.append(self.submit_together(scheduler, [chess.Board(), chess.Board()]))
+
+        # Two loops submitting at once must not flush each other's futures.
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+        self.assertEqual([len(moves) for moves in results], [2, 2])
+        self.assertEqual(scheduler.stats()["batch_sizes"], {2: 2})
+
+
+class EnginePoolTests(SimpleTestCase):
+    """EnginePool on llm_chess_app/fake_engine.py, so no Stockfish binary is needed."""
+
+    def pool(self, *args, **options):
+        pool = EnginePool([sys.executable, fake_engine.__file__, *args], **options)
+        self.addCleanup(pool.close)
+        return pool
+
+    @staticmethod
+    def pid(engine):
+        return engine.transport.get_pid()
+
+    @staticmethod
+    async def kill(engine):
+        engine.transport.kill()
+        await engine.returncode
+
+    def test_cancelled_search_keeps_its_engine(self):
+        pool = self.pool(size=1)
+
+        async def cancel():
+            search = asyncio.ensure_future(pool.aplay(chess.Board(), limit={"time": 30}))
+            while not pool.spawned:
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.1)
+            search.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await search
+
+        asyncio.run(cancel())
+        pid = self.pid(pool.idle[0])
+        # Answered by the same process once the cancelled search has stopped.
+        self.assertEqual(pool.play(chess.Board(), limit={"time": 0.01}).move, chess.Move.from_uci("a2a3"))
+        self.assertEqual((pool.spawned, pool.restarts, self.pid(pool.idle[0])), (1, 0, pid))
+
+    def test_background_searches_keep_to_their_share(self):
+        pool = self.pool(size=2, background_size=1)
+
+        async def searches():
+            first = asyncio.ensure_future(pool.aanalyse(chess.Board(), limit={"time": 30}, background=True))
+            while not pool.spawned:
+                await asyncio.sleep(0.01)
+            with self.assertRaises(EnginePoolBusy):
+                await pool.aanalyse(chess.Board(), limit={"time": 0.01}, background=True)
+            # A game still gets the other engine.
+            self.assertEqual((await pool.aplay(chess.Board(), limit={"time": 0.01})).move, chess.Move.from_uci("a2a3"))
+            first.cancel()
+
+        asyncio.run(searches())
+        self.assertEqual(pool.analyse(chess.Board(), limit={"time": 0.01}, background=True)["pv"][0],
+                         chess.Move.from_uci("a2a3"))
+
+
+    def test_engines_are_reused_across_checkouts(self):
+        pool = self.pool(size=2)
+        board = chess.Board()
+        for _ in range(3):
+            self.assertEqual(pool.play(board).move, chess.Move.from_uci("a2a3"))
+        self.assertEqual((pool.spawned, pool.restarts, len(pool.idle)), (1, 0, 1))
+
+    def test_dead_idle_engine_fails_its_ping_and_is_replaced(self):
+        pool = self.pool(size=1)
+        pool.play(chess.Board())
+        pid = self.pid(pool.idle[0])
+        pool.submit(self.kill(pool.idle[0])).result()
+        with self.assertLogs(level="ERROR"):
+            self.assertEqual(pool.play(chess.Board()).move, chess.Move.from_uci("a2a3"))
+        self.assertEqual((pool.spawned, pool.restarts), (1, 1))
+        self.assertNotEqual(self.pid(pool.idle[0]), pid)
+
+    def test_search_interrupted_by_a_crash_is_retried_on_a_new_engine(self):
+        with tempfile.TemporaryDirectory() as directory:
+            pool = self.pool("--crash-once", os.path.join(directory, "crashed"), size=1)
+            with self.assertLogs(level="ERROR"):
+                self.assertEqual(pool.play(chess.Board()).move, chess.Move.from_uci("a2a3"))
+        self.assertEqual((pool.spawned, pool.restarts), (1, 1))
+
+    def test_failed_searches_give_their_slot_back(self):
+        pool = self.pool("--crash", size=1)
+        for _ in range(2):
+            # The second search would wait for the slot forever if the first kept it.
+            with self.assertRaises(chess.engine.EngineTerminatedError), self.assertLogs(level="ERROR"):
+                pool.submit(pool.run_play(chess.Board(), pool.limit, {})).result(timeout=10)
+        self.assertEqual((pool.spawned, len(pool.idle)), (0, 0))
+
+    def test_missing_binary_gives_its_slot_back(self):
+        pool = EnginePool("/nonexistent/stockfish", size=1)
+        self.addCleanup(pool.close)
+        for _ in range(2):
+            with self.assertRaises(FileNotFoundError):
+                pool.submit(pool.run_play(chess.Board(), pool.limit, {})).result(timeout=10)
+
+    @override_settings(ENGINE_POOL_SIZE=3, ENGINE_LIMIT={"depth": 4}, ENGINE_BACKGROUND_SIZE=2)
+    def test_stockfish_player_pool_follows_the_settings(self):
+        with unittest.mock.patch.dict(engine_pool._engine_pools, clear=True), \
+                unittest.mock.patch("llm_chess_app.engine_pool.EnginePool") as pool_class:
+            create_stock_fish_ai_player("stockfish")
+        pool_class.assert_called_once_with("stockfish", size=3, options=None, limit={"depth": 4}, background_size=2)
+
+
+class CheckpointerTests(SimpleTestCase):
+    """BoundedMemorySaver and SharedSqliteSaver keep few checkpoints and forget idle games."""
+
+    @staticmethod
+    def game(thread_id):
+        chess_app = Chess(ai_player=create_llm_ai_player(ChessAgent(FakeChessLLM())), comment=False)
+        chess_app.set_config({"configurable": {"thread_id": thread_id}, "recursion_limit": 500})
+        return chess_app
+
+    def play(self, checkpointer, thread_id, plies):
+        chess_iter = self.game(thread_id).get_iterable(checkpointer=checkpointer)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(plies):
+                chess_iter.next()
+        return chess_iter
+
+    def resume(self, checkpointer, thread_id):
+        return self.game(thread_id).attach_iterable(checkpointer=checkpointer)
+
+    def assert_trimmed_game_resumes(self, checkpointer, checkpoints):
+        played = self.play(checkpointer, "g1", 10)
+        self.assertLessEqual(checkpoints("g1"), 3)
+        chess_iter = self.resume(checkpointer, "g1")
+        self.assertEqual(chess_iter.get_state().values["board_state"], played.get_state().values["board_state"])
+        with contextlib.redirect_stdout(io.StringIO()):
+            chess_iter.next()
+        self.assertEqual(chess_iter.plies(), 11)
+
+    def test_memory_saver_trims_to_its_newest_checkpoints(self):
+        saver = BoundedMemorySaver(max_checkpoints=3)
+        self.assert_trimmed_game_resumes(saver, lambda thread_id: len(saver.storage[thread_id]))
+
+    def test_memory_saver_evicts_the_least_recently_used_game(self):
+        saver = BoundedMemorySaver(max_threads=2)
+        self.play(saver, "a", 1)
+        self.play(saver, "b", 1)
+        self.assertIsNotNone(self.resume(saver, "a"))
+        self.play(saver, "c", 1)
+        self.assertEqual(set(saver.storage), {"a", "c"})
+        self.assertIsNone(self.resume(saver, "b"))
+
+    def test_memory_saver_evicts_idle_games(self):
+        saver = BoundedMemorySaver(ttl=0.2)
+        self.play(saver, "a", 1)
+        time.sleep(0.3)
+        self.play(saver, "b", 1)
+        self.assertEqual(set(saver.storage), {"b"})
+
+    def test_memory_saver_release_forgets_the_game(self):
+        saver = BoundedMemorySaver()
+        self.play(saver, "a", 2).release()
+        self.assertEqual((dict(saver.storage), dict(saver.writes)), ({}, {}))
+
+    def shared_saver(self, **options):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        return SharedSqliteSaver(os.path.join(directory, "checkpoints.sqlite3"), **options)
+
+    def test_shared_saver_trims_to_its_newest_checkpoints(self):
+        saver = self.shared_saver(max_checkpoints=3)
+
+        def checkpoints(thread_id):
+            return saver.conn.execute("SELECT COUNT(*) FROM checkpoints WHERE thread_id = ?", (thread_id,)).fetchone()[0]
+        self.assert_trimmed_game_resumes(saver, checkpoints)
+        # Another worker opening the same file continues the game as well.
+        self.assertIsNotNone(self.resume(SharedSqliteSaver(saver.path), "g1"))
+
+    def test_shared_saver_evicts_idle_games(self):
+        saver = self.shared_saver(ttl=0.2, evict_interval=0.0)
+        self.play(saver, "a", 1)
+        time.sleep(0.3)
+        self.play(saver, "b", 1)
+        self.assertIsNone(self.resume(saver, "a"))
+        self.assertIsNotNone(self.resume(saver, "b"))
+
+    @override_settings(CHECKPOINT_PATH=None, CHECKPOINT_MAX_THREADS=7, CHECKPOINT_TTL=60.0, CHECKPOINT_KEEP=2)
+    def test_shared_checkpointer_follows_the_settings(self):
+        with unittest.mock.patch("llm_chess_app.checkpointer._checkpointer", None):
+            saver = get_checkpointer()
+        self.assertEqual((saver.max_threads, saver.ttl, saver.max_checkpoints), (7, 60.0, 2))
+
+
+class HistogramTests(SimpleTestCase):
+    SAMPLE = re.compile(r'^test_seconds_(bucket|sum|count)(\{(\w+="(?:[^"\\\n]|\\[\\"n])*",?)*\})? \S+$')
+
+    def histogram(self, labelnames):
+        histogram = metrics.Histogram("test_seconds", "A test histogram.", labelnames, buckets=(0.1, 1.0))
+        self.addCleanup(metrics._registry.remove, histogram)
+        return histogram
+
+    def test_render_is_prometheus_text(self):
+        histogram = self.histogram(("node", "kind"))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value, node='say "hi"\\\n', kind="a")
+        text = histogram.render()
+        lines = text.split("\n")
+        self.assertEqual(lines[:2], ["# HELP test_seconds A test histogram.", "# TYPE test_seconds histogram"])
+        for line in lines[2:]:
+            self.assertRegex(line, self.SAMPLE)
+        labels = r'node="say \"hi\"\\\n",kind="a"'
+        self.assertEqual(lines[2:], [f'test_seconds_bucket{{{labels},le="0.1"}} 1',
+                                     f'test_seconds_bucket{{{labels},le="1.0"}} 2',
+                                     f'test_seconds_bucket{{{labels},le="+Inf"}} 3',
+                                     f"test_seconds_sum{{{labels}}} 5.55",
+                                     f"test_seconds_count{{{labels}}} 3"])
+        self.assertIn(text + "\n", metrics.render())
+
+    def test_unlabelled_series_have_no_braces(self):
+        histogram = self.histogram(())
+        histogram.observe(0.1)
+        self.assertEqual(histogram.render().split("\n")[2:], ['test_seconds_bucket{le="0.1"} 1',
+                                                            'test_seconds_bucket{le="1.0"} 1',
+                                                            'test_seconds_bucket{le="+Inf"} 1',
+                                                            "test_seconds_sum 0.1", "test_seconds_count 1"])
+
+
+class GameRecordTests(SimpleTestCase):
+    # Promotions of every piece, with and without capture, castling on both sides for both colours, en passant.
+    FENS = ["1n5k/P6P/8/8/8/8/p6p/1N5K w - - 0 1", "1n5k/P6P/8/8/8/8/p6p/1N5K b - - 0 1",
+            "r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", "r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1",
+            "4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 2"]
+
+    def test_every_legal_move_round_trips(self):
+        for fen in self.FENS:
+            board = chess.Board(fen)
+            with self.subTest(fen=fen):
+                for move in board.legal_moves:
+                    code = encode_move(move)
+                    self.assertLess(code, 1 << 16)
+                    self.assertEqual(decode_move(code), move)
+                    self.assertEqual(encode_move(move.uci()), code)
+
+    def test_special_moves_keep_their_meaning(self):
+        board = chess.Board(self.FENS[2])
+        for uci in ["e1g1", "e1c1"]:
+            self.assertTrue(board.is_castling(decode_move(encode_move(uci))))
+        promotions = {decode_move(encode_move(f"a7b8{piece}")).promotion for piece in "nbrq"}
+        self.assertEqual(promotions, {chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN})
+        self.assertTrue(chess.Board(self.FENS[4]).is_en_passant(decode_move(encode_move("e5d6"))))
+
+    def test_a_record_replays_the_game(self):
+        board = chess.Board()
+        fens = [board.fen()]
+        for san in ["e4", "d5", "exd5", "c6", "dxc6", "Nf6", "cxb7", "Bd7", "bxa8=N", "e5"]:
+            board.push_san(san)
+            fens.append(board.fen())
+        codes = [encode_move(move) for move in board.move_stack]
+        self.assertEqual(decode_moves(codes), [move.uci() for move in board.move_stack])
+        self.assertEqual(list(iter_board_states(chess.STARTING_FEN, codes)), fens)
+
+
+class PositionTests(SimpleTestCase):
+    def assertMatchesBoard(self, board):
+        position = analyse(board)
+        self.assertEqual(position.outcome, board.outcome())
+        self.assertEqual(position.legal_moves, list(board.legal_moves))
+        self.assertEqual(position.zobrist, chess.polyglot.zobrist_hash(board))
+
+    def test_position_follows_pushes_and_pops(self):
+        board = chess.Board()
+        for san in ["e4", "e5", "Qh5", "Nc6", "Bc4", "Nf6"]:
+            self.assertMatchesBoard(board)
+            board.push_san(san)
+        self.assertMatchesBoard(board)
+        board.pop()
+        board.pop()
+        self.assertMatchesBoard(board)
+        for san in ["Bc4", "Nf6", "Qxf7"]:
+            board.push_san(san)
+        self.assertMatchesBoard(board)
+        self.assertEqual(analyse(board).outcome.termination, chess.Termination.CHECKMATE)
+        board.pop()
+        self.assertMatchesBoard(board)
+        self.assertIsNone(analyse(board).outcome)
+
+    def test_position_follows_a_repetition(self):
+        board = chess.Board()
+        for _ in range(4):
+            for san in ["Nf3", "Nf6", "Ng1", "Ng8"]:
+                board.push_san(san)
+                self.assertMatchesBoard(board)
+        self.assertEqual(analyse(board).outcome.termination, chess.Termination.FIVEFOLD_REPETITION)
+        board.pop()
+        self.assertMatchesBoard(board)
+        self.assertIsNone(analyse(board).outcome)
+
+    def test_copies_and_collected_boards_are_not_shared(self):
+        board = chess.Board()
+        position = analyse(board)
+        self.assertIs(analyse(board), position)
+        copy = board.copy()
+        self.assertIsNot(analyse(copy), position)
+        self.assertIs(analyse(copy).board, copy)
+        del board
+        self.assertIsNone(position.board)
+
+
+BOOK_PGN = """
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 Nc6 3. Bc4 Bc5 4. O-O Nf6 1-0
+
+[Result "0-1"]
+
+1. e4 e5 2. Nf3 Nc6 3. Bc4 Bc5 4. O-O d6 0-1
+
+[Result "1/2-1/2"]
+
+1. e4 c5 2. Nf3 d6 1/2-1/2
+
+[Result "*"]
+
+1. d4 d5 *
+"""
+
+
+class OpeningBookTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        pgn_path = os.path.join(directory, "games.pgn")
+        with open(pgn_path, "w") as pgn:
+            pgn.write(BOOK_PGN)
+        self.book_path = os.path.join(directory, "book.bin")
+        self.assertEqual(build_book([pgn_path], self.book_path, max_ply=7)[0], 4)
+
+    def open_book(self, **kwargs):
+        book = OpeningBook(self.book_path, **kwargs)
+        self.addCleanup(book.close)
+        return book
+
+    def test_lookup_returns_the_most_common_move(self):
+        book = self.open_book(weighted=False)
+        board = chess.Board()
+        self.assertEqual(book.lookup(board), chess.Move.from_uci("e2e4"))
+        board.push_san("e4")
+        self.assertEqual(book.lookup(board), chess.Move.from_uci("e7e5"))
+        for san in ["e5", "Nf3", "Nc6", "Bc4", "Bc5"]:
+            board.push_san(san)
+        # Castling is stored as king takes rook and read back as a normal move.
+        self.assertEqual(book.lookup(board), chess.Move.from_uci("e1g1"))
+        board.push_san("O-O")
+        self.assertIsNone(book.lookup(board))
+        self.assertEqual((book.hits, book.misses), (3, 1))
+
+    def test_book_stops_at_max_ply(self):
+        board = chess.Board()
+        self.assertIsNotNone(self.open_book(max_ply=1).lookup(board))
+        board.push_san("e4")
+        self.assertIsNone(self.open_book(max_ply=1).lookup(board))
+        self.assertIsNotNone(self.open_book(max_ply=2).lookup(board))
+
+    def test_weighted_choice_follows_the_counts(self):
+        book = self.open_book(seed=0)
+        moves = Counter(book.lookup(chess.Board()).uci() for _ in range(400))
+        self.assertEqual(set(moves), {"e2e4", "d2d4"})
+        # Three games to one.
+        self.assertGreater(moves["e2e4"], 2 * moves["d2d4"])
+
+
+def game_result(white, black, result):
+    return {"white": white, "black": black, "result": result}
+
+
+class StandingsTests(SimpleTestCase):
+    def test_two_players_are_rated_from_the_score_with_a_virtual_draw(self):
+        results = [game_result("a", "b", "1-0"), game_result("b", "a", "0-1"), game_result("a", "b", "1-0")]
+        rows = standings(results)
+        self.assertEqual([(row["name"], row["wins"], row["losses"], row["score"]) for row in rows],
+                         [("a", 3, 0, 3.0), ("b", 0, 3, 0.0)])
+        # 3.5 of 4 points with the virtual draw: a is 7 times as strong as b.
+        self.assertAlmostEqual(rows[0]["elo"] - rows[1]["elo"], 400 * math.log10(7), places=3)
+        self.assertAlmostEqual(rows[0]["elo"] + rows[1]["elo"], 3000.0, places=3)
+
+    def test_ratings_follow_a_transitive_table(self):
+        results = [game_result("a", "b", "1-0"), game_result("b", "c", "1-0"), game_result("c", "a", "0-1"),
+                   game_result("b", "a", "1/2-1/2")]
+        rows = standings(results)
+        self.assertEqual([row["name"] for row in rows], ["a", "b", "c"])
+        self.assertEqual(rows[0]["draws"], 1)
+        elo = {row["name"]: row["elo"] for row in rows}
+
+        def expected(player, other):
+            return 1 / (1 + 10 ** ((elo[other] - elo[player]) / 400))
+
+        # At the fit every expected score matches the actual one, virtual draws included:
+        # a and b met 2 + 1 times, b and c 1 + 1, a and c 1 + 1.
+        self.assertAlmostEqual(3 * expected("a", "b") + 2 * expected("a", "c"), 3.5, places=3)
+        self.assertAlmostEqual(3 * expected("b", "a") + 2 * expected("b", "c"), 2.5, places=3)
+        self.assertAlmostEqual(2 * expected("c", "a") + 2 * expected("c", "b"), 1.0, places=3)
+        self.assertAlmostEqual(sum(elo.values()) / 3, 1500.0, places=3)
+
+    def test_equal_scores_give_equal_ratings(self):
+        rows = standings([game_result("a", "b", "1/2-1/2"), game_result("b", "a", "1-0"), game_result("a", "b", "1-0")])
+        self.assertAlmostEqual(rows[0]["elo"], 1500.0, places=3)
+        self.assertAlmostEqual(rows[1]["elo"], 1500.0, places=3)
+
+
+class EvaluationTests(SimpleTestCase):
+    """Evaluation in this process, scored by llm_chess_app/fake_engine.py."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.pgn_path = os.path.join(self.directory, "games.pgn")
+        with open(self.pgn_path, "w") as pgn:
+            pgn.write(BOOK_PGN)
+        pool = EnginePool([sys.executable, fake_engine.__file__], size=1)
+        self.addCleanup(pool.close)
+        patcher = unittest.mock.patch("llm_chess_app.evaluation.get_engine_pool", return_value=pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def evaluation(self, output):
+        return Evaluation(self.pgn_path, os.path.join(self.directory, output), [{"kind": "random", "name": "random"}],
+                          "fake-engine", {"depth": 1}, sample_rate=1.0, min_ply=0, max_per_game=2,
+                          games_per_chunk=1, file_format="csv")
+
+    def rows(self, output):
+        rows = []
+        for path in sorted(glob.glob(os.path.join(self.directory, output, "part-*.csv"))):
+            with open(path, newline="") as part:
+                # Timings differ from run to run.
+                rows.extend({**row, "seconds": ""} for row in csv.DictReader(part))
+        return rows
+
+    def test_resume_after_an_interrupted_chunk_does_not_duplicate_rows(self):
+        total, evaluated, _ = self.evaluation("full").run(workers=0)
+        self.assertEqual(evaluated, 4)
+
+        def crash_on_chunk_2(task):
+            if task["index"] == 2:
+                raise KeyboardInterrupt
+            return evaluate_chunk(task)
+
+        interrupted = self.evaluation("resumed")
+        with unittest.mock.patch("llm_chess_app.evaluation.evaluate_chunk", crash_on_chunk_2), \
+                self.assertRaises(KeyboardInterrupt):
+            interrupted.run(workers=0)
+        # Killed while writing the progress of chunk 2.
+        with open(interrupted.progress_path, "a") as progress:
+            progress.write('{"chunk": 2, "pa')
+
+        resumed = []
+        resumed_total, evaluated, _ = self.evaluation("resumed").run(
+            workers=0, on_chunk=lambda entry, earlier: resumed.append((entry["chunk"], earlier)))
+        self.assertEqual(evaluated, 2)
+        self.assertEqual(resumed, [(0, True), (1, True), (2, False), (3, False)])
+        for counts in (*total.values(), *resumed_total.values()):
+            counts.pop("seconds")
+        self.assertEqual(resumed_total, total)
+
+        rows = self.rows("resumed")
+        self.assertEqual(rows, self.rows("full"))
+        self.assertEqual(len({(row["player"], row["game"], row["ply"]) for row in rows}), len(rows))
+        self.assertEqual(len(rows), 8)
+
+
+class PromptBuilderTests(SimpleTestCase):
+    def test_moves_are_listed_only_with_history(self):
+        board = chess.Board()
+        board.push_san("e4")
+        self.assertNotIn("last moves", PromptBuilder().build(board).lower())
+        self.assertIn("Last moves: 1. e4", PromptBuilder(history=2).build(board))
+        self.assertEqual(PromptBuilder().key, "3")
+
+
+# (FEN or None for the start position, moves played first, raw answer, expected UCI or None)
+RESOLVE_CASES = [
+    (None, "", "e2e4", "e2e4"),
+    (None, "", "E2E4.", "e2e4"),
+    (None, "", "Ng1-f3", "g1f3"),
+    (None, "", "e2 to e4", "e2e4"),
+    (None, "", "Nf3", "g1f3"),
+    (None, "", "nf3", "g1f3"),
+    (None, "", "\"e4\"", "e2e4"),
+    (None, "", "knight to c3", "b1c3"),
+    (None, "", "pawn to d4", "d2d4"),
+    (None, "", "d4", "d2d4"),
+    (None, "", "bishop to c4", None),
+    (None, "", "rook to a3", None),
+    (None, "", "queen to h5", None),
+    (None, "", "knight to e4", None),
+    (None, "e2e4 e7e5", "bishop to c4", "f1c4"),
+    (None, "e2e4 e7e5", "Bc4", "f1c4"),
+    (None, "e2e4 e7e5", "f3", "f2f3"),
+    (None, "e2e4 e7e5 g1f3 b8c6 f1c4 g8f6", "O-O", "e1g1"),
+    (None, "e2e4 e7e5 g1f3 b8c6 f1c4 g8f6", "castle kingside", "e1g1"),
+    (None, "e2e4 d7d5", "exd5", "e4d5"),
+    (None, "e2e4 d7d5", "pawn takes d5", "e4d5"),
+    ("8/P7/8/8/8/8/8/k6K w - - 0 1", "", "a7a8", "a7a8q"),
+    ("8/P7/8/8/8/8/8/k6K w - - 0 1", "", "a8=N", "a7a8n"),
+    (None, "", "e2e5", None),
+    (None, "", "I resign", None),
+    (None, "", "", None),
+    (None, "", None, None),
+]
+
+
+class ResolveMoveTests(SimpleTestCase):
+    def test_resolve_move(self):
+        for fen, moves, raw, expected in RESOLVE_CASES:
+            board = chess.Board(fen) if fen else chess.Board()
+            for move in moves.split():
+                board.push_uci(move)
+            with self.subTest(fen=fen, moves=moves, raw=raw):
+                move = resolve_move(board, raw)
+                self.assertEqual(move.uci() if move else None, expected)
+
+    def test_legal_move_objects_pass_and_illegal_ones_do_not(self):
+        board = chess.Board()
+        self.assertEqual(resolve_move(board, chess.Move.from_uci("g1f3")), chess.Move.from_uci("g1f3"))
+        self.assertIsNone(resolve_move(board, chess.Move.from_uci("g1g3")))
+
+
+class HotPathGateTests(SimpleTestCase):
+    """
+    The hot-path regression gate of benchmarks/hot_paths.py. Set
+    HOT_PATHS_BASELINE to a JSON file saved with --save on the same machine
+    to also fail when a case got slower than HOT_PATHS_TOLERANCE (0.25).
+    """
+
+    cases = ["make_move", "board_node", "ply", "ply_llm"]
+
+    def test_every_case_runs(self):
+        results = hot_paths.run_cases(list(hot_paths.CASES), plies=10, repeat=1)
+        self.assertEqual(set(results), set(hot_paths.CASES))
+        for name, result in results.items():
+            with self.subTest(case=name):
+                self.assertGreater(result["seconds"], 0)
+
+    def test_compare_fails_slower_cases_only(self):
+        results = {"fast": {"seconds": 1.0}, "slow": {"seconds": 2.0}, "new": {"seconds": 9.0}}
+        baseline = {"fast": {"seconds": 1.1}, "slow": {"seconds": 1.0}}
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(hot_paths.compare(results, baseline, 0.25), ["slow"])
+
+    def test_compare_exits_non_zero_on_a_regression(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "baseline.json")
+            command = [sys.executable, "-m", "benchmarks.hot_paths", "--plies", "10", "--repeat", "1",
+                       "--cases", *self.cases]
+            saved = subprocess.run(command + ["--save", path], cwd=settings.BASE_DIR, capture_output=True, text=True)
+            self.assertEqual(saved.returncode, 0, saved.stdout + saved.stderr)
+            with open(path) as f:
+                baseline = json.load(f)
+            # A baseline a hundred times faster than this machine is a regression for every case.
+            for result in baseline.values():
+                result["seconds"] /= 100
+            with open(path, "w") as f:
+                json.dump(baseline, f)
+            gated = subprocess.run(command + ["--compare", path], cwd=settings.BASE_DIR, capture_output=True, text=True)
+            self.assertEqual(gated.returncode, 1, gated.stdout + gated.stderr)
+            self.assertIn("slower than baseline", gated.stdout)
+
+    @skipUnless(os.environ.get("HOT_PATHS_BASELINE"), "HOT_PATHS_BASELINE is not set")
+    def test_no_regression_against_baseline(self):
+        with open(os.environ["HOT_PATHS_BASELINE"]) as f:
+            baseline = json.load(f)
+        results = hot_paths.run_cases([name for name in hot_paths.CASES if name in baseline])
+        with contextlib.redirect_stdout(io.StringIO()):
+            failed = hot_paths.compare(results, baseline, float(os.environ.get("HOT_PATHS_TOLERANCE", 0.25)))
+        self.assertEqual(failed, [])
+
+
+class ImportTimeTests(SimpleTestCase):
+    """
+    The startup budget of benchmarks/import_time.py: a worker imports its
+    ASGI application within IMPORT_TIME_BUDGET_MS (1500) and no model backend.
+    """
+
+    def test_asgi_application_imports_within_budget(self):
+        budget_ms = float(os.environ.get("IMPORT_TIME_BUDGET_MS", 1500))
+        total_ms, imports = import_time.run("llm_chess_app.asgi")
+        self.assertEqual(import_time.eager_backends(imports), [])
+        self.assertLessEqual(total_ms, budget_ms)
+
+
+@override_settings(FAKE_LLM_LATENCY=0.0)
+class AnalyzeViewTests(SimpleTestCase):
+    url = "/api/analyze?model=fake"
+
+    def test_request_without_custom_header_is_refused(self):
+        response = self.client.post(self.url, chess.STARTING_FEN, content_type="text/plain")
+        self.assertEqual(response.status_code, 403)
+
+    def test_other_sites_get_no_cors_headers(self):
+        response = self.client.options(self.url, HTTP_ORIGIN="https://elsewhere.example",
+                                       HTTP_ACCESS_CONTROL_REQUEST_METHOD="POST",
+                                       HTTP_ACCESS_CONTROL_REQUEST_HEADERS="x-requested-with")
+        self.assertNotIn("Access-Control-Allow-Origin", response.headers)
+
+    def test_request_with_custom_header_is_analysed(self):
+        async def lines():
+            response = await self.async_client.post(self.url, chess.STARTING_FEN, content_type="text/plain",
+                                                    headers={"X-Requested-With": "test"})
+            self.assertEqual(response.status_code, 200)
+            return [json.loads(line) async for line in response.streaming_content for line in line.splitlines()]
+        self.assertEqual(len(asyncio.run(lines())), 2)
+
+    def test_json_batch_may_exceed_the_upload_limit(self):
+        fens = [chess.STARTING_FEN] * 40
+
+        async def lines():
+            response = await self.async_client.post(self.url, {"fens": fens}, content_type="application/json",
+                                                    headers={"X-Requested-With": "test"})
+            self.assertEqual(response.status_code, 200)
+            return [json.loads(line) async for line in response.streaming_content for line in line.splitlines()]
+        with override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=1000):
+            results = asyncio.run(lines())
+        self.assertEqual(results[-1]["positions"], 40)
+        with override_settings(ANALYSIS_MAX_JSON_BYTES=1000):
+            response = asyncio.run(self.async_client.post(self.url, {"fens": fens}, content_type="application/json",
+                                                          headers={"X-Requested-With": "test"}))
+        self.assertEqual(response.status_code, 400)
+
+    def test_positions_are_read_off_the_event_loop(self):
+        threads = []
+
+        def positions():
+            for meta, board in fen_positions([chess.STARTING_FEN] * 3):
+                threads.append(threading.current_thread())
+                yield meta, board
+
+        async def run():
+            return [result async for result in analyse_positions(create_llm_ai_player(ChessAgent(FakeChessLLM())),
+                                                                 positions())]
+        self.assertEqual(asyncio.run(run())[-1]["positions"], 3)
+        self.assertEqual(len(threads), 3)
+        self.assertNotIn(threading.main_thread(), threads)
+
+    def test_hedge_never_uses_the_server_key(self):
+        with override_settings(LLM_HEDGE_MODEL="openai-gpt-4o-mini"), \
+                unittest.mock.patch.dict(os.environ, {"OPENAI_API_KEY": "server-key"}), \
+                unittest.mock.patch("llm_chess_app.chessllm.get_llm") as get_llm:
+            get_hedge_llm({"model": "fake"})
+        get_llm.assert_called_once_with({"model": "openai-gpt-4o-mini", "api_key": ""})
+
+
+@override_settings(FAKE_LLM_LATENCY=0.0)
+class ChessServerTests(SimpleTestCase):
+    def run_server(self, test):
+        async def run():
+            communicator = WebsocketCommunicator(ChessServer.as_asgi(), "/chess/")
+            await communicator.connect()
+            try:
+                await test(communicator)
+            finally:
+                await communicator.disconnect()
+
+        with unittest.mock.patch("llm_chess_app.chessllm.get_game_recorder", return_value=None), \
+                contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(run())
+
+    @staticmethod
+    async def start(communicator):
+        await communicator.send_json_to({"message": "start", "llm_config": {"model": "fake"}, "board_state": ""})
+        return await communicator.receive_json_from(timeout=10)
+
+    def test_resume_needs_the_token_of_game_started(self):
+        async def test(communicator):
+            game = await self.start(communicator)
+            for token in ("", "forged", None):
+                await communicator.send_json_to({"message": "resume", "game_id": game["game_id"],
+                                                 "resume_token": token, "llm_config": {"model": "fake"}})
+                self.assertEqual(await communicator.receive_json_from(timeout=10),
+                                 {"message": "error", "error": "unknown game", "game_id": game["game_id"]})
+            await communicator.send_json_to({"message": "resume", "game_id": game["game_id"],
+                                             "resume_token": game["resume_token"], "llm_config": {"model": "fake"}})
+            self.assertEqual((await communicator.receive_json_from(timeout=10))["message"], "game_resumed")
+        self.run_server(test)
+
+    def test_recorded_result_sees_repetitions(self):
+        recorded = []
+
+        async def test(communicator):
+            await self.start(communicator)
+            with unittest.mock.patch.object(ChessServer, "record_move", lambda self, *args: recorded.append(args)):
+                # Knights out and back four times: the start position a fifth time draws the game.
+                for _ in range(4):
+                    for move in ("g1f3", "g8f6", "f3g1", "f6g8"):
+                        await communicator.send_json_to({"message": "next_move",
+                                                         "move": {"from": move[:2], "to": move[2:]}})
+                        await communicator.receive_json_from(timeout=10)
+        self.run_server(test)
+        self.assertEqual([args[-1] for args in recorded], [""] * 15 + ["1/2-1/2"])
+        self.assertEqual(recorded[-1][0], 16)
+
+
+class GameRecorderTests(TestCase):
+    @staticmethod
+    def recorder():
+        # No background thread: the tests write the queued events themselves.
+        recorder = GameRecorder()
+        recorder.start = lambda: None
+        return recorder
+
+    def moves(self, game_id, plies):
+        board = chess.Board()
+        events = []
+        for ply, move in enumerate(["e2e4", "e7e5", "g1f3", "b8c6", "f1c4", "g8f6", "d2d3", "f8c5"], 1):
+            board.push_uci(move)
+            if ply in plies:
+                events.append(("move", game_id, {"ply": ply, "uci": move, "comment": "", "board_state": board.fen(),
+                                                 "result": "", "created_at": timezone.now()}))
+        return events, board.fen()
+
+    def test_an_older_batch_does_not_move_the_game_back(self):
+        recorder = self.recorder()
+        recorder.game_started("g1", "fake", chess.STARTING_FEN)
+        recorder.write([recorder.queue.get_nowait()])
+        events, _ = self.moves("g1", range(1, 9))
+        board_after_8 = events[-1][2]["board_state"]
+        # Plies 5-8 reach the database first, plies 1-6 later from another worker or reconnect.
+        recorder.write(events[4:])
+        recorder.write(events[:6])
+        game, moves = load_game("g1")
+        self.assertEqual([move.ply for move in moves], list(range(1, 9)))
+        self.assertEqual(game.ply_count, 8)
+        self.assertEqual(game.board_state, board_after_8)
+
+    def test_moves_batched_with_the_game_keep_the_latest_ply(self):
+        recorder = self.recorder()
+        recorder.game_started("g2", "fake", chess.STARTING_FEN)
+        events, _ = self.moves("g2", range(1, 5))
+        recorder.write([recorder.queue.get_nowait(), events[3], events[1]])
+        self.assertEqual(Game.objects.get(id="g2").ply_count, 4)
+
+    def test_client_labels_are_cut_to_the_column_sizes(self):
+        recorder = self.recorder()
+        recorder.game_started("g3", "m" * 100, chess.STARTING_FEN, player="p" * 100, white_player="w" * 40,
+                              black_player="b" * 40)
+        recorder.write([recorder.queue.get_nowait()])
+        game = Game.objects.get(id="g3")
+        self.assertEqual((len(game.model), len(game.player), len(game.white_player), len(game.black_player)),
+                         (64, 64, 16, 16))
+
+
+class SQLiteChannelLayerTests(SimpleTestCase):
+    def run_layer(self, test, **options):
+        async def run():
+            with tempfile.TemporaryDirectory() as directory:
+                layer = SQLiteChannelLayer(os.path.join(directory, "layer.sqlite3"), poll_interval=0.005, **options)
+                try:
+                    await test(layer)
+                finally:
+                    await layer.close()
+        asyncio.run(run())
+
+    def test_message_sent_between_two_receives_is_delivered(self):
+        async def test(layer):
+            channel, other = await layer.new_channel(), await layer.new_channel()
+            # Another consumer keeps the poller running meanwhile.
+            waiting = asyncio.ensure_future(layer.receive(other))
+            await layer.send(channel, {"type": "first"})
+            self.assertEqual((await asyncio.wait_for(layer.receive(channel), 2))["type"], "first")
+            await layer.send(channel, {"type": "second"})
+            # The poller takes the message off the table while nobody is receiving.
+            await asyncio.sleep(0.1)
+            self.assertEqual((await asyncio.wait_for(layer.receive(channel), 2))["type"], "second")
+            waiting.cancel()
+        self.run_layer(test)
+
+    def test_message_sent_before_the_first_receive_is_delivered(self):
+        async def test(layer):
+            channel, other = await layer.new_channel(), await layer.new_channel()
+            waiting = asyncio.ensure_future(layer.receive(other))
+            await asyncio.sleep(0.02)
+            await layer.send(channel, {"type": "early"})
+            await asyncio.sleep(0.1)
+            self.assertEqual((await asyncio.wait_for(layer.receive(channel), 2))["type"], "early")
+            waiting.cancel()
+        self.run_layer(test)
+
+    def test_idle_channels_are_forgotten(self):
+        async def test(layer):
+            channel = await layer.new_channel()
+            await layer.send(channel, {"type": "only"})
+            await asyncio.wait_for(layer.receive(channel), 2)
+            await asyncio.sleep(0.1)
+            self.assertNotIn(channel, layer.queues)
+            self.assertTrue(layer.poller.done())
+        self.run_layer(test, expiry=0.05)
+
+    def test_group_send_reaches_every_member(self):
+        async def test(layer):
+            channels = [await layer.new_channel() for _ in range(3)]
+            for channel in channels:
+                await layer.group_add("game.g1", channel)
+            await layer.group_discard("game.g1", channels[2])
+            await layer.group_send("game.g1", {"type": "game.update"})
+            for channel in channels[:2]:
+                self.assertEqual((await asyncio.wait_for(layer.receive(channel), 2))["type"], "game.update")
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(layer.receive(channels[2]), 0.1)
+        self.run_layer(test)
+
+
+class OkHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+class LoopAsyncClientTests(SimpleTestCase):
+    def test_one_client_serves_successive_event_loops(self):
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), OkHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = f"http://127.0.0.1:{server.server_address[1]}/"
+        client = LoopAsyncClient()
+        self.assertIs(type(client._transport), httpx.AsyncBaseTransport)
+
+        async def get():
+            response = await client.get(url)
+            return response.text, await client.client()
+
+        # Like evaluation chunks: each asyncio.run closes its loop, and the loop's client with it.
+        for _ in range(3):
+            text, loop_client = asyncio.run(get())
+            self.assertEqual(text, "ok")
+            self.assertTrue(loop_client.is_closed)
+            self.assertEqual(len(client.clients), 0)
+
+
+class LLMClientRegistryTests(SimpleTestCase):
+    @override_settings(FAKE_LLM_LATENCY=0.0)
+    def test_only_openai_clients_are_per_key(self):
+        registry = LLMClientRegistry()
+        self.assertIs(registry.get("fake", "one"), registry.get("fake", ""))
+        self.assertNotEqual(registry.key("openai-gpt-4o", "one"), registry.key("openai-gpt-4o", ""))
+
+
+def free_ports(count):
+    sockets = [socket.socket() for _ in range(count)]
+    for sock in sockets:
+        sock.bind(("127.0.0.1", 0))
+    ports = [sock.getsockname()[1] for sock in sockets]
+    for sock in sockets:
+        sock.close()
+    return ports
+
+
+class MultiWorkerTests(SimpleTestCase):
+    def test_game_played_across_workers(self):
+        """One game over two worker processes: every move legal, seen by a watcher and recorded in order."""
+        args = argparse.Namespace(workers=2, turns=4, latency=0.01, seed=0, port=None)
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            ok = asyncio.run(multi_worker.run(args, ports=free_ports(2)))
+        self.assertTrue(ok, output.getvalue())
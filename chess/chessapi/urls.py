@@ -3,4 +3,8 @@ from . import views
 
 urlpatterns = [
     path('hello-world/', views.hello_world, name='hello_world'),
+    path('metrics', views.metrics_view, name='metrics'),
+    path('analyze', views.analyze, name='analyze'),
+    path('games/', views.GameList.as_view(), name='game_list'),
+    path('games/<str:pk>/', views.GameDetail.as_view(), name='game_detail'),
 ]
\ No newline at end of file
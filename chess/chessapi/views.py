@@ -1,9 +1,165 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 
 # Create your views here.
+from django.utils.dateparse import parse_datetime
+from rest_framework import generics
 from rest_framework.decorators import api_view
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 
+from llm_chess_app import metrics
+from llm_chess_app.analysis import analyse_positions, fen_positions, pgn_positions
+from llm_chess_app.chessllm import create_player
+
+from .models import Game
+from .serializers import GameDetailSerializer, GameSerializer
+
 @api_view(['GET'])
 def hello_world(request):
-    return Response({'message': 'Welcome to LLM chess!'})
\ No newline at end of file
+    return Response({'message': 'Welcome to LLM chess!'})
+
+def metrics_view(request):
+    """Timing histograms of this worker in the Prometheus text format."""
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# Player options of the analyze endpoint given as query or form parameters.
+ENGINE_PARAMS = {'depth': int, 'nodes': int, 'time': float, 'skill_level': int}
+
+def params_llm_config(request, params):
+    llm_config = {'model': params.get('model', settings.DEFAULT_LLM_MODEL),
+                  'api_key': request.headers.get('X-Api-Key', '')}
+    for key, convert in ENGINE_PARAMS.items():
+        if params.get(key):
+            llm_config[key] = convert(params[key])
+    return llm_config
+
+class TextLines:
+    """The readline() chess.pgn needs, decoding a binary stream such as the request body."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def readline(self):
+        return self.stream.readline().decode('utf-8', 'replace')
+
+def read_json(request):
+    """
+    The JSON body of an analyze request. Big FEN batches are what the endpoint
+    is for, so it may be up to ANALYSIS_MAX_JSON_BYTES instead of Django's
+    DATA_UPLOAD_MAX_MEMORY_SIZE.
+    """
+    body = request.read(settings.ANALYSIS_MAX_JSON_BYTES + 1)
+    if len(body) > settings.ANALYSIS_MAX_JSON_BYTES:
+        raise ValueError(f'JSON body over {settings.ANALYSIS_MAX_JSON_BYTES} bytes; send FENs one per line instead')
+    return json.loads(body)
+
+def analysis_request(request):
+    """Return (positions, llm_config, concurrency) for an analyze request; raises ValueError if malformed."""
+    params = request.GET
+    if request.content_type == 'application/json':
+        data = read_json(request)
+        if 'fens' in data:
+            positions = fen_positions(data['fens'])
+        elif 'pgn' in data:
+            positions = pgn_positions(data['pgn'])
+        else:
+            raise ValueError('give "fens" or "pgn"')
+        llm_config = data.get('llm_config') or params_llm_config(request, params)
+        concurrency = data.get('concurrency')
+    elif request.content_type == 'multipart/form-data':
+        params = request.POST
+        if 'pgn' not in request.FILES:
+            raise ValueError('upload the games as a "pgn" file')
+        positions = pgn_positions(TextLines(request.FILES['pgn']))
+        llm_config = params_llm_config(request, params)
+        concurrency = params.get('concurrency')
+    elif request.content_type == 'application/x-chess-pgn':
+        positions = pgn_positions(TextLines(request))
+        llm_config = params_llm_config(request, params)
+        concurrency = params.get('concurrency')
+    else:
+        # One FEN per line, read as the analysis goes.
+        positions = fen_positions(line.decode('utf-8', 'replace').strip() for line in request if line.strip())
+        llm_config = params_llm_config(request, params)
+        concurrency = params.get('concurrency')
+    concurrency = min(int(concurrency or settings.ANALYSIS_CONCURRENCY), settings.ANALYSIS_MAX_CONCURRENCY)
+    return positions, llm_config, max(concurrency, 1)
+
+async def analyze(request):
+    """
+    Ask the configured player for a move in every position of a batch and
+    stream the answers back as NDJSON, one line per position in the order
+    they finish and a summary line last. Takes JSON ({"fens": [...]} or
+    {"pgn": "..."}, with "llm_config" and "concurrency"), a PGN upload, or
+    FENs one per line; the last two are read as the analysis goes and take
+    the player from ?model= (plus ?depth=, ?nodes=, ?time=, ?skill_level=
+    for stockfish) with the API key in an X-Api-Key header.
+
+    Every request must carry an X-Requested-With header. Browsers send a
+    custom header only after a CORS preflight, which this endpoint does not
+    answer (CORS_URLS_REGEX), so another site cannot make a visitor's
+    browser spend this server's engines or models.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    if 'X-Requested-With' not in request.headers:
+        return JsonResponse({'error': 'send an X-Requested-With header'}, status=403)
+    try:
+        # Reads the body, which may be large: not on the event loop.
+        positions, llm_config, concurrency = await sync_to_async(analysis_request, thread_sensitive=False)(request)
+    except (ValueError, TypeError, AttributeError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    player = create_player(llm_config)
+    if player is None and llm_config.get('model') == 'book':
+        return JsonResponse({'error': 'no opening book configured'}, status=400)
+    if player is None:
+        return JsonResponse({'error': f"unknown model {llm_config.get('model')!r}"}, status=400)
+    results = analyse_positions(player, positions, concurrency=concurrency,
+                                max_positions=settings.ANALYSIS_MAX_POSITIONS)
+
+    async def lines():
+        async for result in results:
+            yield json.dumps(result) + '\n'
+
+    return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+
+# API clients have no CSRF token; the X-Requested-With check above stops cross-site posts instead.
+analyze.csrf_exempt = True
+
+
+class GamePagination(CursorPagination):
+    # Keyset paging on the (created_at, id) index: deep pages cost the same as the first.
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class GameList(generics.ListAPIView):
+    """Game history, newest first, filtered by ?player=, ?model=, ?since= and ?until=."""
+    serializer_class = GameSerializer
+    pagination_class = GamePagination
+
+    def get_queryset(self):
+        games = Game.objects.all()
+        params = self.request.query_params
+        if params.get('player'):
+            games = games.filter(player=params['player'])
+        if params.get('model'):
+            games = games.filter(model=params['model'])
+        if params.get('since') and parse_datetime(params['since']):
+            games = games.filter(created_at__gte=parse_datetime(params['since']))
+        if params.get('until') and parse_datetime(params['until']):
+            games = games.filter(created_at__lt=parse_datetime(params['until']))
+        return games
+
+
+class GameDetail(generics.RetrieveAPIView):
+    """One game with all of its moves."""
+    serializer_class = GameDetailSerializer
+    queryset = Game.objects.prefetch_related('moves')
@@ -7,6 +7,8 @@ socket.onopen = function() {
   console.log('ChessLLM webSocket connection established.');
 };
 let resolve, promise;
+// Set once an AI move has arrived as move_streamed; its next_move_received only completes the comment.
+let streamed = false;
 
 export default function ChessBoard() {
   const [options, setOptions] = useState({white_player:'human', black_player:'ai', random: false, openai_key:'', model: 'ollama-llama3.1', board_state:''});
@@ -21,8 +23,22 @@ export default function ChessBoard() {
     socket.onmessage = function(event) {
       const data = JSON.parse(event.data);
       switch (data['message']) {
+        case 'game_started':
+          console.log('game id', data.game_id)
+          break
+        case 'move_streamed':
+          streamed = true
+          resolve({...data, comment: ''})
+          break
+        case 'comment_chunk':
+          setLastComment(comment => (comment || '') + data.delta)
+          break
         case'next_move_received':
-          if(promise){
+          if(streamed){
+            streamed = false
+            setLastComment(data.comment)
+            setStates(states => states.map((state, i) => i === states.length - 1 ? {...state, comment: data.comment} : state))
+          } else if(promise){
             console.log('next_move_received', data);
 
             resolve(data)
@@ -141,7 +157,10 @@ export default function ChessBoard() {
     }
     const llm_config = {'model': options.model, 'api_key': options.openai_key}
     const _options = {'white_player': options.white_player, 'black_player': options.black_player}
-    const msg_str = JSON.stringify({'message': 'start', 'llm_config': llm_config, 'options': _options, board_state:options.board_state})
+    // Pondering spends extra model calls, so not on the user's OpenAI key;
+    // the server never ponders for Stockfish.
+    const ponder = !isOpenAIModel(options.model) && options.model !== 'stockfish'
+    const msg_str = JSON.stringify({'message': 'start', 'stream': true, 'ponder': ponder, 'llm_config': llm_config, 'options': _options, board_state:options.board_state})
     socket.send(msg_str);
     // const makeFirstMoveObj = {'ai': makeAiMove, 'random': makeRandomMove, 'human': () => {}}
     if(game.turn()==='b'){
@@ -169,6 +188,7 @@ export default function ChessBoard() {
               <option value="openai-gpt-4o">Openai: gpt-4o</option>
               <option value="openai-gpt-4o-mini">Openai: gpt-4o-mini</option>
               <option value="ollama-llama3.1">Ollama: llama3.1</option>
+              <option value="stockfish">Engine: Stockfish</option>
             </select>
           </div>
           <div style={{ display: isOpenAIModel(options.model) ? "block" : "none"}}>
@@ -1,94 +1,526 @@
-
-from dotenv import load_dotenv
+import asyncio
+import functools
 import logging
-from langchain import hub
-from langchain.agents import AgentExecutor, create_react_agent
-from langgraph.constants import Send
-from langgraph.graph import END, StateGraph, START
-from langgraph.checkpoint.memory import MemorySaver
-
-from langchain.globals import set_verbose, set_debug
-from typing import List, TypedDict
-
-from langchain_core.prompts import ChatPromptTemplate
+import operator
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated, TypedDict
+
+from django.conf import settings
 from langchain_core.pydantic_v1 import BaseModel, Field
-from typing import List
+from langgraph.graph import END, StateGraph, START
+from langgraph.utils import RunnableCallable
+
+from .checkpointer import get_checkpointer, new_thread_id
+from .engine_pool import get_engine_pool
+from .game_record import encode_move, decode_moves, iter_board_states
+from .metrics import (HEDGE_SECONDS, LLM_COMPLETION_TOKENS, LLM_PROMPT_TOKENS, LLM_SECONDS, NODE_SECONDS,
+                      estimate_tokens)
+from .move_resolver import resolve_move, record_retries
+from .ponder import Ponderer
+from .position import analyse
+from .prompts import PromptBuilder
 
 import chess
 
+# Players without a native async implementation run here so that a slow move
+# (blocking HTTP call, engine search) never stalls the event loop.
+PLAYER_EXECUTOR_WORKERS = int(os.environ.get("CHESS_PLAYER_WORKERS", 64))
+_player_executor = None
+
+def get_player_executor():
+    global _player_executor
+    if _player_executor is None:
+        _player_executor = ThreadPoolExecutor(max_workers=PLAYER_EXECUTOR_WORKERS, thread_name_prefix="chess-player")
+    return _player_executor
+
+async def call_player_async(player, board):
+    """
+    Await a move from a player callable.
+
+    Players may expose a native coroutine as ``player.aplay``; anything else is
+    run on the bounded player executor.
+
+    Returns:
+        tuple: (move, comment) as returned by the player.
+    """
+    aplay = getattr(player, "aplay", None)
+    if aplay is not None:
+        return await aplay(board)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_player_executor(), player, board)
+
+async def call_player_stream(player, board):
+    """
+    Yield a player's (move, comment) while it is being generated.
+
+    Players may expose ``player.astream``, an async generator of partial
+    (move, comment) pairs, each field None until it starts and then growing.
+    Models usually generate the move first, but may write the comment first.
+    Other players yield their whole answer once.
+    """
+    astream = getattr(player, "astream", None)
+    if astream is None:
+        yield await call_player_async(player, board)
+        return
+    async for partial in astream(board):
+        yield partial
+
 class GraphState(TypedDict):
+    """
+    Compact game record. moves, messages and comments are append-only: nodes
+    return just the entries they add and the reducer extends the log. Moves
+    are 16-bit codes (see game_record), and earlier positions are replayed
+    from start_fen on demand instead of being stored.
+    """
     turn: str
     winner: str
     user_input: str
-    board_states: list
-    moves: list
-    messages: list
-    comments: list
+    start_fen: str
+    board_state: str
+    moves: Annotated[list, operator.add]
+    messages: Annotated[list, operator.add]
+    comments: Annotated[list, operator.add]
+
+def get_moves(state):
+    """Return the moves of a game state in UCI notation."""
+    return decode_moves(state["moves"])
+
+def get_board_states(state):
+    """Return the FEN of every position reached in a game state."""
+    return list(iter_board_states(state["start_fen"], state["moves"]))
 
 def get_user_input(board):
-    legal_moves = ", ".join([str(move) for move in board.legal_moves])
+    legal_moves = ", ".join(analyse(board).uci)
     print(f"Possible moves are: {legal_moves}")
     user_input = input("It's your turn. Please make your move.")
     return user_input
 
-def create_llm_ai_player(agent):
+def create_llm_ai_player(agent, cache=None):
+    """
+    Create a player that asks a ChessAgent for moves.
+
+    Args:
+        agent (ChessAgent): The agent to query.
+        cache (MoveCache): Optional transposition cache consulted before the
+            model and filled with its answers.
+    """
     def ai_player(board):
-        turn = 'white' if board.turn == chess.WHITE else 'black'
-        board_state = board.fen()
-        legal_moves = ", ".join([str(move) for move in board.legal_moves])
-        result = agent.invoke(board_state, turn, legal_moves)
+        if cache is not None:
+            cached = cache.get(board, agent.model_name, agent.prompt_version)
+            if cached:
+                return cached
+        result = agent.invoke(board)
         # move = chess.Move.from_uci(result.move)
+        if cache is not None:
+            cache.put(board, agent.model_name, agent.prompt_version, result.move, result.comment)
+        return result.move, result.comment
+
+    # The cache may wait on its SQLite file, shared with other workers: keep that off the event loop.
+    async def cache_get(board):
+        return await asyncio.get_running_loop().run_in_executor(
+            None, cache.get, board, agent.model_name, agent.prompt_version)
+
+    async def cache_put(board, move, comment):
+        await asyncio.get_running_loop().run_in_executor(
+            None, cache.put, board.copy(), agent.model_name, agent.prompt_version, move, comment)
+
+    async def aplay(board):
+        if cache is not None:
+            cached = await cache_get(board)
+            if cached:
+                return cached
+        result = await agent.ainvoke(board)
+        if cache is not None:
+            await cache_put(board, result.move, result.comment)
         return result.move, result.comment
+
+    async def astream(board):
+        if cache is not None:
+            cached = await cache_get(board)
+            if cached:
+                yield cached
+                return
+        move = comment = None
+        async for move, comment in agent.astream(board):
+            yield move, comment
+        if cache is not None and move:
+            await cache_put(board, move, comment or "")
+
+    ai_player.aplay = aplay
+    ai_player.astream = astream
     return ai_player
 
-def create_stock_fish_ai_player(stock_fish_path, skill_level=0):
-    engine = chess.engine.SimpleEngine.popen_uci(stock_fish_path)
-    # Configure Stockfish to a specific skill level
-    engine.configure({"Skill Level": skill_level})
+def create_opening_book_player(ai_player, book):
+    """
+    Put an opening book in front of another player.
+
+    Book positions are answered directly; everything else is passed on to
+    ``ai_player`` (LLM, Stockfish or any other player callable).
+
+    Args:
+        ai_player: The player used once the game leaves the book.
+        book (OpeningBook): The book to consult.
+    """
+    def book_player(board):
+        move = book.lookup(board)
+        if move is not None:
+            return move.uci(), "Book move."
+        return ai_player(board)
+
+    async def aplay(board):
+        move = book.lookup(board)
+        if move is not None:
+            return move.uci(), "Book move."
+        return await call_player_async(ai_player, board)
+
+    async def astream(board):
+        move = book.lookup(board)
+        if move is not None:
+            yield move.uci(), "Book move."
+            return
+        async for partial in call_player_stream(ai_player, board):
+            yield partial
+
+    book_player.aplay = aplay
+    book_player.astream = astream
+    return book_player
+
+def create_pondering_player(ai_player, ponderer):
+    """
+    Put a Ponderer in front of another player.
+
+    Positions pondered on the user's time are answered with the precomputed
+    reply; everything else, and sync calls, go to ``ai_player``.
+
+    Args:
+        ai_player: The player whose replies are pondered.
+        ponderer (Ponderer): Pondering the game's positions with ai_player.
+    """
+    def pondering_player(board):
+        return ai_player(board)
+
+    async def aplay(board):
+        result = await ponderer.take(board)
+        if result is not None:
+            return result
+        return await call_player_async(ai_player, board)
+
+    async def astream(board):
+        result = await ponderer.take(board)
+        if result is not None:
+            yield result
+            return
+        async for partial in call_player_stream(ai_player, board):
+            yield partial
+
+    pondering_player.aplay = aplay
+    pondering_player.astream = astream
+    return pondering_player
+
+def create_hedged_player(backends, delay):
+    """
+    Ask several players for the same move, each one only if the ones before
+    it are slow, and keep the first legal answer.
+
+    The first backend is asked right away. When it has not answered after
+    ``delay(tracker)`` seconds, with the tracker of the backend asked last,
+    or its answer is not a legal move, the next backend is asked as well;
+    the others keep running. The first legal move wins and the calls still
+    running are cancelled. Every answer's latency is recorded in its
+    backend's tracker, so the delays follow the backends; a cancelled call
+    records how long it had run, a lower bound, so a backend that stalls
+    and loses the race still raises its delay. Sync calls go to the first
+    backend only.
+
+    Args:
+        backends (list): (name, player, LatencyTracker) in order of preference.
+        delay: Function of a LatencyTracker returning the seconds to wait
+            before hedging, e.g. hedging.adaptive_delay.
+
+    Returns:
+        The last illegal answer when no backend found a legal move; raises
+        the last error when none answered at all.
+    """
+    def hedged_player(board):
+        return backends[0][1](board)
+
+    async def aplay(board):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        # task -> (name, tracker, start time)
+        running = {}
+        asked = 0
+        last_tracker = None
+        answer = error = None
+
+        def ask_next():
+            nonlocal asked, last_tracker
+            name, player, tracker = backends[asked]
+            running[asyncio.ensure_future(call_player_async(player, board))] = (name, tracker, loop.time())
+            asked += 1
+            last_tracker = tracker
+
+        ask_next()
+        try:
+            while running:
+                timeout = delay(last_tracker) if asked < len(backends) else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    ask_next()
+                    continue
+                for task in done:
+                    name, tracker, started = running.pop(task)
+                    try:
+                        move, comment = task.result()
+                    except Exception as e:
+                        logging.error(f"hedged backend {name} failed: {e}")
+                        error = e
+                        continue
+                    tracker.observe(loop.time() - started)
+                    if move is not None and resolve_move(board, move) is not None:
+                        HEDGE_SECONDS.observe(loop.time() - start, backend=name,
+                                              outcome="hedged" if asked > 1 else "direct")
+                        return move, comment
+                    answer = move, comment
+                if not running and asked < len(backends):
+                    ask_next()
+        finally:
+            now = loop.time()
+            for task, (_, tracker, started) in running.items():
+                task.cancel()
+                tracker.observe(now - started)
+        HEDGE_SECONDS.observe(loop.time() - start, backend="", outcome="failed")
+        if answer is None:
+            raise error
+        return answer
+
+    hedged_player.aplay = aplay
+    return hedged_player
+
+def create_engine_ai_player(pool, limit=None, options=None):
+    """
+    Create a player backed by a shared EnginePool.
+
+    Args:
+        pool (EnginePool): The pool to search on.
+        limit (dict | chess.engine.Limit): Search limit such as {"depth": 12};
+            the pool's default when omitted.
+        options (dict): UCI options for this player's searches only.
+    """
     def ai_player(board):
-        result = engine.play(board, chess.engine.Limit(time=0.001))
-        move = result.move
-        return move, ""
+        result = pool.play(board, limit=limit, options=options)
+        return result.move.uci(), ""
+
+    async def aplay(board):
+        result = await pool.aplay(board, limit=limit, options=options)
+        return result.move.uci(), ""
+
+    ai_player.aplay = aplay
     return ai_player
 
+def create_random_player(seed=None):
+    """Create a player that picks a uniformly random legal move."""
+    rng = random.Random(seed)
+
+    def random_player(board):
+        move = rng.choice(analyse(board).legal_moves)
+        return move.uci(), "Random move."
+
+    async def aplay(board):
+        return random_player(board)
+
+    random_player.aplay = aplay
+    return random_player
+
+def create_color_player(white_player, black_player):
+    """Combine two players into one that lets each play its own color."""
+    def color_player(board):
+        return (white_player if board.turn == chess.WHITE else black_player)(board)
+
+    async def aplay(board):
+        return await call_player_async(white_player if board.turn == chess.WHITE else black_player, board)
+
+    color_player.aplay = aplay
+    return color_player
+
+def create_stock_fish_ai_player(stock_fish_path, skill_level=0, limit=None):
+    # Configure Stockfish to a specific skill level, on the pool sized by the ENGINE_* settings.
+    pool = get_engine_pool(stock_fish_path, size=settings.ENGINE_POOL_SIZE, limit=settings.ENGINE_LIMIT,
+                           background_size=settings.ENGINE_BACKGROUND_SIZE)
+    return create_engine_ai_player(pool, limit=limit, options={"Skill Level": skill_level})
+
 
 class ChessIterable:
+    """
+    Steps a compiled game graph one ply at a time.
+
+    The graph is paused before interruption_node after every ply. Each call to
+    next resumes from that checkpoint with only the new user input and returns
+    the player_node update, so the cost of a move does not depend on how long
+    the game has been running.
+    """
     def __init__(self, app, config):
         initial_state = config['initial_state']
 
         self.app = app
-        self.state_values = initial_state
-        # self.stream = self.app.stream(initial_state, config, stream_mode="values")
+        self.initial_state = initial_state
+        self.started = False
         self.config = config
 
     def get_state(self):
         return self.app.get_state(self.config)
 
+    def plies(self):
+        """Plies played from the start position, as of the last step."""
+        return len(self.config["configurable"]["game"].board.move_stack)
+
+    def result(self):
+        """
+        The game's result as of the last step, '' while it goes on. Decided on
+        the game's board, whose move history repetitions need.
+        """
+        outcome = analyse(self.config["configurable"]["game"].board).outcome
+        return outcome.result() if outcome is not None else ''
+
+    def release(self):
+        """Free the checkpoints held for this game and stop its pondering."""
+        game = self.config["configurable"].get("game")
+        if game is not None and game.ponderer is not None:
+            game.ponderer.cancel()
+        release = getattr(self.app.checkpointer, "release", None)
+        if release is not None:
+            release(self.config["configurable"]["thread_id"])
+
     def next(self, user_input=None):
-        should_go = True
-        state = None
-        for event in self.app.stream(self.state_values, self.config, stream_mode="values"):
-            pass
-        # while should_go:
-        #     self.iter.__next__()
-        #     state = self.get_state()
-        #     if state.next[0] == "interruption_node":
-        #         should_go =False
+        if not self.started:
+            # Run START -> board_node and stop at the interrupt.
+            for event in self.app.stream(self.initial_state, self.config, stream_mode="updates"):
+                pass
+            self.started = True
+
         self.app.update_state(self.config, {"user_input": user_input}, as_node="interruption_node")
 
-        continued_stream = self.app.stream(None, self.config, stream_mode="values")
+        results = None
+        for event in self.app.stream(None, self.config, stream_mode="updates"):
+            if "player_node" in event:
+                results = event["player_node"]
+        return results
+
+    async def astart(self):
+        """
+        Run START -> board_node and stop at the interrupt, so the game is in
+        the checkpointer before its first move. A no-op once started.
+        """
+        if not self.started:
+            async for event in self.app.astream(self.initial_state, self.config, stream_mode="updates"):
+                pass
+            self.started = True
+
+    def ponder(self):
+        """
+        Start computing the AI's answers to the user's likely replies, see
+        Chess.enable_pondering. Call once the AI has moved and the user is to
+        move; a no-op for games without pondering.
+        """
+        self.config["configurable"]["game"].ponder()
 
-        it = iter(continued_stream)
-        it.__next__() # interruption node
-        results = it.__next__() # player node
+    async def anext(self, user_input=None, listener=None):
+        """
+        Async counterpart of next: drives the graph with astream so that the
+        player call is awaited instead of blocking the event loop.
+
+        Args:
+            user_input (str): The user's move, None for an AI move.
+            listener: Optional coroutine function called with {"type": "move",
+                "move", "board_state"} as soon as an AI move is known and then
+                with {"type": "comment", "delta"} as its comment streams in.
+        """
+        config = self.config
+        if listener is not None:
+            config = {**config, "configurable": {**config["configurable"], "listener": listener}}
+        await self.astart()
 
-        state = self.get_state()
-        self.state_values = state.values
+        await self.app.aupdate_state(self.config, {"user_input": user_input}, as_node="interruption_node")
+
+        results = None
+        async for event in self.app.astream(None, config, stream_mode="updates"):
+            if "player_node" in event:
+                results = event["player_node"]
         return results
 
 
+### Shared graph
+# The graph topology is the same for every game, so it is compiled once per
+# process. Nodes look up the game they act on from config["configurable"]["game"].
+
+def get_game(config):
+    return config["configurable"]["game"]
+
+def board_node(state: GraphState, config):
+    with NODE_SECONDS.time(node="board_node"):
+        return get_game(config).board_node(state)
+
+def player_node(state: GraphState, config):
+    with NODE_SECONDS.time(node="player_node"):
+        return get_game(config).player_node(state)
+
+async def aplayer_node(state: GraphState, config):
+    with NODE_SECONDS.time(node="player_node"):
+        return await get_game(config).aplayer_node(state, config["configurable"].get("listener"))
+
+def interruption_node(state: GraphState, config):
+    with NODE_SECONDS.time(node="interruption_node"):
+        return get_game(config).interruption_node(state)
+
+def finish_node(state: GraphState, config):
+    with NODE_SECONDS.time(node="finish_node"):
+        return get_game(config).finish_node(state)
+
+def decide_finish(state: GraphState, config):
+    return get_game(config).decide_finish(state)
+
+def build_workflow():
+    workflow = StateGraph(GraphState)
+    workflow.add_node("board_node", board_node)
+    workflow.add_node("player_node", RunnableCallable(player_node, aplayer_node, name="player_node", trace=False))
+    workflow.add_node("interruption_node", interruption_node)
+    workflow.add_node("finish_node", finish_node)
+
+    # Build graph
+    workflow.add_edge(START, "board_node")
+    workflow.add_conditional_edges(
+        "board_node",
+        decide_finish,
+        {
+            "finish": "finish_node",
+            "play": "interruption_node"
+        },
+    )
+    workflow.add_edge("interruption_node", "player_node")
+    workflow.add_edge("player_node", "board_node")
+    workflow.add_edge("finish_node", END)
+    return workflow
+
+@functools.lru_cache(maxsize=16)
+def compile_graph(checkpointer=None, interrupt_before=()):
+    """
+    Compile the game graph once per (checkpointer, interrupt_before) pair.
+
+    Args:
+        checkpointer: Checkpoint saver shared by every game using this graph.
+        interrupt_before (tuple): Node names to pause before.
+
+    Returns:
+        CompiledGraph: The cached compiled graph.
+    """
+    return build_workflow().compile(checkpointer=checkpointer, interrupt_before=list(interrupt_before))
+
+
 class Chess:
-    def __init__(self, ai_player=None, user_player=get_user_input, config=None, player_config=None, board_state=None, verbose=False, comment=True, max_moves=10):
+    def __init__(self, ai_player=None, user_player=get_user_input, config=None, player_config=None, board_state=None, verbose=False, comment=True, max_moves=10, max_retries=3):
         logger = logging.getLogger()
         if verbose:
             logging.basicConfig(level=logging.INFO)
@@ -98,12 +530,14 @@ class Chess:
         self.compiled = False
         self.workflow = None
         self.ai_player = ai_player
+        self.ponderer = None
         self.user_player = get_user_input
 
         # self.workflow = StateGraph(GraphState)
         self.comment = comment
         self.max_moves = max_moves
-        self.config = config or {"configurable": {"thread_id": "1"}}
+        self.max_retries = max_retries
+        self.config = config or {"configurable": {"thread_id": new_thread_id()}}
         self.player_config = player_config or {'white': 'ai', 'black':'ai'}
         if not ai_player:
             self.set_player('white', 'user')
@@ -120,18 +554,85 @@ class Chess:
     def set_config(self, config):
         self.config = config
 
-    def get_iterable(self, board_state=None):
-        memory = MemorySaver()
+    def enable_pondering(self, width=3, budget=None, predictor=None):
+        """
+        Let the AI think on the user's time: ponder() starts computing its
+        answers to the user's ``width`` likely replies, and a predicted reply
+        is then answered without waiting for the player. See Ponderer.
+        """
+        self.ponderer = Ponderer(functools.partial(call_player_async, self.ai_player), width=width,
+                                 budget=budget, predictor=predictor)
+        self.ai_player = create_pondering_player(self.ai_player, self.ponderer)
+
+    def ponder(self):
+        if self.ponderer is not None:
+            self.ponderer.start(self.board)
+
+    def get_iterable(self, board_state=None, checkpointer=None, moves=None, comments=None):
+        """
+        Args:
+            board_state (str): FEN the game starts from.
+            checkpointer: Checkpoint saver, the shared one by default.
+            moves (list): UCI moves already played from board_state, to
+                resume a game.
+            comments (list): The comments of those moves.
+        """
+        memory = checkpointer if checkpointer is not None else get_checkpointer()
         if board_state:
             self.board = chess.Board(board_state)
         else:
             board_state = self.board.fen()
+        for move in moves or ():
+            self.board.push_uci(move)
 
-        initial_state = {"turn": 'white' if self.board.turn == chess.WHITE else 'black', "messages":[("system", "")], "winner": "",
-                           "board_states": [board_state], "moves": [], "comments": ["Play!"]}
+        initial_state = self.initial_state(board_state, moves, comments)
         app = self.compile(checkpointer=memory, interrupt_before=["interruption_node"])
 
-        return ChessIterable(app, {**self.config, "initial_state": initial_state, "board_state": board_state})
+        return ChessIterable(app, {**self.graph_config(), "initial_state": initial_state, "board_state": board_state})
+
+    def attach_iterable(self, checkpointer=None):
+        """
+        Continue the game checkpointed under self.config's thread id, e.g. one
+        started by another worker sharing the checkpointer.
+
+        Returns:
+            ChessIterable: The game, or None when the checkpointer has no state
+            for the thread.
+        """
+        memory = checkpointer if checkpointer is not None else get_checkpointer()
+        app = self.compile(checkpointer=memory, interrupt_before=["interruption_node"])
+        config = self.graph_config()
+        state = app.get_state(config).values
+        # A thread with no checkpoint still reports the empty append-only lists.
+        if not state.get("board_state"):
+            return None
+        self.sync_board(state)
+        chess_iter = ChessIterable(app, {**config, "initial_state": state, "board_state": state["start_fen"]})
+        chess_iter.started = True
+        return chess_iter
+
+    def sync_board(self, state):
+        """
+        Rebuild self.board from the game state when they disagree. The board
+        lives in this process only, so it is stale whenever another worker
+        played the last ply of a game kept in a shared checkpointer.
+        """
+        if analyse(self.board).fen == state["board_state"]:
+            return
+        self.board = chess.Board(state["start_fen"])
+        for move in get_moves(state):
+            self.board.push_uci(move)
+
+    def initial_state(self, board_state, moves=None, comments=None):
+        moves = moves or []
+        comments = comments if comments is not None else [""] * len(moves)
+        return {"turn": 'white' if self.board.turn == chess.WHITE else 'black', "messages":[("system", "")], "winner": "",
+                "start_fen": board_state, "board_state": self.board.fen() if moves else board_state,
+                "moves": [encode_move(move) for move in moves], "comments": ["Play!", *comments]}
+
+    def graph_config(self):
+        """Return self.config with this game attached for the shared graph nodes."""
+        return {**self.config, "configurable": {**self.config.get("configurable", {}), "game": self}}
 
     def stream(self, initial_state=None, board_state=None, stream_mode="values"):
         board_state = board_state or self.board.fen()
@@ -139,9 +640,8 @@ class Chess:
             app = self.compile()
         else:
             app = self.workflow
-        initial_state = initial_state or {"turn": 'white' if self.board.turn == chess.WHITE else 'black', "messages":[("system", "")], "winner": "",
-                           "board_states": [board_state], "moves": [], "comments": ["Play!"]}
-        return app.stream(initial_state, self.config, stream_mode=stream_mode)
+        initial_state = initial_state or self.initial_state(board_state)
+        return app.stream(initial_state, self.graph_config(), stream_mode=stream_mode)
 
     def invoke(self, initial_state=None, board_state=None):
         board_state = board_state or self.board.fen()
@@ -149,46 +649,24 @@ class Chess:
             app = self.compile()
         else:
             app = self.workflow
-        initial_state = initial_state or {"turn": 'white' if self.board.turn == chess.WHITE else 'black', "messages":[("system", "")], "winner": "",
-                           "board_states": [board_state], "moves": [], "comments": ["Play!"]}
-        return app.invoke(initial_state)
+        initial_state = initial_state or self.initial_state(board_state)
+        return app.invoke(initial_state, self.graph_config())
 
     def compile(self, checkpointer=None, interrupt_before=[]):
-        workflow = StateGraph(GraphState)
-        workflow.add_node("board_node", self.board_node)
-        workflow.add_node("player_node", self.player_node)
-        workflow.add_node("interruption_node", self.interruption_node)
-        workflow.add_node("finish_node", self.finish_node)
-
-        # Build graph
-        workflow.add_edge(START, "board_node")
-        workflow.add_conditional_edges(
-            "board_node",
-            self.decide_finish,
-            {
-                "finish": "finish_node",
-                "play": "interruption_node"
-            },
-        )
-        workflow.add_edge("interruption_node", "player_node")
-        workflow.add_edge("player_node", "board_node")
-        workflow.add_edge("finish_node", END)
-        self.workflow = workflow.compile(checkpointer=checkpointer, interrupt_before=interrupt_before)
+        self.workflow = compile_graph(checkpointer, tuple(interrupt_before))
         self.compiled = True
         return self.workflow
 
     def get_legal_moves(self):
-        return [str(move) for move in self.board.legal_moves]
+        return analyse(self.board).uci
 
     def make_move(self, move_str):
-        # print(f'make move {self.board.legal_moves}')
-        move = chess.Move.from_uci(move_str)
-        # print(move_str)
-        # print(move in self.board.legal_moves)
-        if move in self.board.legal_moves:
+        # Accepts UCI, SAN and the other spellings models produce, see resolve_move.
+        move = resolve_move(self.board, move_str)
+        if move is not None:
             self.board.push(move)
         else:
-            logging.error(f"move {move} is invalid.")
+            logging.error(f"move {move_str} is invalid.")
             return None
 
         # Get the piece name.
@@ -216,7 +694,7 @@ class Chess:
         """
         # State
         winner = state["winner"]
-        messages = state["messages"]
+        messages = []
 
         if winner=="white":
             messages += [("system", "White player wins!")]
@@ -225,14 +703,15 @@ class Chess:
         elif winner=="draw":
             messages += [("system", "Draw!")]
 
-        return {**state, "messages": messages}
+        return {"messages": messages}
 
     def interruption_node(self,  state: GraphState):
         """
         Pseudo node for human-in-the-loop interactions
         """
-        print(f"interupt: {state}")
-        return state
+        # Lazy formatting: the state grows with the game and is only shown when verbose.
+        logging.info("interrupt: %s", state)
+        return {"user_input": state["user_input"]}
 
     def board_node(self, state: GraphState):
         """
@@ -248,28 +727,29 @@ class Chess:
 
         # State
         turn = state["turn"]
-        # board_states = state["board_states"]
-        # moves = state["moves"]
         winner = state["winner"]
         comments = state["comments"]
         messages = state["messages"]
 
         if self.comment:
             print(f"{comments[-1]}\n {messages[-1][1]}\n")
-        print(f"{self.board}\n\n###############")
+        logging.info("%s\n\n###############", self.board)
 
-        board = self.board
-        if board.is_checkmate():
+        self.sync_board(state)
+        # One pass over the legal moves, shared with the player and make_move of this ply.
+        outcome = analyse(self.board).outcome
+        if outcome is not None and outcome.termination == chess.Termination.CHECKMATE:
             if turn == 'black':
                 winner = "black"
             else:
                 winner = "white"
-        elif board.is_stalemate() or board.is_insufficient_material() or board.is_seventyfive_moves() or board.is_fivefold_repetition() or board.is_variant_draw():
+        elif outcome is not None:
             winner = "draw"
 
-        return {**state, "winner": winner}
+        return {"winner": winner}
 
     def player_node(self, state: GraphState):
+        self.sync_board(state)
         turn = 'white' if self.board.turn == chess.WHITE else 'black'
         user_input = state['user_input']
         logging.info('____PLAYER NODE____')
@@ -287,6 +767,29 @@ class Chess:
         elif self.player_config[turn] == 'ai':
             return self.ai_player_node(state)
 
+    async def aplayer_node(self, state: GraphState, listener=None):
+        """
+        Async counterpart of player_node used when the graph is driven by astream.
+        """
+        self.sync_board(state)
+        turn = 'white' if self.board.turn == chess.WHITE else 'black'
+        user_input = state['user_input']
+        logging.info('____PLAYER NODE____')
+
+        if user_input or self.player_config[turn] == 'user':
+            if not user_input:
+                # user_player reads from stdin, keep the read off the event
+                # loop; the move is made on it, where the ponderer's tasks are.
+                loop = asyncio.get_running_loop()
+                user_input = await loop.run_in_executor(get_player_executor(), self.user_player, self.board)
+            new_state = self.user_move_update(turn, user_input)
+            if new_state['user_input'] == 'invalid_move':
+                logging.warning('invalid move: ai will make a move for you.')
+                return await self.aai_player_node(state, listener)
+            return new_state
+        elif self.player_config[turn] == 'ai':
+            return await self.aai_player_node(state, listener)
+
     def user_player_node(self, state: GraphState):
         """
         Find suitable tool to solve the problem
@@ -300,24 +803,22 @@ class Chess:
         logging.info('____USER PLAYER SUBNODE____')
         # State
         turn = 'white' if self.board.turn==chess.WHITE else 'black'
-        board_states = state["board_states"]
-        moves = state["moves"]
-        messages = state["messages"]
         user_input = state["user_input"]
-        comments = state["comments"]
 
         user_input = user_input if user_input else self.user_player(self.board)
+        return self.user_move_update(turn, user_input)
+
+    def user_move_update(self, turn, user_input):
+        """Play the user's move, or return {"user_input": "invalid_move"} if it is not legal."""
         move_result = self.make_move(user_input)
         is_move_valid = move_result is not None
         # print(f"is_move_valid {is_move_valid}")
 
         if is_move_valid:
             logging.info(f"Human {turn} player made a move: {user_input}")
-            board_states.append(self.board.fen())
-            moves.append(user_input)
-            messages.append(("user", move_result))
-            comments.append("")
-            return {**state, "board_states": board_states, "moves": moves, "turn": turn, "comments":comments, "messages": messages, "user_input":None }
+            if self.ponderer is not None:
+                self.ponderer.played(self.board)
+            return {"board_state": analyse(self.board).fen, "moves": [encode_move(self.board.peek())], "turn": turn, "comments": [""], "messages": [("user", move_result)], "user_input": None}
         else:
             return {"user_input": "invalid_move"}
 
@@ -336,26 +837,98 @@ class Chess:
         is_move_valid = False
         # State
         turn = 'white' if self.board.turn==chess.WHITE else 'black'
-        board_states = state["board_states"]
-        moves = state["moves"]
-        messages = state["messages"]
-        comments = state["comments"]
 
-        board_state = self.board.fen()
         # legal_moves = self.get_legal_moves()
+        retries = 0
         while not is_move_valid:
             move, comment = self.ai_player(self.board)
+            move, comment = self.check_retries(move, comment, retries)
             move_result = self.make_move(move)
             is_move_valid = move_result is not None
+            retries += not is_move_valid
 
-        logging.info(f"AI {turn} player made a move: {move}")
+        record_retries(retries)
+        return self.ai_move_update(turn, move_result, comment)
 
-        board_states.append(board_state)
-        moves.append(move)
-        messages.append((f"ai {turn} player", move_result))
-        comments.append(f"AI {turn} player: {comment}")
+    async def aai_player_node(self, state: GraphState, listener=None):
+        """
+        Async counterpart of ai_player_node, awaits the player instead of blocking.
+        """
+        logging.info('____AI PLAYER SUBNODE____')
+        is_move_valid = False
+        turn = 'white' if self.board.turn==chess.WHITE else 'black'
+        if listener is not None:
+            return await self.astream_ai_player_node(turn, listener)
+
+        retries = 0
+        while not is_move_valid:
+            move, comment = await call_player_async(self.ai_player, self.board)
+            move, comment = self.check_retries(move, comment, retries)
+            move_result = self.make_move(move)
+            is_move_valid = move_result is not None
+            retries += not is_move_valid
+
+        record_retries(retries)
+        return self.ai_move_update(turn, move_result, comment)
+
+    async def astream_ai_player_node(self, turn, listener):
+        """
+        Play the AI move as soon as the player has generated it, then pass its
+        comment on to listener while the rest is still being generated.
+        """
+        retries = 0
+        while True:
+            stream = call_player_stream(self.ai_player, self.board)
+            move = comment = None
+            move_first = None
+            async for move, comment in stream:
+                if move_first is None and (move is not None or comment is not None):
+                    move_first = move is not None
+                # A move generated first is final once the comment starts;
+                # one generated after the comment only at the end of the stream.
+                if move_first and comment is not None:
+                    break
+            move, played_comment = self.check_retries(move, comment, retries)
+            move_result = self.make_move(move)
+            if move_result is not None:
+                break
+            retries += 1
+            await stream.aclose()
+
+        record_retries(retries)
+        await listener({"type": "move", "move": self.board.peek(), "board_state": analyse(self.board).fen})
+        if played_comment != comment:
+            # A fallback move, the player's comment is about something else.
+            await stream.aclose()
+            await listener({"type": "comment", "delta": played_comment})
+            return self.ai_move_update(turn, move_result, played_comment)
+
+        comment = comment or ""
+        if comment:
+            await listener({"type": "comment", "delta": comment})
+        async for _, partial in stream:
+            partial = partial or ""
+            if len(partial) > len(comment):
+                await listener({"type": "comment", "delta": partial[len(comment):]})
+                comment = partial
+        return self.ai_move_update(turn, move_result, comment)
+
+    def check_retries(self, move, comment, retries):
+        """
+        Replace the player's move with a random legal one once it has failed
+        max_retries times, so a confused model cannot stall the game.
+        """
+        if retries < self.max_retries or resolve_move(self.board, move) is not None:
+            return move, comment
+        logging.error(f"AI player gave no legal move after {retries} retries, playing a random move.")
+        return random.choice(analyse(self.board).legal_moves), "No legal move given, played a random move."
 
-        return {**state, "board_states": board_states, "moves": moves, "turn": turn, "messages": messages, "comments": comments}
+    def ai_move_update(self, turn, move_result, comment):
+        move = self.board.peek()
+        logging.info(f"AI {turn} player made a move: {move.uci()}")
+
+        return {"board_state": analyse(self.board).fen, "moves": [encode_move(move)], "turn": turn,
+                "messages": [(f"ai {turn} player", move_result)], "comments": [f"AI {turn} player: {comment}"]}
 
     ### Edges
     def decide_finish(self, state: GraphState):
@@ -384,24 +957,91 @@ class Move(BaseModel):
     comment: str = Field(description="your comment for the move")
 
 
-class ChessAgent:
-    prompt_template = """You are a chess expert, the current board's Forsyth–Edwards notation (FEN) is {board_state}, and it's {turn} turn. 
-                Possible next moves are: {legal_moves}. Please make next move based on current board position."""
+def model_name(llm):
+    """The name a client is labelled with in metrics and the move cache."""
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
 
-    def __init__(self, llm):
+
+class ChessAgent:
+    """
+    Asks a model for moves.
+
+    Args:
+        llm: LangChain model supporting with_structured_output.
+        batch_scheduler (BatchScheduler): Optional scheduler shared across
+            games; async calls go through it.
+        prompt_builder (PromptBuilder): Builds the prompt for a position, a
+            compact one without move history by default.
+    """
+
+    def __init__(self, llm, batch_scheduler=None, prompt_builder=None):
         self.llm = llm
         self.structured_llm = llm.with_structured_output(Move)
+        self.batch_scheduler = batch_scheduler
+        self.prompt_builder = prompt_builder or PromptBuilder()
+        self.model_name = model_name(llm)
+
+    @property
+    def prompt_version(self):
+        # Part of the move cache key, so answers to other prompts are not reused.
+        return self.prompt_builder.key
+
+    def invoke(self, board):
+        prompt = self.prompt_builder.build(board)
+        with LLM_SECONDS.time(model=self.model_name, mode="invoke"):
+            move = self.structured_llm.invoke(prompt)
+        self.record_tokens(prompt, move)
+        return move
 
-    def invoke(self, board_state, turn, legal_moves):
-        prompt = self.prompt_template.format(board_state=board_state, turn=turn, legal_moves=legal_moves)
-        move = self.structured_llm.invoke(prompt)
+    async def ainvoke(self, board):
+        prompt = self.prompt_builder.build(board)
+        if self.batch_scheduler is not None:
+            with LLM_SECONDS.time(model=self.model_name, mode="batch"):
+                move = await self.batch_scheduler.submit(prompt)
+        else:
+            with LLM_SECONDS.time(model=self.model_name, mode="ainvoke"):
+                move = await self.structured_llm.ainvoke(prompt)
+        self.record_tokens(prompt, move)
         return move
 
-def create_ai_chess_app(llm, board_state, ai_agent=None, config=None):
-    config = config or {"configurable": {"thread_id": "1"}, "recursion_limit": 100}
-    chess_ai_agent = ai_agent(llm) if ai_agent else ChessAgent(llm)
-    llm_ai_player = create_llm_ai_player(chess_ai_agent)
+    async def astream(self, board):
+        """
+        Yield (move, comment) as the structured output is generated. Streaming
+        skips the batch scheduler: it trades throughput for time to first move.
+        """
+        prompt = self.prompt_builder.build(board)
+        start = time.perf_counter()
+        move = comment = None
+        async for chunk in self.structured_llm.astream(prompt):
+            if isinstance(chunk, dict):
+                move, comment = chunk.get("move"), chunk.get("comment")
+            else:
+                move, comment = getattr(chunk, "move", None), getattr(chunk, "comment", None)
+            yield move, comment
+        LLM_SECONDS.observe(time.perf_counter() - start, model=self.model_name, mode="astream")
+        self.record_tokens(prompt, Move(move=move or "", comment=comment or ""))
+
+    def record_tokens(self, prompt, move):
+        LLM_PROMPT_TOKENS.observe(estimate_tokens(prompt), model=self.model_name)
+        LLM_COMPLETION_TOKENS.observe(estimate_tokens(move.move) + estimate_tokens(move.comment), model=self.model_name)
+
+def create_ai_chess_app(llm, board_state, ai_agent=None, config=None, move_cache=None, opening_book=None, batch_scheduler=None):
+    config = config or {"configurable": {"thread_id": new_thread_id()}, "recursion_limit": 100}
+    chess_ai_agent = ai_agent(llm) if ai_agent else ChessAgent(llm, batch_scheduler=batch_scheduler)
+    llm_ai_player = create_llm_ai_player(chess_ai_agent, cache=move_cache)
+    if opening_book is not None:
+        llm_ai_player = create_opening_book_player(llm_ai_player, opening_book)
 
     chess_app = Chess(ai_player=llm_ai_player, board_state=board_state)
     chess_app.set_config(config)
     return chess_app
+
+def create_engine_chess_app(pool, board_state, limit=None, options=None, config=None, opening_book=None):
+    config = config or {"configurable": {"thread_id": new_thread_id()}, "recursion_limit": 100}
+    engine_ai_player = create_engine_ai_player(pool, limit=limit, options=options)
+    if opening_book is not None:
+        engine_ai_player = create_opening_book_player(engine_ai_player, opening_book)
+
+    chess_app = Chess(ai_player=engine_ai_player, board_state=board_state)
+    chess_app.set_config(config)
+    return chess_app
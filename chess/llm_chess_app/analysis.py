@@ -0,0 +1,107 @@
+import asyncio
+import io
+import time
+
+import chess
+import chess.pgn
+
+from .ai_chess_app import call_player_async
+from .move_resolver import resolve_move
+from .position import analyse
+
+
+def fen_positions(fens):
+    """Yield (meta, board) for each FEN; board is None for an invalid one."""
+    for index, fen in enumerate(fens):
+        meta = {"index": index, "fen": fen}
+        try:
+            yield meta, chess.Board(fen)
+        except (TypeError, ValueError):
+            yield meta, None
+
+
+def pgn_positions(pgn):
+    """
+    Yield (meta, board) for the position before every mainline move of every
+    game in a PGN string or anything with a text readline(), read one game
+    at a time. meta records the game, the ply and the move played there.
+    """
+    if isinstance(pgn, str):
+        pgn = io.StringIO(pgn)
+    index = 0
+    game_index = 0
+    while True:
+        game = chess.pgn.read_game(pgn)
+        if game is None:
+            return
+        board = game.board()
+        for ply, move in enumerate(game.mainline_moves()):
+            yield {"index": index, "game": game_index, "ply": ply, "played": move.uci(), "fen": board.fen()}, board.copy()
+            board.push(move)
+            index += 1
+        game_index += 1
+
+
+async def analyse_position(player, meta, board):
+    """Return meta with the player's move (UCI and SAN) and comment for board, or an error."""
+    if board is None:
+        return {**meta, "error": "invalid FEN"}
+    if analyse(board).outcome is not None:
+        return {**meta, "error": "game over"}
+    try:
+        raw, comment = await call_player_async(player, board)
+    except Exception as e:
+        return {**meta, "error": f"{type(e).__name__}: {e}"}
+    if raw is None:
+        # A book-only player out of book.
+        return {**meta, "move": None, "comment": comment}
+    move = resolve_move(board, raw)
+    if move is None:
+        return {**meta, "move": None, "comment": comment, "error": f"illegal move {str(raw)[:32]!r}"}
+    return {**meta, "move": move.uci(), "san": board.san(move), "comment": comment}
+
+
+async def analyse_positions(player, positions, concurrency=8, max_positions=None):
+    """
+    Yield analyse_position results in the order they finish, with at most
+    ``concurrency`` positions in flight. positions, an iterable of
+    (meta, board) such as fen_positions or pgn_positions, is read only as
+    fast as results come back, so a huge batch never sits in memory, and
+    on an executor thread, so a slow body never blocks the loop. Closing the generator cancels the positions still running.
+
+    Finishes with a summary: {"done": true, "positions", "errors",
+    "seconds", "truncated"}, truncated when positions held more than
+    max_positions.
+    """
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    positions = iter(positions)
+    pending = set()
+    count = errors = read = 0
+    exhausted = truncated = False
+    try:
+        while True:
+            while not exhausted and len(pending) < concurrency:
+                # Reading may wait on the request body or parse a PGN game: not on the loop.
+                item = await loop.run_in_executor(None, next, positions, None)
+                if item is not None and max_positions is not None and read >= max_positions:
+                    truncated = True
+                    item = None
+                if item is None:
+                    exhausted = True
+                    break
+                read += 1
+                pending.add(asyncio.ensure_future(analyse_position(player, *item)))
+            if not pending:
+                break
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                count += 1
+                errors += "error" in result
+                yield result
+    finally:
+        for task in pending:
+            task.cancel()
+    yield {"done": True, "positions": count, "errors": errors, "seconds": round(time.perf_counter() - start, 3),
+           "truncated": truncated}
@@ -7,16 +7,30 @@ For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
 
+import logging
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
-from . import routing
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chess.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'llm_chess_app.settings')
+
+# Set up Django before routing imports the consumers and, through them, models.
+django_asgi_app = get_asgi_application()
+
+from . import routing  # noqa: E402
+from .llm_clients import OPENAI_MODELS, get_llm_registry  # noqa: E402
+
+# Load the configured models now rather than on the first move. OpenAI clients
+# are per API key and games bring their own, so there is none to warm up.
+for model in settings.LLM_WARM_UP:
+    if model in OPENAI_MODELS:
+        logging.warning(f"not warming up {model}: games use their own API key.")
+    else:
+        get_llm_registry().warm_up(model)
 
-# application = get_asgi_application()
 application = ProtocolTypeRouter({
-	"http": get_asgi_application(),
+	"http": django_asgi_app,
     "websocket": URLRouter(routing.websocket_urlpatterns),
 })
\ No newline at end of file
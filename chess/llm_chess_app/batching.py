@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import weakref
+from collections import Counter
+
+from .metrics import LLM_BATCH_FILL, LLM_BATCH_SIZE
+
+
+class PendingBatch:
+    """The prompts of one event loop waiting to be sent, and the timer that sends them."""
+
+    def __init__(self):
+        self.requests = []
+        self.timer = None
+
+
+class BatchScheduler:
+    """
+    Collects model requests from many games into batches.
+
+    Prompts submitted within ``max_wait`` seconds of each other, up to
+    ``max_batch_size`` of them, are sent together through the runnable's
+    ``abatch``, and each caller gets back the answer to its own prompt.
+    This only saves calls when ``abatch`` sends one request for the whole
+    batch, as FakeStructuredLLM does. LangChain's default ``abatch``, used by
+    the Ollama client, runs one ``ainvoke`` per prompt, so there batching
+    only adds up to ``max_wait`` to every request.
+
+    The scheduler is shared process-wide with its client, but a batch only
+    holds prompts of one event loop: their futures and the flush timer belong
+    to that loop. Each loop gets its own pending batch, dropped with the loop.
+
+    Args:
+        runnable: A LangChain runnable with ``abatch``, e.g. a structured LLM.
+        max_batch_size (int): Flush as soon as this many prompts are pending.
+        max_wait (float): Seconds the first pending prompt may wait for others.
+        model (str): The model label of the batch size metrics.
+    """
+
+    def __init__(self, runnable, max_batch_size=16, max_wait=0.005, model=""):
+        self.runnable = runnable
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.model = model
+        self.pending = weakref.WeakKeyDictionary()
+        self.batch_sizes = Counter()
+        self.lock = threading.Lock()
+
+    def pending_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = self.pending.get(loop)
+        if batch is None:
+            batch = self.pending[loop] = PendingBatch()
+        return batch
+
+    async def submit(self, prompt):
+        pending = self.pending_batch()
+        future = asyncio.get_running_loop().create_future()
+        pending.requests.append((prompt, future))
+        if len(pending.requests) >= self.max_batch_size:
+            self.flush(pending)
+        elif pending.timer is None:
+            pending.timer = asyncio.get_running_loop().call_later(self.max_wait, self.flush, pending)
+        return await future
+
+    def flush(self, pending):
+        if pending.timer is not None:
+            pending.timer.cancel()
+            pending.timer = None
+        batch = pending.requests[:self.max_batch_size]
+        pending.requests = pending.requests[self.max_batch_size:]
+        if pending.requests:
+            pending.timer = asyncio.get_running_loop().call_later(self.max_wait, self.flush, pending)
+        if batch:
+            with self.lock:
+                self.batch_sizes[len(batch)] += 1
+            LLM_BATCH_SIZE.observe(len(batch), model=self.model)
+            LLM_BATCH_FILL.observe(len(batch) / self.max_batch_size, model=self.model)
+            asyncio.ensure_future(self.run(batch))
+
+    async def run(self, batch):
+        prompts = [prompt for prompt, _ in batch]
+        try:
+            results = await self.runnable.abatch(prompts, return_exceptions=True)
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        with self.lock:
+            batch_sizes = Counter(self.batch_sizes)
+        batches = sum(batch_sizes.values())
+        requests = sum(size * count for size, count in batch_sizes.items())
+        return {"batches": batches, "requests": requests,
+                "mean_batch_size": requests / batches if batches else 0.0,
+                "mean_fill": requests / (batches * self.max_batch_size) if batches else 0.0,
+                "batch_sizes": dict(sorted(batch_sizes.items()))}
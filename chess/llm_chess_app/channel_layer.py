@@ -0,0 +1,237 @@
+import asyncio
+import json
+import random
+import sqlite3
+import string
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+
+class SQLiteChannelLayer(BaseChannelLayer):
+    """
+    Channel layer kept in a SQLite file, so the worker processes of one host
+    can message each other's consumers without a Redis server. Use
+    channels_redis.core.RedisChannelLayer instead once workers run on more
+    than one host.
+
+    Messages are stored as JSON. Each process reads the messages of its own
+    consumers with one polling task, every ``poll_interval`` seconds while any
+    channel has been received from in the last ``expiry`` seconds, and all
+    database access runs on one thread so the event loop never waits on a
+    file lock.
+
+    Args:
+        path (str): The database file, shared by all workers.
+        expiry (float): Seconds an undelivered message is kept.
+        group_expiry (float): Seconds a group membership lasts.
+        capacity (int): Messages a channel may hold before sends fail.
+        poll_interval (float): Seconds between two reads of new messages.
+    """
+
+    extensions = ["groups", "flush"]
+
+    def __init__(self, path, expiry=60, group_expiry=86400, capacity=100, channel_capacity=None, poll_interval=0.02):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity)
+        self.channel_capacity = self.compile_capacities(channel_capacity or {})
+        self.path = str(path)
+        self.group_expiry = group_expiry
+        self.poll_interval = poll_interval
+        # Channels named after this process are read by its poller.
+        self.client_prefix = "sqlite.%s" % uuid.uuid4().hex[:12]
+        self.queues = {}
+        # channel -> [consumers waiting in receive, time.monotonic() the last one left]
+        self.receivers = {}
+        self.poller = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="channel-layer")
+        self.conn = None
+        self.last_clean = 0.0
+
+    def connect(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            self.conn.executescript(
+                """
+                PRAGMA journal_mode=WAL;
+                PRAGMA synchronous=NORMAL;
+                CREATE TABLE IF NOT EXISTS channel_messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    channel TEXT NOT NULL,
+                    expires REAL NOT NULL,
+                    body TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS channel_messages_channel ON channel_messages (channel, id);
+                CREATE TABLE IF NOT EXISTS channel_groups (
+                    group_name TEXT NOT NULL,
+                    channel TEXT NOT NULL,
+                    joined REAL NOT NULL,
+                    PRIMARY KEY (group_name, channel)
+                );
+                """
+            )
+        return self.conn
+
+    @contextmanager
+    def transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers never
+        # read the same message before either deletes it.
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    async def run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        assert self.valid_channel_name(channel), "Channel name not valid"
+        assert "__asgi_channel__" not in message
+        if not await self.run(self.insert, [channel], json.dumps(message)):
+            raise ChannelFull(channel)
+
+    def insert(self, channels, body):
+        """Queue body on every channel with room for it, returning how many took it."""
+        now = time.time()
+        sent = 0
+        with self.transaction() as conn:
+            for channel in channels:
+                queued, = conn.execute("SELECT COUNT(*) FROM channel_messages WHERE channel = ? AND expires >= ?",
+                                       (channel, now)).fetchone()
+                if queued >= self.get_capacity(channel):
+                    continue
+                conn.execute("INSERT INTO channel_messages (channel, expires, body) VALUES (?, ?, ?)",
+                             (channel, now + self.expiry, body))
+                sent += 1
+        return sent
+
+    async def receive(self, channel):
+        assert self.valid_channel_name(channel)
+        if not channel.startswith(self.client_prefix):
+            return await self.receive_polling(channel)
+        # The queue outlives this call: messages that arrive while the consumer
+        # handles the previous one wait in it for the next receive.
+        queue = self.queues.setdefault(channel, asyncio.Queue())
+        receiver = self.receivers.setdefault(channel, [0, 0.0])
+        receiver[0] += 1
+        if self.poller is None or self.poller.done():
+            self.poller = asyncio.ensure_future(self.poll())
+        try:
+            return await queue.get()
+        finally:
+            receiver[0] -= 1
+            receiver[1] = time.monotonic()
+
+    async def receive_polling(self, channel):
+        # A named channel any process may read, e.g. a worker channel.
+        while True:
+            messages = await self.run(self.take, channel, channel + "\x00", 1)
+            if messages:
+                return json.loads(messages[0][1])
+            await asyncio.sleep(self.poll_interval)
+
+    async def poll(self):
+        while self.queues:
+            messages = await self.run(self.take, self.client_prefix, self.client_prefix + "\x7f")
+            for channel, body in messages:
+                # Messages for consumers that have gone are dropped.
+                queue = self.queues.get(channel)
+                if queue is not None:
+                    queue.put_nowait(json.loads(body))
+            self.drop_idle_queues()
+            await asyncio.sleep(self.poll_interval)
+
+    def drop_idle_queues(self):
+        """
+        Forget channels nobody has received from for ``expiry`` seconds: their
+        consumer is gone, and anything still queued for it would have expired.
+        """
+        now = time.monotonic()
+        for channel, (waiting, last_left) in list(self.receivers.items()):
+            if not waiting and now - last_left > self.expiry:
+                del self.receivers[channel]
+                self.queues.pop(channel, None)
+
+    def take(self, low, high, limit=-1):
+        """Delete and return the unexpired messages of channels in [low, high), oldest first."""
+        now = time.time()
+        with self.transaction() as conn:
+            rows = conn.execute("SELECT id, channel, body, expires FROM channel_messages "
+                                "WHERE channel >= ? AND channel < ? ORDER BY id LIMIT ?", (low, high, limit)).fetchall()
+            if rows:
+                conn.executemany("DELETE FROM channel_messages WHERE id = ?", [(row[0],) for row in rows])
+            if now - self.last_clean > self.expiry:
+                self.clean(conn, now)
+        return [(channel, body) for _, channel, body, expires in rows if expires >= now]
+
+    def clean(self, conn, now):
+        self.last_clean = now
+        conn.execute("DELETE FROM channel_messages WHERE expires < ?", (now,))
+        conn.execute("DELETE FROM channel_groups WHERE joined < ?", (now - self.group_expiry,))
+
+    async def new_channel(self, prefix="specific."):
+        channel = "%s.%s!%s" % (self.client_prefix, prefix.rstrip("."),
+                                "".join(random.choice(string.ascii_letters) for _ in range(12)))
+        # Ready before the first receive, so nothing sent to it in between is dropped.
+        self.queues[channel] = asyncio.Queue()
+        self.receivers[channel] = [0, time.monotonic()]
+        return channel
+
+    # Groups extension
+
+    async def group_add(self, group, channel):
+        assert self.valid_group_name(group), "Group name not valid"
+        assert self.valid_channel_name(channel), "Channel name not valid"
+        await self.run(self.execute, "INSERT OR REPLACE INTO channel_groups (group_name, channel, joined) VALUES (?, ?, ?)",
+                       (group, channel, time.time()))
+
+    async def group_discard(self, group, channel):
+        assert self.valid_group_name(group), "Group name not valid"
+        assert self.valid_channel_name(channel), "Channel name not valid"
+        await self.run(self.execute, "DELETE FROM channel_groups WHERE group_name = ? AND channel = ?", (group, channel))
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        assert self.valid_group_name(group), "Group name not valid"
+        await self.run(self.send_to_group, group, json.dumps(message))
+
+    def send_to_group(self, group, body):
+        # Full channels are skipped, as other channel layers do for groups.
+        channels = [channel for channel, in self.connect().execute(
+            "SELECT channel FROM channel_groups WHERE group_name = ? AND joined >= ?",
+            (group, time.time() - self.group_expiry))]
+        self.insert(channels, body)
+
+    def execute(self, sql, params):
+        with self.transaction() as conn:
+            conn.execute(sql, params)
+
+    # Flush extension
+
+    async def flush(self):
+        await self.run(self.execute_script, "DELETE FROM channel_messages; DELETE FROM channel_groups;")
+        self.queues = {}
+        self.receivers = {}
+
+    def execute_script(self, script):
+        self.connect().executescript(script)
+
+    async def close(self):
+        if self.poller is not None:
+            self.poller.cancel()
+        await self.run(self.disconnect)
+
+    def disconnect(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
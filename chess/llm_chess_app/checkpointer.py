@@ -0,0 +1,239 @@
+import asyncio
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from .metrics import CHECKPOINT_SECONDS
+
+
+def new_thread_id():
+    """Return a checkpoint thread id that is unique to one game."""
+    return uuid.uuid4().hex
+
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    In-memory checkpointer whose footprint does not grow with uptime.
+
+    A game only ever resumes from its latest checkpoint, so older ones are
+    dropped as soon as a thread holds more than ``max_checkpoints``. Whole
+    threads are evicted least-recently-used first once ``max_threads`` is
+    exceeded, when they have been idle longer than ``ttl`` seconds, or when
+    released explicitly.
+
+    Args:
+        max_threads (int): Maximum number of live threads (games).
+        ttl (float): Seconds a thread may stay idle before it is evicted.
+        max_checkpoints (int): Checkpoints retained per thread.
+    """
+
+    def __init__(self, *, max_threads=10000, ttl=6 * 60 * 60, max_checkpoints=4, serde=None):
+        super().__init__(serde=serde)
+        self.max_threads = max_threads
+        self.ttl = ttl
+        self.max_checkpoints = max_checkpoints
+        self.last_access = OrderedDict()
+        self.lock = threading.RLock()
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        with CHECKPOINT_SECONDS.time(op="get"), self.lock:
+            if thread_id not in self.storage:
+                return None
+            self.touch(thread_id)
+            return super().get_tuple(config)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        with CHECKPOINT_SECONDS.time(op="list"), self.lock:
+            return iter([*super().list(config, filter=filter, before=before, limit=limit)])
+
+    def put(self, config, checkpoint, metadata):
+        thread_id = config["configurable"]["thread_id"]
+        with CHECKPOINT_SECONDS.time(op="put"), self.lock:
+            next_config = super().put(config, checkpoint, metadata)
+            self.touch(thread_id)
+            self.trim(thread_id)
+            self.evict()
+            return next_config
+
+    def put_writes(self, config, writes, task_id):
+        with CHECKPOINT_SECONDS.time(op="put_writes"), self.lock:
+            return super().put_writes(config, writes, task_id)
+
+    def touch(self, thread_id):
+        self.last_access[thread_id] = time.monotonic()
+        self.last_access.move_to_end(thread_id)
+
+    def trim(self, thread_id):
+        """Drop all but the newest ``max_checkpoints`` checkpoints of a thread."""
+        checkpoints = self.storage[thread_id]
+        excess = len(checkpoints) - self.max_checkpoints
+        if excess <= 0:
+            return
+        # Checkpoint ids are monotonically increasing.
+        for ts in sorted(checkpoints)[:excess]:
+            del checkpoints[ts]
+            self.writes.pop((thread_id, ts), None)
+
+    def evict(self):
+        """Evict threads over the size limit or past their ttl, oldest first."""
+        deadline = time.monotonic() - self.ttl
+        while self.last_access:
+            thread_id, accessed = next(iter(self.last_access.items()))
+            if len(self.last_access) <= self.max_threads and accessed >= deadline:
+                break
+            self.release(thread_id)
+
+    def release(self, thread_id):
+        """Forget every checkpoint and pending write of a thread."""
+        with self.lock:
+            self.last_access.pop(thread_id, None)
+            for ts in self.storage.pop(thread_id, {}):
+                self.writes.pop((thread_id, ts), None)
+
+
+class SharedSqliteSaver(SqliteSaver):
+    """
+    Checkpointer kept in a SQLite file that every worker process opens, so any
+    worker can continue any game. Writes are serialized by SQLite's own file
+    locking in WAL mode; each thread uses its own connection.
+
+    Like BoundedMemorySaver it keeps only the newest ``max_checkpoints`` per
+    thread and evicts threads idle for more than ``ttl`` seconds. Threads are
+    not released when a client disconnects, since the client may reconnect
+    to another worker.
+
+    Args:
+        path (str): The database file.
+        ttl (float): Seconds a thread may stay idle before it is evicted.
+        max_checkpoints (int): Checkpoints retained per thread.
+        evict_interval (float): Seconds between two eviction sweeps of a worker.
+    """
+
+    def __init__(self, path, *, ttl=6 * 60 * 60, max_checkpoints=4, evict_interval=60.0, serde=None):
+        self.path = str(path)
+        self.local = threading.local()
+        super().__init__(None, serde=serde)
+        self.ttl = ttl
+        self.max_checkpoints = max_checkpoints
+        self.evict_interval = evict_interval
+        self.last_evict = time.monotonic()
+
+    @property
+    def conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @conn.setter
+    def conn(self, conn):
+        # SqliteSaver.__init__ assigns its single connection; connections are per thread here.
+        pass
+
+    def setup(self):
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS thread_access (
+                thread_id TEXT PRIMARY KEY,
+                accessed REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS thread_access_accessed ON thread_access (accessed);
+            """
+        )
+
+    def get_tuple(self, config):
+        with CHECKPOINT_SECONDS.time(op="get"):
+            return super().get_tuple(config)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        with CHECKPOINT_SECONDS.time(op="list"):
+            return iter([*super().list(config, filter=filter, before=before, limit=limit)])
+
+    def put(self, config, checkpoint, metadata):
+        thread_id = str(config["configurable"]["thread_id"])
+        with CHECKPOINT_SECONDS.time(op="put"):
+            with self.lock, self.cursor() as cur:
+                cur.execute(
+                    "INSERT OR REPLACE INTO checkpoints (thread_id, thread_ts, parent_ts, checkpoint, metadata) VALUES (?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint["id"], config["configurable"].get("thread_ts"),
+                     self.serde.dumps(checkpoint), self.serde.dumps(metadata)),
+                )
+                cur.execute("INSERT OR REPLACE INTO thread_access (thread_id, accessed) VALUES (?, ?)",
+                            (thread_id, time.time()))
+                self.trim(cur, thread_id)
+            if time.monotonic() - self.last_evict > self.evict_interval:
+                self.evict()
+        return {"configurable": {"thread_id": config["configurable"]["thread_id"], "thread_ts": checkpoint["id"]}}
+
+    def put_writes(self, config, writes, task_id):
+        with CHECKPOINT_SECONDS.time(op="put_writes"):
+            return super().put_writes(config, writes, task_id)
+
+    def trim(self, cur, thread_id):
+        """Drop all but the newest ``max_checkpoints`` checkpoints of a thread."""
+        cur.execute(
+            "SELECT thread_ts FROM checkpoints WHERE thread_id = ? ORDER BY thread_ts DESC LIMIT 1 OFFSET ?",
+            (thread_id, self.max_checkpoints - 1),
+        )
+        oldest = cur.fetchone()
+        if oldest is not None:
+            cur.execute("DELETE FROM checkpoints WHERE thread_id = ? AND thread_ts < ?", (thread_id, oldest[0]))
+            cur.execute("DELETE FROM writes WHERE thread_id = ? AND thread_ts < ?", (thread_id, oldest[0]))
+
+    def evict(self):
+        """Evict every thread idle for longer than ``ttl``, whichever worker wrote it."""
+        self.last_evict = time.monotonic()
+        deadline = time.time() - self.ttl
+        with self.lock, self.cursor() as cur:
+            for table in ("checkpoints", "writes"):
+                cur.execute(f"DELETE FROM {table} WHERE thread_id IN "
+                            "(SELECT thread_id FROM thread_access WHERE accessed < ?)", (deadline,))
+            cur.execute("DELETE FROM thread_access WHERE accessed < ?", (deadline,))
+
+    # The graph calls these under astream; keep the file I/O off the event loop.
+
+    async def aget_tuple(self, config):
+        return await asyncio.get_running_loop().run_in_executor(None, self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        checkpoints = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for checkpoint in checkpoints:
+            yield checkpoint
+
+    async def aput(self, config, checkpoint, metadata):
+        return await asyncio.get_running_loop().run_in_executor(None, self.put, config, checkpoint, metadata)
+
+    async def aput_writes(self, config, writes, task_id):
+        return await asyncio.get_running_loop().run_in_executor(None, self.put_writes, config, writes, task_id)
+
+
+_checkpointer = None
+
+
+def get_checkpointer():
+    """
+    Return the process-wide checkpointer shared by all games: the SQLite file
+    at CHECKPOINT_PATH when set, so several workers can serve one game,
+    otherwise process memory.
+    """
+    global _checkpointer
+    if _checkpointer is None:
+        if settings.CHECKPOINT_PATH:
+            _checkpointer = SharedSqliteSaver(settings.CHECKPOINT_PATH, ttl=settings.CHECKPOINT_TTL,
+                                              max_checkpoints=settings.CHECKPOINT_KEEP)
+        else:
+            _checkpointer = BoundedMemorySaver(max_threads=settings.CHECKPOINT_MAX_THREADS, ttl=settings.CHECKPOINT_TTL,
+                                               max_checkpoints=settings.CHECKPOINT_KEEP)
+    return _checkpointer
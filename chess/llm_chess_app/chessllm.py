@@ -1,49 +1,336 @@
-import asyncio
-import time
-import types
 import json
+
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 
 import chess
-from .ai_chess_app import create_ai_chess_app
+from django.conf import settings
+from django.core import signing
+from django.utils.crypto import constant_time_compare
+from chessapi.recorder import get_game_recorder, load_game
+from .ai_chess_app import (Chess, ChessAgent, Move, create_ai_chess_app, create_engine_ai_player,
+                           create_engine_chess_app, create_hedged_player, create_llm_ai_player,
+                           create_opening_book_player, get_moves, model_name)
+from .batching import BatchScheduler
+from .checkpointer import new_thread_id
+from .engine_pool import get_engine_pool
+from .game_record import decode_move
+from .hedging import LatencyTracker, adaptive_delay
+from .llm_clients import get_llm_registry
+from .metrics import WEBSOCKET_SECONDS
+from .move_cache import MoveCache
+from .opening_book import OpeningBook
+from .ponder import PonderBudget, engine_predictor
 # import chess.svg
-from typing_extensions import Annotated
 
-from langchain_experimental.llms.ollama_functions import OllamaFunctions
-from langchain_openai import OpenAI
-llm = OllamaFunctions(model="llama3.1", temperature=0.1, output='json')
+def get_llm(llm_config):
+    """Return the shared client for the configured model, or None for an unknown model."""
+    return get_llm_registry().get(llm_config['model'], llm_config.get('api_key') or '')
 
-def  get_llm(llm_config):
-    model = llm_config['model']
-    api_key = llm_config['api_key']
-    llm = None
-    if model == 'openai-gpt-4o' or model == 'openai-gpt-4o-mini':
-        llm = OpenAI(model_name=model, openai_api_key=api_key)
-    elif model == 'ollama-llama3.1':
-        llm = OllamaFunctions(model="llama3.1", temperature=0.1, output='json')
-    return llm
+_move_cache = None
+
+def get_move_cache():
+    global _move_cache
+    if _move_cache is None:
+        _move_cache = MoveCache(path=settings.MOVE_CACHE_PATH, max_entries=settings.MOVE_CACHE_MAX_ENTRIES,
+                                explore=settings.MOVE_CACHE_EXPLORE)
+    return _move_cache
+
+_opening_book = None
+
+def get_opening_book():
+    global _opening_book
+    if _opening_book is None and settings.OPENING_BOOK_PATH:
+        _opening_book = OpeningBook(settings.OPENING_BOOK_PATH, max_ply=settings.OPENING_BOOK_MAX_PLY)
+    return _opening_book
+
+def get_batch_scheduler(llm):
+    """Return the scheduler batching requests for llm's model across all games."""
+    if not settings.LLM_BATCHING:
+        return None
+    try:
+        runnable = llm.with_structured_output(Move)
+    except NotImplementedError:
+        return None
+    # Attached to the client, so only requests made with the same credentials share a batch.
+    return get_llm_registry().attachment(llm, 'batch_scheduler', lambda: BatchScheduler(
+        runnable, max_batch_size=settings.LLM_BATCH_SIZE, max_wait=settings.LLM_BATCH_MAX_WAIT, model=model_name(llm)))
+
+def get_latency_tracker(llm):
+    """Return the recent latencies of llm's model, shared like its batch scheduler."""
+    return get_llm_registry().attachment(llm, 'latency_tracker', lambda: LatencyTracker(settings.LLM_HEDGE_WINDOW))
+
+def get_hedge_llm(llm_config):
+    """Return the client hedging the requests of llm_config's model, or None when hedging is off."""
+    model = llm_config.get('hedge_model', settings.LLM_HEDGE_MODEL)
+    if not model or model == llm_config.get('model'):
+        return None
+    # Only keys the client sent: the server's own key would pay for anyone's requests.
+    api_key = llm_config.get('hedge_api_key') or llm_config.get('api_key') or ''
+    return get_llm({'model': model, 'api_key': api_key})
+
+def hedge_delay(tracker):
+    return adaptive_delay(tracker, quantile=settings.LLM_HEDGE_QUANTILE, default=settings.LLM_HEDGE_DELAY,
+                          min_delay=settings.LLM_HEDGE_MIN_DELAY, max_delay=settings.LLM_HEDGE_MAX_DELAY)
+
+def create_llm_player(llm):
+    return create_llm_ai_player(ChessAgent(llm, batch_scheduler=get_batch_scheduler(llm)), cache=get_move_cache())
+
+def create_hedged_llm_player(llm, hedge_llm):
+    """A player asking llm for moves and hedge_llm as well when llm is slow (see create_hedged_player)."""
+    backends = []
+    for client in (llm, hedge_llm):
+        agent = ChessAgent(client, batch_scheduler=get_batch_scheduler(client))
+        backends.append((agent.model_name, create_llm_ai_player(agent, cache=get_move_cache()),
+                         get_latency_tracker(client)))
+    return create_hedged_player(backends, delay=hedge_delay)
+
+def get_shared_engine_pool():
+    return get_engine_pool(settings.STOCKFISH_PATH, size=settings.ENGINE_POOL_SIZE, limit=settings.ENGINE_LIMIT,
+                           background_size=settings.ENGINE_BACKGROUND_SIZE)
+
+def engine_search_options(engine_config):
+    """The search limit and UCI options asked for in an llm_config, e.g. {'depth': 12, 'skill_level': 3}."""
+    limit = {key: engine_config[key] for key in ('depth', 'nodes', 'time') if engine_config.get(key)} or None
+    options = {'Skill Level': engine_config['skill_level']} if 'skill_level' in engine_config else None
+    return limit, options
+
+def out_of_book_player(board):
+    return None, "Out of book."
+
+def create_player(llm_config):
+    """
+    Return the AI player a game started with llm_config would get, on the
+    process-wide move cache, opening book, batch scheduler and engine pool.
+    The model 'book' answers from the opening book alone, with a None move
+    out of book. Returns None for an unknown model, or 'book' without an
+    OPENING_BOOK_PATH.
+    """
+    model = llm_config.get('model')
+    book = get_opening_book()
+    if model == 'book':
+        return create_opening_book_player(out_of_book_player, book) if book is not None else None
+    if model == 'stockfish':
+        limit, options = engine_search_options(llm_config)
+        player = create_engine_ai_player(get_shared_engine_pool(), limit=limit, options=options)
+    else:
+        llm = get_llm(llm_config)
+        if llm is None:
+            return None
+        hedge_llm = get_hedge_llm(llm_config)
+        player = create_hedged_llm_player(llm, hedge_llm) if hedge_llm is not None else create_llm_player(llm)
+    return create_opening_book_player(player, book) if book is not None else player
+
+_ponder_budget = None
+
+def get_ponder_budget():
+    global _ponder_budget
+    if _ponder_budget is None:
+        _ponder_budget = PonderBudget(settings.PONDER_MAX_TASKS)
+    return _ponder_budget
+
+def get_ponder_predictor():
+    """Return how the user's replies are predicted, None for the built-in heuristics."""
+    if settings.PONDER_PREDICTOR != 'engine':
+        return None
+    return engine_predictor(get_shared_engine_pool(), limit=settings.PONDER_ENGINE_LIMIT)
+
+def resume_token(game_id):
+    """
+    The secret a client needs to resume game_id. Game ids are listed by
+    /api/games/, so only the socket that started a game is sent its token;
+    signed with SECRET_KEY, it is checked by any worker.
+    """
+    return signing.Signer(salt='llm_chess_app.resume').signature(str(game_id))
+
+def human_colors(options):
+    """Colors the user plays; without options, the frontend's default of white against the AI."""
+    options = options or {}
+    return {color for color, default in (('white', 'human'), ('black', 'ai'))
+            if options.get(f'{color}_player', default) == 'human'}
 
 # Start a websocket server to communicate with front-end.
 class ChessServer(AsyncWebsocketConsumer):
     _user_input = None
     chess_iter = None
-    llm = llm
-    app_config = {"configurable": {"thread_id": "1"}, "recursion_limit": 500}
+    # Clients opt in with 'stream': true in the start message to get
+    # move_streamed and comment_chunk frames ahead of next_move_received.
+    stream_moves = False
+    # Clients opt in with 'ponder': true to have the AI think on the user's
+    # time after each of its moves (see llm_chess_app/ponder.py).
+    ponder_moves = False
+    human_colors = frozenset(('white',))
+    llm = None
+    # Client hedging the requests of llm, if any (see create_hedged_llm_player).
+    hedge_llm = None
+    app_config = {"configurable": {}, "recursion_limit": 500}
     def set_app_config(self, config):
         self.app_config = config
 
-    def init_chess_iter(self, board_state, config):
-        chess_app = create_ai_chess_app(self.llm, board_state, config=config)
-        return chess_app.get_iterable(board_state=board_state)
+    game_id = None
+
+    def create_chess_app(self, board_state, config):
+        if self.hedge_llm is not None and self.hedge_llm is not self.llm:
+            player = create_hedged_llm_player(self.llm, self.hedge_llm)
+            book = get_opening_book()
+            chess_app = Chess(ai_player=create_opening_book_player(player, book) if book is not None else player,
+                              board_state=board_state)
+            chess_app.set_config(config)
+            return chess_app
+        return create_ai_chess_app(self.llm, board_state, config=config, move_cache=get_move_cache(),
+                                   opening_book=get_opening_book(), batch_scheduler=get_batch_scheduler(self.llm))
+
+    def init_chess_iter(self, board_state, config, moves=None, comments=None):
+        chess_app = self.create_chess_app(board_state, config)
+        return chess_app.get_iterable(board_state=board_state, moves=moves, comments=comments)
+
+    def game_config(self, config, thread_id=None):
+        # Every game gets its own checkpoint thread, whatever the client sends.
+        configurable = {**config.get('configurable', {}), 'thread_id': thread_id or new_thread_id()}
+        return {**config, 'configurable': configurable}
+
+    def release_game(self):
+        if self.chess_iter is not None:
+            self.chess_iter.release()
+            self.chess_iter = None
+
+    def create_engine_chess_app(self, board_state, config, engine_config):
+        limit, options = engine_search_options(engine_config)
+        return create_engine_chess_app(get_shared_engine_pool(), board_state, limit=limit, options=options,
+                                       config=config, opening_book=get_opening_book())
+
+    def init_engine_chess_iter(self, board_state, config, engine_config, moves=None, comments=None):
+        chess_app = self.create_engine_chess_app(board_state, config, engine_config)
+        return chess_app.get_iterable(board_state=board_state, moves=moves, comments=comments)
+
+    def create_game_app(self, llm_config, board_state, config):
+        if llm_config['model'] == 'stockfish':
+            # Never pondered, see PONDER_WIDTH.
+            return self.create_engine_chess_app(board_state, config, llm_config)
+        # Pick the client's model before the game is built with it.
+        self.llm = get_llm(llm_config) or self.llm or get_llm({'model': settings.DEFAULT_LLM_MODEL})
+        self.hedge_llm = get_hedge_llm(llm_config)
+        chess_app = self.create_chess_app(board_state, config)
+        if self.ponder_moves and settings.PONDER_WIDTH:
+            chess_app.enable_pondering(width=settings.PONDER_WIDTH, budget=get_ponder_budget(),
+                                       predictor=get_ponder_predictor())
+        return chess_app
+
+    def set_game_options(self, data):
+        self.stream_moves = bool(data.get('stream', False))
+        self.ponder_moves = bool(data.get('ponder', False))
+        self.human_colors = human_colors(data.get('options'))
+
+    def init_game_iter(self, llm_config, board_state, config, moves=None, comments=None):
+        chess_app = self.create_game_app(llm_config, board_state, config)
+        return chess_app.get_iterable(board_state=board_state, moves=moves, comments=comments)
+
+    def attach_game_iter(self, llm_config, config):
+        """Continue a game from the checkpointer, or return None when it has no such game."""
+        return self.create_game_app(llm_config, None, config).attach_iterable()
 
     async def start_game(self, data):
-        self.chess_iter = self.init_chess_iter(data.get('board_state', None), data.get('config', self.app_config))
-        self.llm = get_llm(data['llm_config'])
+        self.release_game()
+        config = self.game_config(data.get('config', self.app_config))
+        self.set_game_options(data)
+        llm_config = data['llm_config']
+        self.chess_iter = self.init_game_iter(llm_config, data.get('board_state', None), config)
+        # Checkpoint the start position so any worker can take the first move.
+        await self.chess_iter.astart()
+        await self.join_game(config['configurable']['thread_id'])
+        recorder = get_game_recorder()
+        if recorder is not None:
+            options = data.get('options') or {}
+            recorder.game_started(self.game_id, llm_config['model'], self.chess_iter.initial_state['start_fen'],
+                                  player=str(data.get('player', ''))[:64],
+                                  white_player=options.get('white_player', 'human'),
+                                  black_player=options.get('black_player', 'ai'))
+        await self.send_message({'message': 'game_started', 'game_id': self.game_id,
+                                 'resume_token': resume_token(self.game_id)})
             # llm_config = data['llm_config']
         # options = data['options']
         # chess_llm = ChessLLM(llm_config=llm_config, get_user_input=self.get_user_input, update_steps=self.update_steps, options=options)
         # chess_llm.start_game()
 
+    @staticmethod
+    def load_game(game_id):
+        recorder = get_game_recorder()
+        if recorder is not None:
+            # Moves of this worker may still be queued.
+            recorder.flush()
+        return load_game(game_id)
+
+    async def resume_game(self, data):
+        """
+        Continue a game on this connection, e.g. after a reconnect that landed on
+        another worker. A game still in the checkpointer carries on from its last
+        checkpoint; otherwise it is replayed from the moves in the database. The
+        client must send the resume_token it got with game_started.
+        """
+        game_id = str(data['game_id'])
+        if not constant_time_compare(str(data.get('resume_token', '')), resume_token(game_id)):
+            # The same answer as for a missing game, so ids cannot be probed.
+            await self.send_message({'message': 'error', 'error': 'unknown game', 'game_id': game_id})
+            return
+        llm_config = data.get('llm_config')
+        config = self.game_config(self.app_config, thread_id=game_id)
+        if self.chess_iter is not None and self.chess_iter.config['configurable']['thread_id'] != game_id:
+            self.release_game()
+        self.set_game_options(data)
+        chess_iter = self.attach_game_iter(llm_config, config) if llm_config else None
+        if chess_iter is None:
+            game, moves = await database_sync_to_async(self.load_game)(game_id)
+            if game is None:
+                await self.send_message({'message': 'error', 'error': 'unknown game', 'game_id': game_id})
+                return
+            llm_config = llm_config or {'model': game.model, 'api_key': ''}
+            chess_iter = self.attach_game_iter(llm_config, config) or self.init_game_iter(
+                llm_config, game.start_fen, config, moves=[move.uci for move in moves],
+                comments=[move.comment for move in moves])
+        await chess_iter.astart()
+        self.chess_iter = chess_iter
+        await self.join_game(game_id)
+        state = chess_iter.get_state().values
+        moves = get_moves(state)
+        await self.send_message({
+            'message': 'game_resumed',
+            'game_id': game_id,
+            'board_state': state['board_state'],
+            'moves': moves
+        })
+
+    def game_group(self, game_id):
+        return f'game.{game_id}'
+
+    async def join_game(self, game_id):
+        """Follow moves of game_id made through any connection on any worker."""
+        await self.leave_game()
+        self.game_id = game_id
+        if self.channel_layer is not None:
+            await self.channel_layer.group_add(self.game_group(game_id), self.channel_name)
+
+    async def leave_game(self):
+        if self.channel_layer is not None and self.game_id is not None:
+            await self.channel_layer.group_discard(self.game_group(self.game_id), self.channel_name)
+        self.game_id = None
+
+    async def broadcast_move(self, confirmed_move):
+        if self.channel_layer is not None and self.game_id is not None:
+            await self.channel_layer.group_send(self.game_group(self.game_id), {
+                'type': 'game.update', 'sender': self.channel_name, 'game_id': self.game_id,
+                'move': confirmed_move['move'], 'comment': confirmed_move['comment'],
+                'board_state': confirmed_move['board_state']})
+
+    async def game_update(self, event):
+        # The connection that made the move already has it as next_move_received.
+        if event['sender'] != self.channel_name:
+            await self.send_message({'message': 'game_update', 'game_id': event['game_id'], 'move': event['move'],
+                                     'comment': event['comment'], 'board_state': event['board_state']})
+
+    async def send_message(self, message):
+        with WEBSOCKET_SECONDS.time(direction='send', message=message['message']):
+            await self.send(text_data=json.dumps(message))
+
     async def make_move_server(self, data):
         move_dict = data['move']
         from_square = move_dict['from']
@@ -51,14 +338,20 @@ class ChessServer(AsyncWebsocketConsumer):
         if from_square and to_square:
             move = chess.Move(chess.parse_square(from_square), chess.parse_square(to_square))
             move_uci = move.uci()
-            result = self.chess_iter.next(move_uci) # move from user
+            result = await self.chess_iter.anext(move_uci) # move from user
         else:
-            result = self.chess_iter.next() # move from ai
-            move_uci = result['moves'][-1]
-            move = chess.Move.from_uci(move_uci)
+            listener = self.send_partial_move if self.stream_moves else None
+            result = await self.chess_iter.anext(listener=listener) # move from ai
+            move = decode_move(result['moves'][-1])
+            if self.ponder_moves and ('black' if result['turn'] == 'white' else 'white') in self.human_colors:
+                # The user is to move: think about the likely replies meanwhile.
+                self.chess_iter.ponder()
 
-        board_state = result['board_states'][-1]
+        board_state = result['board_state']
         comment = result['comments'][-1]
+        # Counted on the game's board, which follows moves made through other connections.
+        self.record_move(self.chess_iter.plies(), decode_move(result['moves'][-1]), comment, board_state,
+                         self.chess_iter.result())
         return {
             'message': 'next_move_received',
             'move': {'from': chess.SQUARE_NAMES[move.from_square], 'to': chess.SQUARE_NAMES[move.to_square]},
@@ -66,25 +359,54 @@ class ChessServer(AsyncWebsocketConsumer):
             'board_state': board_state
         }
 
+    def record_move(self, ply, move, comment, board_state, result):
+        recorder = get_game_recorder()
+        if recorder is not None and self.game_id is not None:
+            recorder.move_made(self.game_id, ply, move.uci(), comment, board_state, result)
+
+    async def send_partial_move(self, event):
+        if event['type'] == 'move':
+            move = event['move']
+            message = {
+                'message': 'move_streamed',
+                'move': {'from': chess.SQUARE_NAMES[move.from_square], 'to': chess.SQUARE_NAMES[move.to_square]},
+                'board_state': event['board_state']
+            }
+        else:
+            message = {'message': 'comment_chunk', 'delta': event['delta']}
+        await self.send_message(message)
+
     async def connect(self):
         await self.accept()
 
     async def disconnect(self, close_code):
-        pass
+        await self.leave_game()
+        # A no-op with a shared checkpointer, where the game outlives the connection.
+        self.release_game()
 
     async def receive(self, text_data):
         print(text_data)
         data = json.loads(text_data)
         message = data['message']
+        # Label only known messages so clients cannot create new series.
+        label = message if message in ('start', 'resume', 'next_move') else 'other'
+        with WEBSOCKET_SECONDS.time(direction='receive', message=label):
+            await self.handle_message(message, data)
+
+    async def handle_message(self, message, data):
         if message == 'start':
             await self.start_game(data)
+        elif message == 'resume':
+            await self.resume_game(data)
         # elif message == 'move':
         #     self._user_input  = data['from'] + data['to']
         elif message == 'next_move':
             confirmed_move = await self.make_move_server(data)
             text_data=json.dumps(confirmed_move)
             print(text_data)
-            await self.send(text_data=text_data)
+            with WEBSOCKET_SECONDS.time(direction='send', message=confirmed_move['message']):
+                await self.send(text_data=text_data)
+            await self.broadcast_move(confirmed_move)
         else:
             pass
 
@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import threading
+
+import chess
+import chess.engine
+
+from .metrics import ENGINE_CHECKOUT_SECONDS, ENGINE_SECONDS
+
+
+def make_limit(limit=None):
+    """
+    Build a chess.engine.Limit from a dict such as {"depth": 12} or
+    {"time": 0.05, "nodes": 100000}. Limits pass through unchanged.
+    """
+    if limit is None or isinstance(limit, chess.engine.Limit):
+        return limit
+    return chess.engine.Limit(**limit)
+
+
+class EnginePoolBusy(Exception):
+    """Raised for a background search when the pool's background share is in use."""
+
+
+class EnginePool:
+    """
+    A bounded pool of warm UCI engine processes shared by all games.
+
+    The engines are driven by python-chess's asyncio API on a private event
+    loop thread, so the pool can be used from any thread or event loop: the
+    sync methods block, the ``a``-prefixed ones await. At most ``size``
+    processes exist no matter how many games are live; extra requests wait
+    for an engine to be returned. An engine that has exited or fails its ping
+    is replaced at checkout, and a search interrupted by a crash is retried
+    once on a fresh process. A cancelled search is stopped and its engine
+    goes back to the pool; only engine errors cost a process.
+
+    Background searches, such as predicting a user's reply while pondering,
+    may hold at most ``background_size`` engines at once, and never all of
+    them; one that does not fit raises EnginePoolBusy rather than waiting,
+    so games always have the rest of the pool.
+
+    Args:
+        path (str | list): Path of the UCI engine binary, or its command line.
+        size (int): Maximum number of engine processes.
+        options (dict): UCI options applied to every process.
+        limit (dict | chess.engine.Limit): Default search limit.
+        health_timeout (float): Seconds to wait for a ping at checkout.
+        background_size (int): Engines background searches may hold at once.
+    """
+
+    def __init__(self, path, size=2, options=None, limit=None, health_timeout=5.0, background_size=1):
+        self.path = path
+        self.size = size
+        self.background_size = min(background_size, size - 1)
+        self.options = options or {}
+        self.limit = make_limit(limit) or chess.engine.Limit(time=0.05)
+        self.health_timeout = health_timeout
+        self.loop = None
+        self.thread = None
+        self.idle = []
+        self.slots = None
+        self.background_running = 0
+        self.spawned = 0
+        self.restarts = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self.slots = asyncio.Semaphore(self.size)
+                self.thread = threading.Thread(target=self.loop.run_forever, name="engine-pool", daemon=True)
+                self.thread.start()
+        return self.loop
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.start())
+
+    def play(self, board, limit=None, options=None):
+        """Search ``board`` on a pooled engine and return its PlayResult."""
+        return self.submit(self.run_play(board.copy(), make_limit(limit) or self.limit, options or {})).result()
+
+    async def aplay(self, board, limit=None, options=None):
+        return await asyncio.wrap_future(self.submit(self.run_play(board.copy(), make_limit(limit) or self.limit, options or {})))
+
+    def analyse(self, board, limit=None, multipv=None, background=False):
+        return self.submit(self.run_analyse(board.copy(), make_limit(limit) or self.limit, multipv, background)).result()
+
+    async def aanalyse(self, board, limit=None, multipv=None, background=False):
+        return await asyncio.wrap_future(self.submit(self.run_analyse(board.copy(), make_limit(limit) or self.limit,
+                                                                      multipv, background)))
+
+    async def spawn(self):
+        transport, engine = await chess.engine.popen_uci(self.path)
+        if self.options:
+            await engine.configure(self.options)
+        return engine
+
+    async def is_healthy(self, engine):
+        if engine.returncode.done():
+            return False
+        try:
+            await asyncio.wait_for(engine.ping(), self.health_timeout)
+            return True
+        except (asyncio.TimeoutError, chess.engine.EngineError):
+            return False
+
+    async def checkout(self):
+        await self.slots.acquire()
+        try:
+            if not self.idle:
+                engine = await self.spawn()
+                self.spawned += 1
+                return engine
+            engine = self.idle.pop()
+            if not await self.is_healthy(engine):
+                logging.error("engine process is unhealthy, restarting it.")
+                engine = await self.restart(engine)
+            return engine
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def checkin(self, engine):
+        self.idle.append(engine)
+        self.slots.release()
+
+    async def restart(self, engine):
+        """Replace a dead engine while keeping its checkout slot."""
+        self.restarts += 1
+        self.kill(engine)
+        engine = await self.spawn()
+        self.spawned += 1
+        return engine
+
+    def kill(self, engine):
+        try:
+            engine.transport.kill()
+        except Exception:
+            pass
+        self.spawned -= 1
+
+    def discard(self, engine):
+        self.kill(engine)
+        self.slots.release()
+
+    async def with_engine(self, search, op, background=False):
+        if background:
+            # Runs on the pool's loop, so the count needs no lock.
+            if self.background_running >= self.background_size:
+                raise EnginePoolBusy(self.path)
+            self.background_running += 1
+        try:
+            return await self.search(search, op)
+        finally:
+            if background:
+                self.background_running -= 1
+
+    async def search(self, search, op):
+        with ENGINE_CHECKOUT_SECONDS.time():
+            engine = await self.checkout()
+        try:
+            with ENGINE_SECONDS.time(op=op):
+                result = await search(engine)
+        except chess.engine.EngineTerminatedError:
+            logging.error("engine process died during a search, retrying on a new process.")
+            try:
+                engine = await self.restart(engine)
+            except BaseException:
+                self.slots.release()
+                raise
+            try:
+                with ENGINE_SECONDS.time(op=op):
+                    result = await search(engine)
+            except BaseException as e:
+                self.release(engine, e)
+                raise
+        except BaseException as e:
+            self.release(engine, e)
+            raise
+        self.checkin(engine)
+        return result
+
+    def release(self, engine, error):
+        """Return the engine of a search that raised error, unless the engine itself failed."""
+        if isinstance(error, chess.engine.EngineError):
+            self.discard(engine)
+        else:
+            # A cancelled command sends "stop", and the engine's next command
+            # waits until the search has ended, so the process can be reused.
+            self.checkin(engine)
+
+    async def run_play(self, board, limit, options):
+        return await self.with_engine(lambda engine: engine.play(board, limit, options=options), "play")
+
+    async def run_analyse(self, board, limit, multipv, background=False):
+        return await self.with_engine(lambda engine: engine.analyse(board, limit, multipv=multipv), "analyse",
+                                      background)
+
+    async def shutdown(self):
+        while self.idle:
+            engine = self.idle.pop()
+            try:
+                await asyncio.wait_for(engine.quit(), self.health_timeout)
+                self.spawned -= 1
+            except Exception:
+                self.kill(engine)
+
+    def close(self):
+        if self.loop is None:
+            return
+        self.submit(self.shutdown()).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.loop = None
+
+
+_engine_pools = {}
+_engine_pools_lock = threading.Lock()
+
+
+def get_engine_pool(path, size=2, options=None, limit=None, background_size=1):
+    """Return the process-wide pool for an engine binary, creating it once."""
+    with _engine_pools_lock:
+        if path not in _engine_pools:
+            _engine_pools[path] = EnginePool(path, size=size, options=options, limit=limit,
+                                             background_size=background_size)
+        return _engine_pools[path]
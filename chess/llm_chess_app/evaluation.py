@@ -0,0 +1,336 @@
+import asyncio
+import csv
+import json
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import chess
+import chess.pgn
+
+from .ai_chess_app import call_player_async
+from .engine_pool import get_engine_pool
+from .move_resolver import resolve_move
+from .position import analyse
+from .tournament import build_player
+
+COLUMNS = ("player", "chunk", "game", "ply", "fen", "played", "move", "legal", "best_move", "best_cp", "move_cp",
+           "cp_loss", "blunder", "seconds", "error")
+# Evaluations are clamped to +-CP_CAP so a missed mate does not swamp the average loss.
+CP_CAP = 1000
+
+
+def default_format():
+    """Parquet when pyarrow is installed, CSV otherwise."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return "csv"
+    return "parquet"
+
+
+def scan_chunks(pgn_path, games_per_chunk):
+    """
+    Yield {"index", "offset", "games"} for consecutive runs of
+    games_per_chunk games, skipping through the file without parsing the
+    moves. Chunks depend only on the file and games_per_chunk, so a resumed
+    run finds the same ones.
+    """
+    with open(pgn_path, encoding="utf-8", errors="replace") as handle:
+        index = 0
+        while True:
+            offset = handle.tell()
+            games = 0
+            while games < games_per_chunk and chess.pgn.skip_game(handle):
+                games += 1
+            if not games:
+                return
+            yield {"index": index, "offset": offset, "games": games}
+            index += 1
+
+
+def sample_positions(task):
+    """
+    Yield (game, ply, board, played move) for the sampled positions of a
+    chunk. Sampling is seeded per game, so a chunk always yields the same
+    positions.
+    """
+    with open(task["pgn_path"], encoding="utf-8", errors="replace") as handle:
+        handle.seek(task["offset"])
+        for game_offset in range(task["games"]):
+            game = chess.pgn.read_game(handle)
+            if game is None:
+                return
+            number = task["games_per_chunk"] * task["index"] + game_offset
+            rng = random.Random(f"{task['seed']}:{number}")
+            board = game.board()
+            sampled = 0
+            for ply, move in enumerate(game.mainline_moves()):
+                if ply >= task["min_ply"] and sampled < task["max_per_game"] and rng.random() < task["sample_rate"]:
+                    sampled += 1
+                    yield number, ply, board.copy(), move
+                board.push(move)
+
+
+def centipawns(score, color):
+    return max(-CP_CAP, min(CP_CAP, score.pov(color).score(mate_score=100 * CP_CAP)))
+
+
+async def evaluate_after(pool, board, move, limit):
+    """Evaluation of board after move, for the side that played it."""
+    after = board.copy(stack=False)
+    after.push(move)
+    outcome = analyse(after).outcome
+    if outcome is not None:
+        return CP_CAP if outcome.winner == board.turn else 0
+    info = await pool.aanalyse(after, limit=limit)
+    return centipawns(info["score"], board.turn)
+
+
+async def evaluate_position(players, pool, task, game, ply, board, played):
+    """Return one row per player for a sampled position."""
+    limit = task["engine_limit"]
+    info = await pool.aanalyse(board, limit=limit)
+    best_cp = centipawns(info["score"], board.turn)
+    best_move = info["pv"][0] if info.get("pv") else None
+    evaluated = {}
+    rows = []
+    for name, player in players:
+        row = dict.fromkeys(COLUMNS, "")
+        row.update(player=name, chunk=task["index"], game=game, ply=ply, fen=board.fen(), played=played.uci(),
+                   best_move=best_move.uci() if best_move else "", best_cp=best_cp, legal=False, blunder=False)
+        start = time.perf_counter()
+        try:
+            raw, _ = await call_player_async(player, board)
+        except Exception as e:
+            row.update(seconds=round(time.perf_counter() - start, 3), error=f"{type(e).__name__}: {e}"[:200])
+            rows.append(row)
+            continue
+        row["seconds"] = round(time.perf_counter() - start, 3)
+        move = resolve_move(board, raw)
+        if move is None:
+            row["move"] = str(raw)[:32]
+            rows.append(row)
+            continue
+        if move not in evaluated:
+            evaluated[move] = best_cp if move == best_move else await evaluate_after(pool, board, move, limit)
+        cp_loss = max(0, best_cp - evaluated[move])
+        row.update(move=move.uci(), legal=True, move_cp=evaluated[move], cp_loss=cp_loss,
+                   blunder=cp_loss >= task["blunder_cp"])
+        rows.append(row)
+    return rows
+
+
+async def evaluate_positions(task):
+    # Created first, so a stockfish player on the same binary shares a pool of this size.
+    pool = get_engine_pool(task["engine_path"], size=task["engine_processes"], limit=task["engine_limit"])
+    players = [(player["name"], build_player(player, task["seed"], task["engine_path"], task["engine_limit"]))
+               for player in task["players"]]
+    positions = sample_positions(task)
+    pending = set()
+    rows = []
+    while True:
+        for position in positions:
+            pending.add(asyncio.ensure_future(evaluate_position(players, pool, task, *position)))
+            if len(pending) >= task["concurrency"]:
+                break
+        if not pending:
+            return rows
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for future in done:
+            rows.extend(future.result())
+
+
+def write_part(rows, path, file_format):
+    """Write rows to path in one go: a crash never leaves half a part behind."""
+    temp_path = f"{path}.tmp"
+    if file_format == "parquet":
+        import pyarrow
+        import pyarrow.parquet
+        table = pyarrow.Table.from_pydict({column: [row[column] for row in rows] for column in COLUMNS})
+        pyarrow.parquet.write_table(table, temp_path)
+    else:
+        with open(temp_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+    os.replace(temp_path, path)
+
+
+def chunk_stats(rows):
+    stats = {}
+    for row in rows:
+        player = stats.setdefault(row["player"], {"positions": 0, "errors": 0, "illegal": 0, "scored": 0,
+                                                 "cp_loss": 0, "blunders": 0, "best": 0, "played": 0, "seconds": 0.0})
+        player["positions"] += 1
+        player["seconds"] += row["seconds"] or 0.0
+        if row["error"]:
+            player["errors"] += 1
+        elif not row["legal"]:
+            player["illegal"] += 1
+        else:
+            player["scored"] += 1
+            player["cp_loss"] += row["cp_loss"]
+            player["blunders"] += row["blunder"]
+            player["best"] += row["move"] == row["best_move"]
+            player["played"] += row["move"] == row["played"]
+    return stats
+
+
+def evaluate_chunk(task):
+    """
+    Evaluate one chunk in a worker process and write its part file.
+
+    Returns:
+        dict: The chunk index, its part file and the per-player counts.
+    """
+    rows = asyncio.run(evaluate_positions(task))
+    path = os.path.join(task["output"], f"part-{task['index']:06d}.{task['format']}")
+    write_part(rows, path, task["format"])
+    return {"chunk": task["index"], "part": os.path.basename(path), "stats": chunk_stats(rows)}
+
+
+def merge_stats(total, stats):
+    for name, counts in stats.items():
+        row = total.setdefault(name, dict.fromkeys(counts, 0))
+        for key, value in counts.items():
+            row[key] += value
+    return total
+
+
+def summary(total):
+    """Rates per player: illegal-move rate, average centipawn loss, blunder rate and agreement."""
+    rows = []
+    for name, counts in total.items():
+        answered = counts["positions"] - counts["errors"]
+        scored = counts["scored"]
+        rows.append({"player": name, "positions": counts["positions"], "errors": counts["errors"],
+                     "illegal_rate": counts["illegal"] / answered if answered else 0.0,
+                     "acpl": counts["cp_loss"] / scored if scored else 0.0,
+                     "blunder_rate": counts["blunders"] / scored if scored else 0.0,
+                     "best_rate": counts["best"] / scored if scored else 0.0,
+                     "played_rate": counts["played"] / scored if scored else 0.0,
+                     "seconds": counts["seconds"] / counts["positions"] if counts["positions"] else 0.0})
+    return sorted(rows, key=lambda row: row["acpl"])
+
+
+class Evaluation:
+    """
+    Scores players' moves against an engine over the games of a PGN file.
+
+    The file is cut into chunks of ``games_per_chunk`` games by byte offset
+    while it is read, and each chunk is evaluated in a worker process that
+    reads only its own games. Only ``workers`` chunks per worker are in
+    flight, so memory does not depend on the size of the file.
+
+    Every finished chunk becomes a part file in ``output`` (Parquet, or CSV
+    without pyarrow) with one row per sampled position and player, and a
+    line in progress.jsonl. A run restarted with the same settings skips
+    the chunks already listed there; manifest.json guards against resuming
+    with different ones.
+
+    Args:
+        pgn_path (str): The games.
+        output (str): Directory of the manifest, progress and part files.
+        players (list): Parsed player specs (see tournament.parse_player_spec).
+        engine_path (str): UCI engine that scores the moves.
+        engine_limit (dict): Search limit of every evaluation, e.g. {"depth": 12}.
+        options: sample_rate, min_ply, max_per_game, games_per_chunk,
+            blunder_cp, seed, concurrency (positions in flight per worker),
+            engine_processes (per worker) and format.
+    """
+
+    def __init__(self, pgn_path, output, players, engine_path, engine_limit, sample_rate=0.1, min_ply=8,
+                 max_per_game=10, games_per_chunk=200, blunder_cp=300, seed=0, concurrency=8, engine_processes=1,
+                 file_format=None):
+        self.output = output
+        self.settings = {"pgn_path": os.path.abspath(pgn_path), "pgn_size": os.path.getsize(pgn_path),
+                         "players": players, "engine_path": engine_path, "engine_limit": engine_limit,
+                         "sample_rate": sample_rate, "min_ply": min_ply, "max_per_game": max_per_game,
+                         "games_per_chunk": games_per_chunk, "blunder_cp": blunder_cp, "seed": seed,
+                         "format": file_format or default_format()}
+        self.run_options = {"concurrency": concurrency, "engine_processes": engine_processes}
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.output, "manifest.json")
+
+    @property
+    def progress_path(self):
+        return os.path.join(self.output, "progress.jsonl")
+
+    def prepare(self):
+        """Create or check the manifest and return the progress of earlier runs, by chunk."""
+        os.makedirs(self.output, exist_ok=True)
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+            if manifest != json.loads(json.dumps(self.settings)):
+                changed = sorted(key for key in self.settings if manifest.get(key) != self.settings[key])
+                raise ValueError(f"{self.output} holds a run with other settings ({', '.join(changed)}); "
+                                 "use a new output directory")
+        else:
+            with open(self.manifest_path, "w") as f:
+                json.dump(self.settings, f, indent=2)
+        done = {}
+        if os.path.exists(self.progress_path):
+            with open(self.progress_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # The last line of a run killed while writing it.
+                        continue
+                    if os.path.exists(os.path.join(self.output, entry["part"])):
+                        done[entry["chunk"]] = entry
+        return done
+
+    def run(self, workers=None, on_chunk=None):
+        """
+        Evaluate every chunk not done yet.
+
+        Args:
+            workers (int): Worker processes, 0 to evaluate in this process.
+            on_chunk: Optional callback called with every finished chunk
+                and whether it was resumed from an earlier run.
+
+        Returns:
+            tuple: (per-player totals, chunks evaluated now, elapsed seconds).
+        """
+        done = self.prepare()
+        total = {}
+        for entry in done.values():
+            merge_stats(total, entry["stats"])
+            if on_chunk is not None:
+                on_chunk(entry, True)
+        start = time.perf_counter()
+        tasks = ({**self.settings, **self.run_options, **chunk, "output": self.output}
+                 for chunk in scan_chunks(self.settings["pgn_path"], self.settings["games_per_chunk"])
+                 if chunk["index"] not in done)
+        evaluated = 0
+        with open(self.progress_path, "a") as progress:
+            for entry in self.evaluate(tasks, workers):
+                progress.write(json.dumps(entry) + "\n")
+                progress.flush()
+                merge_stats(total, entry["stats"])
+                evaluated += 1
+                if on_chunk is not None:
+                    on_chunk(entry, False)
+        return total, evaluated, time.perf_counter() - start
+
+    def evaluate(self, tasks, workers):
+        if workers == 0:
+            yield from map(evaluate_chunk, tasks)
+            return
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            limit = 2 * pool._max_workers
+            pending = set()
+            for task in tasks:
+                pending.add(pool.submit(evaluate_chunk, task))
+                if len(pending) >= limit:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        yield future.result()
+            for future in pending:
+                yield future.result()
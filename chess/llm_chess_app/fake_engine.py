@@ -0,0 +1,79 @@
+"""
+Stand-in UCI engine for tests and load tests without a Stockfish binary.
+
+Plays the first legal move in UCI order. A search takes its movetime, or
+``--think`` seconds without one, unless a ``stop`` arrives first.
+``--crash`` makes it exit on every ``go``, like an engine crashing
+mid-search, and ``--crash-once FILE`` only the first process that finds
+FILE missing, after creating it. Run it by path, e.g.
+    EnginePool([sys.executable, fake_engine.__file__, "--think", "0.5"])
+"""
+import argparse
+import os
+import queue
+import sys
+import threading
+
+import chess
+
+
+def read_commands(commands):
+    for line in sys.stdin:
+        commands.put(line.strip())
+    commands.put("quit")
+
+
+def best_move(board):
+    return min((move.uci() for move in board.legal_moves), default="0000")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--think", type=float, default=0.0, help="seconds a search without movetime takes")
+    parser.add_argument("--crash", action="store_true", help="exit on every search")
+    parser.add_argument("--crash-once", help="file marking that an engine has already crashed")
+    args = parser.parse_args()
+
+    # Read on a thread, so a stop is seen while a search is thinking.
+    commands = queue.Queue()
+    threading.Thread(target=read_commands, args=(commands,), daemon=True).start()
+    board = chess.Board()
+    pending = None
+    while True:
+        command, pending = pending or commands.get(), None
+        if command == "uci":
+            print("id name FakeEngine")
+            print("option name Skill Level type spin default 20 min 0 max 20")
+            print("uciok", flush=True)
+        elif command == "isready":
+            print("readyok", flush=True)
+        elif command.startswith("position"):
+            parts = command.split()
+            end = parts.index("moves") if "moves" in parts else len(parts)
+            board = chess.Board() if parts[1] == "startpos" else chess.Board(" ".join(parts[2:end]))
+            for move in parts[end + 1:]:
+                board.push_uci(move)
+        elif command.startswith("go"):
+            if args.crash:
+                sys.exit(1)
+            if args.crash_once and not os.path.exists(args.crash_once):
+                open(args.crash_once, "w").close()
+                sys.exit(1)
+            parts = command.split()
+            think = int(parts[parts.index("movetime") + 1]) / 1000 if "movetime" in parts else args.think
+            try:
+                # Whatever comes in while thinking ends the search; anything but stop runs next.
+                pending = commands.get(timeout=think) if think else None
+            except queue.Empty:
+                pass
+            if pending == "stop":
+                pending = None
+            move = best_move(board)
+            print(f"info depth 1 multipv 1 score cp 0 pv {move}")
+            print(f"bestmove {move}", flush=True)
+        elif command == "quit":
+            return
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import asyncio
+import contextlib
+import random
+import re
+import threading
+import time
+
+import chess
+
+FEN_PATTERN = re.compile(r"((?:[pnbrqkPNBRQK1-8]+/){7}[pnbrqkPNBRQK1-8]+ [wb] [KQkq-]+ [a-h1-8-]+ \d+ \d+)")
+
+
+class FakeStructuredLLM:
+    """
+    Stand-in for ``llm.with_structured_output(schema)``.
+
+    Reads the FEN out of the prompt and answers with a legal move, sleeping for
+    ``latency`` seconds to mimic a model round trip. A batch costs the same
+    latency as a single prompt, like a backend that batches on the GPU.
+    Streaming yields the move first and then the comment word by word, one
+    word per ``token_latency`` seconds; with ``comment_first`` the comment
+    comes first and the move is then generated in two halves.
+    """
+
+    def __init__(self, schema, backend):
+        self.schema = schema
+        self.backend = backend
+        self.latency = backend.latency
+        self.seed = backend.seed
+        self.token_latency = backend.token_latency
+        self.comment_first = backend.comment_first
+
+    def answer(self, prompt):
+        match = FEN_PATTERN.search(prompt)
+        board = chess.Board(match.group(1)) if match else chess.Board()
+        legal_moves = sorted(move.uci() for move in board.legal_moves)
+        move = random.Random(f"{self.seed}:{board.fen()}").choice(legal_moves)
+        return self.schema(move=move, comment=f"Fake model plays {move} after careful consideration of the position.")
+
+    def invoke(self, prompt):
+        with self.backend.slots:
+            if self.latency:
+                time.sleep(self.latency)
+        return self.answer(prompt)
+
+    async def ainvoke(self, prompt):
+        async with self.backend.aslots:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+        return self.answer(prompt)
+
+    async def astream(self, prompt):
+        async with self.backend.aslots:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            result = self.answer(prompt)
+            move = {} if self.comment_first else {"move": result.move}
+            if move:
+                yield move
+            words = result.comment.split(" ")
+            for i in range(1, len(words) + 1):
+                if self.token_latency:
+                    await asyncio.sleep(self.token_latency)
+                yield {**move, "comment": " ".join(words[:i])}
+            if self.comment_first:
+                yield {"comment": result.comment, "move": result.move[:2]}
+                yield {"comment": result.comment, "move": result.move}
+
+    async def abatch(self, prompts, return_exceptions=False):
+        async with self.backend.aslots:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+        return [self.answer(prompt) for prompt in prompts]
+
+
+class FakeChessLLM:
+    """
+    Deterministic in-process replacement for the Ollama/OpenAI clients returned
+    by ``get_llm``. The same position and seed always produce the same move.
+
+    Args:
+        latency (float): Seconds to wait per call.
+        seed (int): Seed mixed into move selection.
+        concurrency (int): Calls the fake backend serves at once, None for
+            unlimited. A single local model server is close to 1.
+        token_latency (float): Seconds per comment word when streaming.
+        comment_first (bool): Stream the comment before the move.
+    """
+
+    def __init__(self, latency=0.0, seed=0, concurrency=None, token_latency=0.0, comment_first=False):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.comment_first = comment_first
+        self.seed = seed
+        self.model_name = f"fake-{seed}"
+        if concurrency:
+            self.slots = threading.Semaphore(concurrency)
+            self.aslots = asyncio.Semaphore(concurrency)
+        else:
+            self.slots = self.aslots = contextlib.nullcontext()
+
+    def with_structured_output(self, schema):
+        return FakeStructuredLLM(schema, self)
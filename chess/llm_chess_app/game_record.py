@@ -0,0 +1,49 @@
+import chess
+
+# A move packs into 15 bits: from square (6), to square (6), promotion piece type (3).
+SQUARE_BITS = 6
+SQUARE_MASK = (1 << SQUARE_BITS) - 1
+
+
+def encode_move(move):
+    """
+    Pack a move into a 16-bit integer code.
+
+    Args:
+        move (chess.Move | str): The move, as a Move or in UCI notation.
+
+    Returns:
+        int: The move code.
+    """
+    if isinstance(move, str):
+        move = chess.Move.from_uci(move)
+    return move.from_square | move.to_square << SQUARE_BITS | (move.promotion or 0) << 2 * SQUARE_BITS
+
+
+def decode_move(code):
+    """Unpack a move code produced by encode_move."""
+    promotion = code >> 2 * SQUARE_BITS
+    return chess.Move(code & SQUARE_MASK, code >> SQUARE_BITS & SQUARE_MASK, promotion or None)
+
+
+def decode_moves(codes):
+    """Return the UCI strings of a list of move codes."""
+    return [decode_move(code).uci() for code in codes]
+
+
+def iter_board_states(start_fen, codes):
+    """
+    Lazily replay a game record.
+
+    Args:
+        start_fen (str): FEN of the starting position.
+        codes (list): Move codes in play order.
+
+    Yields:
+        str: The FEN of the starting position and after every move.
+    """
+    board = chess.Board(start_fen)
+    yield board.fen()
+    for code in codes:
+        board.push(decode_move(code))
+        yield board.fen()
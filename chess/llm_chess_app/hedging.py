@@ -0,0 +1,43 @@
+import threading
+from collections import deque
+
+
+class LatencyTracker:
+    """
+    Recent call latencies of one model backend, shared by all games using it.
+
+    Only the last ``window`` calls are kept, so the hedge delay follows the
+    backend as it speeds up or slows down.
+
+    Args:
+        window (int): Latencies kept.
+    """
+
+    def __init__(self, window=200):
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def quantile(self, q, min_samples=20):
+        """The q-quantile of the recent latencies, or None while fewer than min_samples are known."""
+        with self.lock:
+            if len(self.samples) < min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def adaptive_delay(tracker, quantile=0.9, default=2.0, min_delay=0.25, max_delay=10.0):
+    """
+    Seconds to wait for a backend before hedging: its ``quantile`` latency,
+    kept within [min_delay, max_delay], and ``default`` until it is known.
+    With quantile 0.9 only the slowest tenth of the calls is hedged, so the
+    hedge adds about a tenth to the cost while cutting the tail.
+    """
+    seconds = tracker.quantile(quantile)
+    if seconds is None:
+        return default
+    return min(max_delay, max(min_delay, seconds))
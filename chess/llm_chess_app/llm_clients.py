@@ -0,0 +1,210 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+import urllib.request
+import weakref
+
+import httpx
+from django.conf import settings
+
+from .fake_llm import FakeChessLLM
+
+OPENAI_MODELS = ('openai-gpt-4o', 'openai-gpt-4o-mini')
+
+
+class LoopAsyncClient(httpx.AsyncClient):
+    """
+    An httpx.AsyncClient that sends through one pooled client per event loop.
+
+    The connections of an AsyncClient belong to the loop that opened them,
+    while a registry outlives loops: evaluation workers call asyncio.run for
+    every chunk. Each loop gets its own client, built with the same
+    arguments, which is closed when the loop shuts down its async generators
+    (asyncio.run does) or by aclose(). The client itself never sends, so it
+    gets a transport without a connection pool.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs, transport=httpx.AsyncBaseTransport())
+        self.kwargs = kwargs
+        # loop -> (client, generator closing it)
+        self.clients = weakref.WeakKeyDictionary()
+
+    async def client(self):
+        loop = asyncio.get_running_loop()
+        entry = self.clients.get(loop)
+        if entry is None:
+            client = httpx.AsyncClient(**self.kwargs)
+            closer = self.close_at_shutdown(loop, client)
+            entry = self.clients[loop] = client, closer
+            # Started, the generator is one the loop closes at shutdown.
+            await closer.__anext__()
+        return entry[0]
+
+    async def close_at_shutdown(self, loop, client):
+        try:
+            yield
+        finally:
+            self.clients.pop(loop, None)
+            await client.aclose()
+
+    async def send(self, request, **kwargs):
+        client = await self.client()
+        return await client.send(request, **kwargs)
+
+    async def aclose(self):
+        entry = self.clients.get(asyncio.get_running_loop())
+        if entry is not None:
+            await entry[1].aclose()
+        await super().aclose()
+
+
+class LLMClientRegistry:
+    """
+    Process-wide model clients shared by every game.
+
+    A client is created once per model, and for OpenAI per API key, and
+    reused by every game that asks for the same one. OpenAI clients share one pooled HTTP
+    client, so games reuse open connections instead of handshaking for each
+    new client; async calls get one pool per event loop (LoopAsyncClient). A client not handed to a new game for ``idle_ttl`` seconds is
+    dropped at the next lookup, together with its attachments (see
+    ``attachment``); games already holding it keep working.
+
+    ``warm_up`` sends a request that makes the backend ready without
+    generating anything. For Ollama that loads the model into memory, for
+    OpenAI it opens a pooled connection. The first move of a game then does
+    not pay for either.
+
+    Args:
+        idle_ttl (float): Seconds a client may stay unused before it is dropped.
+        max_connections (int): Connections in the shared HTTP pool.
+    """
+
+    def __init__(self, idle_ttl=600.0, max_connections=100):
+        self.idle_ttl = idle_ttl
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        # key -> [client, last used, attachments]
+        self.clients = {}
+        self.lock = threading.Lock()
+        self.http_client = None
+        self.http_async_client = None
+        self.created = 0
+        self.reused = 0
+
+    @staticmethod
+    def key(model, api_key):
+        # Only OpenAI clients hold a key: every game shares the other models
+        # whatever key it sends. Keys are never kept in the clear.
+        if model not in OPENAI_MODELS:
+            return model, ''
+        return model, hashlib.sha256(str(api_key).encode()).hexdigest()
+
+    def get(self, model, api_key=''):
+        """Return the client for model and api_key, or None for an unknown model."""
+        key = self.key(model, api_key)
+        now = time.monotonic()
+        with self.lock:
+            self.evict(now)
+            entry = self.clients.get(key)
+            if entry is not None:
+                entry[1] = now
+                self.reused += 1
+                return entry[0]
+            llm = self.create(model, api_key)
+            if llm is not None:
+                self.clients[key] = [llm, now, {}]
+                self.created += 1
+            return llm
+
+    def create(self, model, api_key):
+        if model in OPENAI_MODELS:
+            from langchain_openai import OpenAI
+            if self.http_client is None:
+                self.http_client = httpx.Client(limits=self.limits)
+                self.http_async_client = LoopAsyncClient(limits=self.limits)
+            return OpenAI(model_name=model, openai_api_key=api_key, http_client=self.http_client,
+                          http_async_client=self.http_async_client)
+        if model == 'ollama-llama3.1':
+            from langchain_experimental.llms.ollama_functions import OllamaFunctions
+            # Keeping the model loaded lets Ollama reuse the shared prompt prefix.
+            return OllamaFunctions(model="llama3.1", temperature=0.1, output='json', keep_alive=settings.OLLAMA_KEEP_ALIVE)
+        if model == 'fake' and settings.FAKE_LLM_LATENCY is not None:
+            return FakeChessLLM(latency=settings.FAKE_LLM_LATENCY)
+        return None
+
+    def attachment(self, llm, name, factory):
+        """
+        Return the object registered under name for a client of this
+        registry, creating it with factory() on first use. It is dropped with
+        the client, e.g. a batch scheduler bound to it.
+        """
+        with self.lock:
+            for entry in self.clients.values():
+                if entry[0] is llm:
+                    attachments = entry[2]
+                    if name not in attachments:
+                        attachments[name] = factory()
+                    return attachments[name]
+        # Not one of ours: nothing to share it with.
+        return factory()
+
+    def evict(self, now):
+        for key, (llm, last_used, _) in list(self.clients.items()):
+            if now - last_used > self.idle_ttl:
+                del self.clients[key]
+
+    def warm_up(self, model, api_key='', background=True):
+        """
+        Create the client for model and make its backend ready, in a daemon
+        thread unless background is False. Failures are logged, not raised:
+        the first real request will report them.
+        """
+        llm = self.get(model, api_key)
+        if llm is None:
+            logging.error(f"cannot warm up unknown model {model!r}.")
+            return None
+        if not background:
+            self.ping(model, llm, api_key)
+        else:
+            threading.Thread(target=self.ping, args=(model, llm, api_key), name=f"warm-up-{model}", daemon=True).start()
+        return llm
+
+    def ping(self, model, llm, api_key):
+        start = time.perf_counter()
+        try:
+            if model in OPENAI_MODELS:
+                base_url = (llm.openai_api_base or "https://api.openai.com/v1").rstrip("/")
+                self.http_client.get(f"{base_url}/models/{llm.model_name}",
+                                     headers={"Authorization": f"Bearer {api_key}"}).raise_for_status()
+            elif model == 'ollama-llama3.1':
+                # A generate request without a prompt only loads the model.
+                request = urllib.request.Request(f"{llm.base_url}/api/generate", method="POST",
+                                                 data=json.dumps({"model": llm.model, "keep_alive": llm.keep_alive}).encode(),
+                                                 headers={"Content-Type": "application/json"})
+                with urllib.request.urlopen(request, timeout=300) as response:
+                    response.read()
+        except Exception as e:
+            logging.error(f"warm-up of {model} failed: {e}")
+            return
+        logging.info(f"warmed up {model} in {time.perf_counter() - start:.2f}s.")
+
+    def stats(self):
+        with self.lock:
+            return {"clients": len(self.clients), "created": self.created, "reused": self.reused}
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_llm_registry():
+    """Return the process-wide registry, creating it on first use."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = LLMClientRegistry(idle_ttl=settings.LLM_CLIENT_IDLE_TTL,
+                                          max_connections=settings.LLM_HTTP_MAX_CONNECTIONS)
+        return _registry
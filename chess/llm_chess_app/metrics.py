@@ -0,0 +1,104 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds, from a cached board check up to a slow model call.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+FILL_BUCKETS = (0.1, 0.25, 0.5, 0.75, 0.9, 1.0)
+
+_registry = []
+
+
+class Histogram:
+    """
+    Prometheus-style histogram with labels.
+
+    Observations are kept as cumulative bucket counts plus a sum and count per
+    label combination, so memory does not grow with traffic. Values are per
+    process; every worker serves its own /api/metrics.
+
+    Args:
+        name (str): Metric name, e.g. "chess_node_seconds".
+        documentation (str): The HELP text.
+        labelnames (tuple): Label names, in the order values are rendered.
+        buckets (tuple): Upper bounds of the buckets, ascending.
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = [(key, list(counts), total) for key, (counts, total) in sorted(self.series.items())]
+        for key, counts, total in series:
+            labels = [f'{name}="{escape(value)}"' for name, value in zip(self.labelnames, key)]
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else repr(float(bound))
+                bucket_labels = ",".join(labels + ['le="%s"' % le])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            suffix = f"{{{','.join(labels)}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total!r}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return "\n".join(lines)
+
+
+def escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render():
+    """Return every registered metric in the Prometheus text format."""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+def estimate_tokens(text):
+    # About four characters per token for English text and FENs; the backends
+    # do not report usage through structured output.
+    return max(1, round(len(text) / 4)) if text else 0
+
+
+NODE_SECONDS = Histogram("chess_node_seconds", "Time spent in each game graph node.", ("node",))
+LLM_SECONDS = Histogram("chess_llm_request_seconds", "Model call latency.", ("model", "mode"))
+LLM_PROMPT_TOKENS = Histogram("chess_llm_prompt_tokens", "Estimated prompt tokens per model call.", ("model",), TOKEN_BUCKETS)
+LLM_COMPLETION_TOKENS = Histogram("chess_llm_completion_tokens", "Estimated completion tokens per model call.", ("model",), TOKEN_BUCKETS)
+LLM_BATCH_SIZE = Histogram("chess_llm_batch_size", "Prompts per batched model call.", ("model",), BATCH_SIZE_BUCKETS)
+LLM_BATCH_FILL = Histogram("chess_llm_batch_fill", "Prompts per batched model call as a fraction of LLM_BATCH_SIZE.", ("model",), FILL_BUCKETS)
+MOVE_RETRIES = Histogram("chess_ai_move_retries", "Extra player calls needed for a legal AI move.", (), COUNT_BUCKETS)
+ENGINE_SECONDS = Histogram("chess_engine_seconds", "Engine search time, excluding the wait for a free process.", ("op",))
+ENGINE_CHECKOUT_SECONDS = Histogram("chess_engine_checkout_seconds", "Wait for a free engine process.")
+CHECKPOINT_SECONDS = Histogram("chess_checkpoint_seconds", "Checkpoint reads and writes.", ("op",))
+WEBSOCKET_SECONDS = Histogram("chess_websocket_seconds", "Websocket message handling and sends.", ("direction", "message"))
+PONDER_SECONDS = Histogram("chess_ponder_seconds", "Wait for a pondered AI reply; outcome is hit (ready), wait (still running) or miss.", ("outcome",))
+HEDGE_SECONDS = Histogram("chess_hedge_seconds", "Hedged move latency by the backend that answered; outcome is direct (no hedge sent), hedged or failed.", ("backend", "outcome"))
@@ -0,0 +1,134 @@
+import json
+import random
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import chess
+
+from .move_resolver import resolve_move
+from .position import analyse
+
+
+class MoveCache:
+    """
+    Transposition cache of model answers.
+
+    Entries are keyed by the Zobrist hash of the position, the model name and
+    the prompt version, so a changed prompt or model never reuses stale
+    answers. Recently used positions live in an in-memory LRU; every entry is
+    also written to a SQLite file when ``path`` is given, so the cache
+    survives restarts and is shared by the workers on one box.
+
+    Up to ``max_variants`` different answers are kept per position and a hit
+    picks one at random. With probability ``explore`` a lookup is reported as
+    a miss anyway, which sends the position to the model and grows the set
+    of variants, keeping play varied.
+
+    Args:
+        path (str): SQLite file backing the cache, or None for memory only.
+        max_entries (int): Positions kept in the in-memory tier.
+        max_variants (int): Answers kept per position.
+        explore (float): Probability of bypassing a hit.
+    """
+
+    def __init__(self, path=None, max_entries=100000, max_variants=4, explore=0.0, seed=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_variants = max_variants
+        self.explore = explore
+        self.random = random.Random(seed)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(str(path), check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS moves (key TEXT PRIMARY KEY, variants TEXT NOT NULL)")
+            self.db.commit()
+
+    @staticmethod
+    def key(board, model, prompt_version):
+        return f"{analyse(board).zobrist:016x}:{model}:{prompt_version}"
+
+    def get(self, board, model, prompt_version):
+        """
+        Look up a cached answer for a position.
+
+        Returns:
+            tuple: (move, comment), or None on a miss.
+        """
+        key = self.key(board, model, prompt_version)
+        with self.lock:
+            variants = self.load(key)
+            if variants and self.random.random() >= self.explore:
+                move, comment = self.random.choice(variants)
+                # Guard against hash collisions and malformed stored moves.
+                if self.is_legal(analyse(board), move):
+                    self.hits += 1
+                    return move, comment
+            self.misses += 1
+            return None
+
+    def put(self, board, model, prompt_version, move, comment):
+        """
+        Store a model answer for a position as the UCI of the legal move it
+        names ("Nf3" and "g1f3" are one variant). Answers that name no legal
+        move are not stored.
+        """
+        move = resolve_move(board, move)
+        if move is None:
+            return
+        key = self.key(board, model, prompt_version)
+        move = move.uci()
+        position = analyse(board)
+        with self.lock:
+            # Drop variants stored before answers were normalized.
+            variants = [variant for variant in self.load(key) or [] if self.is_legal(position, variant[0])]
+            if any(known == move for known, _ in variants):
+                return
+            variants = (variants + [(move, comment)])[-self.max_variants:]
+            self.remember(key, variants)
+            if self.db is not None:
+                self.db.execute("INSERT OR REPLACE INTO moves (key, variants) VALUES (?, ?)", (key, json.dumps(variants)))
+                self.db.commit()
+
+    @staticmethod
+    def is_legal(position, move):
+        try:
+            return position.is_legal(chess.Move.from_uci(move))
+        except ValueError:
+            return False
+
+    def load(self, key):
+        variants = self.entries.get(key)
+        if variants is not None:
+            self.entries.move_to_end(key)
+            return variants
+        if self.db is None:
+            return None
+        row = self.db.execute("SELECT variants FROM moves WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        variants = [tuple(variant) for variant in json.loads(row[0])]
+        self.remember(key, variants)
+        return variants
+
+    def remember(self, key, variants):
+        self.entries[key] = variants
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.entries)}
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
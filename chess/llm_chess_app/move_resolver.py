@@ -0,0 +1,137 @@
+import re
+import threading
+from collections import Counter
+
+import chess
+
+from .metrics import MOVE_RETRIES
+from .position import analyse
+
+SQUARE_PAIR = re.compile(r"\b([kqrbnp])?\s*([a-h][1-8])\s*(?:-|x|:|to|takes|captures|→|->)?\s*([a-h][1-8])\s*(?:=|/|\()?\s*([qrbn])?\b")
+PIECE_TO_SQUARE = re.compile(r"\b(king|queen|rook|bishop|knight|pawn)\b.*?\b([a-h][1-8])\b")
+SQUARE = re.compile(r"\b([a-h][1-8])\b")
+TOKEN = re.compile(r"[A-Za-z0-9=+#\-]+")
+KINGSIDE = re.compile(r"\b(o-o|0-0)\b(?!-)|\b(king ?side|short)\b.*castl|castl\w*\s+(king ?side|short)")
+QUEENSIDE = re.compile(r"\b(o-o-o|0-0-0)\b|\b(queen ?side|long)\b.*castl|castl\w*\s+(queen ?side|long)")
+PIECE_NAMES = {"king": chess.KING, "queen": chess.QUEEN, "rook": chess.ROOK, "bishop": chess.BISHOP,
+               "knight": chess.KNIGHT, "pawn": chess.PAWN}
+
+# Histogram of how many extra player calls each AI move needed.
+retry_counts = Counter()
+_retry_lock = threading.Lock()
+
+
+def resolve_move(board, raw):
+    """
+    Map raw player output onto a legal move of ``board``.
+
+    Understands UCI ("e2e4", "e7e8q"), long algebraic ("Ng1-f3", "e2xe4"),
+    SAN ("Nf3", "exd5", "O-O"), free text ("e2 to e4", "knight to f3",
+    "castle kingside") and a lone destination square when only one piece can
+    go there. A missing promotion piece defaults to a queen.
+
+    Args:
+        board (chess.Board): The position the move is played in.
+        raw (str | chess.Move): The player's output.
+
+    Returns:
+        chess.Move: The matching legal move, or None if nothing matches.
+    """
+    position = analyse(board)
+    if isinstance(raw, chess.Move):
+        return raw if position.is_legal(raw) else None
+    if not raw:
+        return None
+    text = str(raw).strip().strip("\"'`.")
+    lowered = text.lower()
+
+    for match in SQUARE_PAIR.finditer(lowered):
+        move = legal_move(board, match.group(2), match.group(3), match.group(4))
+        if move is not None:
+            return move
+
+    move = castling_move(board, lowered)
+    if move is not None:
+        return move
+
+    named = PIECE_TO_SQUARE.findall(lowered)
+    for name, square in named:
+        move = unique_move(board, chess.parse_square(square), PIECE_NAMES[name])
+        if move is not None:
+            return move
+    # Text naming a piece ("bishop to c4") must not fall back to a move of
+    # another piece, such as the pawn move its bare square reads as in SAN.
+    piece_types = {PIECE_NAMES[name] for name, _ in named}
+
+    for token in TOKEN.findall(text):
+        move = san_move(board, token)
+        if move is not None and (not piece_types or board.piece_type_at(move.from_square) in piece_types):
+            return move
+
+    if piece_types:
+        return None
+    squares = SQUARE.findall(lowered)
+    if len(squares) == 1:
+        return unique_move(board, chess.parse_square(squares[0]))
+    return None
+
+
+def legal_move(board, from_name, to_name, promotion=None):
+    from_square = chess.parse_square(from_name)
+    to_square = chess.parse_square(to_name)
+    promotion = chess.Piece.from_symbol(promotion).piece_type if promotion else None
+    position = analyse(board)
+    move = chess.Move(from_square, to_square, promotion)
+    if position.is_legal(move):
+        return move
+    if promotion is None:
+        move = chess.Move(from_square, to_square, chess.QUEEN)
+        if position.is_legal(move):
+            return move
+    return None
+
+
+def castling_move(board, lowered):
+    for pattern, kingside in ((QUEENSIDE, False), (KINGSIDE, True)):
+        if pattern.search(lowered):
+            for move in analyse(board).legal_moves:
+                if board.is_castling(move) and board.is_kingside_castling(move) == kingside:
+                    return move
+    return None
+
+
+def san_move(board, token):
+    token = token.rstrip("+#")
+    candidates = [token]
+    # Models often lower-case piece letters ("nf3"); "bxc4" is tried as a pawn first.
+    if token[:1] in "kqrbn":
+        candidates.append(token[0].upper() + token[1:])
+    for candidate in candidates:
+        try:
+            return board.parse_san(candidate)
+        except ValueError:
+            continue
+    return None
+
+
+def unique_move(board, to_square, piece_type=None):
+    moves = [move for move in analyse(board).legal_moves
+             if move.to_square == to_square
+             and (piece_type is None or board.piece_type_at(move.from_square) == piece_type)
+             and move.promotion in (None, chess.QUEEN)]
+    return moves[0] if len(moves) == 1 else None
+
+
+def record_retries(retries):
+    MOVE_RETRIES.observe(retries)
+    with _retry_lock:
+        retry_counts[retries] += 1
+
+
+def retry_stats():
+    """Return the retries-per-move histogram and the share of moves that needed none."""
+    with _retry_lock:
+        counts = dict(sorted(retry_counts.items()))
+    moves = sum(counts.values())
+    return {"moves": moves, "retries": sum(retries * count for retries, count in counts.items()),
+            "first_try_rate": counts.get(0, 0) / moves if moves else 0.0, "histogram": counts}
@@ -0,0 +1,99 @@
+import random
+import struct
+from collections import Counter
+
+import chess
+import chess.pgn
+import chess.polyglot
+
+ENTRY_STRUCT = struct.Struct(">QHHI")
+
+
+class OpeningBook:
+    """
+    Polyglot opening book.
+
+    The ``.bin`` file is memory-mapped by python-chess, so opening a book is
+    cheap, lookups are a binary search and the pages are shared by every game
+    and worker on the machine.
+
+    Args:
+        path (str): Path of the Polyglot book.
+        max_ply (int): Stop consulting the book after this many plies.
+        weighted (bool): Pick moves proportionally to their weight instead of
+            always playing the most common one.
+    """
+
+    def __init__(self, path, max_ply=None, weighted=True, seed=None):
+        self.path = path
+        self.max_ply = max_ply
+        self.weighted = weighted
+        self.random = random.Random(seed)
+        self.reader = chess.polyglot.open_reader(path)
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, board):
+        """
+        Return a book move for the position, or None if it is out of book.
+        """
+        if self.max_ply is not None and board.ply() >= self.max_ply:
+            return None
+        entries = list(self.reader.find_all(board))
+        if not entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self.weighted:
+            return self.random.choices(entries, weights=[entry.weight for entry in entries])[0].move
+        return max(entries, key=lambda entry: entry.weight).move
+
+    def close(self):
+        self.reader.close()
+
+
+def polyglot_move(board, move):
+    """Encode a move the way Polyglot stores it (castling as king takes rook)."""
+    to_square = move.to_square
+    if board.is_castling(move):
+        rook_file = 7 if board.is_kingside_castling(move) else 0
+        to_square = chess.square(rook_file, chess.square_rank(move.from_square))
+    promotion = move.promotion - 1 if move.promotion else 0
+    return to_square | move.from_square << 6 | promotion << 12
+
+
+def build_book(pgn_paths, output_path, max_ply=16, min_count=1):
+    """
+    Build a Polyglot book from PGN files.
+
+    Every (position, move) pair among the first ``max_ply`` plies of every
+    game is counted and written with its count as the weight. Games are read
+    one at a time, so the input can be much larger than memory.
+
+    Args:
+        pgn_paths (list): PGN files to read.
+        output_path (str): Where to write the ``.bin`` book.
+        max_ply (int): Plies of each game to include.
+        min_count (int): Drop moves seen fewer times than this.
+
+    Returns:
+        tuple: (games read, entries written).
+    """
+    counts = Counter()
+    games = 0
+    for pgn_path in pgn_paths:
+        with open(pgn_path, encoding="utf-8", errors="replace") as pgn:
+            while (game := chess.pgn.read_game(pgn)) is not None:
+                games += 1
+                board = game.board()
+                for ply, move in enumerate(game.mainline_moves()):
+                    if ply >= max_ply:
+                        break
+                    counts[chess.polyglot.zobrist_hash(board), polyglot_move(board, move)] += 1
+                    board.push(move)
+
+    entries = sorted((key, raw_move, min(count, 0xFFFF)) for (key, raw_move), count in counts.items() if count >= min_count)
+    with open(output_path, "wb") as book:
+        for key, raw_move, weight in entries:
+            book.write(ENTRY_STRUCT.pack(key, raw_move, weight, 0))
+    return games, len(entries)
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import threading
+import time
+
+import chess
+
+from .engine_pool import EnginePoolBusy
+from .metrics import PONDER_SECONDS
+from .position import analyse
+
+PIECE_VALUES = {chess.PAWN: 1, chess.KNIGHT: 3, chess.BISHOP: 3, chess.ROOK: 5, chess.QUEEN: 9, chess.KING: 0}
+CENTER = chess.SquareSet(chess.BB_CENTER)
+
+
+def score_reply(board, move):
+    """
+    Rough likelihood that a player picks ``move``: recaptures and other
+    captures of valuable pieces first, then promotions, checks, castling and
+    development towards the center. Moves onto squares the opponent attacks
+    and the mover does not defend rank last.
+    """
+    piece = board.piece_at(move.from_square)
+    score = 0
+    if board.is_capture(move):
+        victim = board.piece_at(move.to_square)
+        score += 10 * (PIECE_VALUES[victim.piece_type] if victim else 1) - PIECE_VALUES[piece.piece_type]
+        if board.move_stack and board.peek().to_square == move.to_square:
+            score += 20
+    if move.promotion:
+        score += 8 * PIECE_VALUES[move.promotion]
+    if board.gives_check(move):
+        score += 5
+    if board.is_castling(move):
+        score += 4
+    if move.to_square in CENTER:
+        score += 1
+    if piece.piece_type in (chess.KNIGHT, chess.BISHOP) and chess.square_rank(move.from_square) in (0, 7):
+        score += 2
+    if board.is_attacked_by(not board.turn, move.to_square) and not board.is_attacked_by(board.turn, move.to_square):
+        score -= 3 * PIECE_VALUES[piece.piece_type] + 1
+    return score
+
+
+def likely_replies(board, width):
+    """Return up to width likely moves for the side to move, by score_reply."""
+    return sorted(analyse(board).legal_moves, key=lambda move: score_reply(board, move), reverse=True)[:width]
+
+
+async def predict_replies(board, width):
+    return likely_replies(board, width)
+
+
+def engine_predictor(pool, limit=None):
+    """
+    Predict replies with an EnginePool's multi-PV search, a background
+    search within the pool's share for them, falling back to predict_replies
+    when that share is in use or the engine is unavailable.
+    """
+    async def predict(board, width):
+        try:
+            infos = await pool.aanalyse(board, limit=limit, multipv=width, background=True)
+        except EnginePoolBusy:
+            return await predict_replies(board, width)
+        except Exception as e:
+            logging.error(f"engine reply prediction failed, using heuristics: {e}")
+            return await predict_replies(board, width)
+        return [info["pv"][0] for info in infos if info.get("pv")]
+    return predict
+
+
+class PonderBudget:
+    """
+    Process-wide cap on speculative player calls, so pondering for many
+    games cannot crowd out the moves users are actually waiting for.
+    Speculation that does not fit is skipped, never queued.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.running = 0
+        self.lock = threading.Lock()
+
+    def try_acquire(self):
+        with self.lock:
+            if self.running >= self.limit:
+                return False
+            self.running += 1
+            return True
+
+    def release(self):
+        with self.lock:
+            self.running -= 1
+
+
+class Ponderer:
+    """
+    Thinks on the user's time.
+
+    After the AI has moved, ``start`` predicts the user's ``width`` most
+    likely replies and computes the AI's answer to each in background tasks.
+    When the user plays one of them, ``played`` cancels the others and
+    ``take`` hands over the answer, already finished if the user took longer
+    than the model. Any other reply cancels everything and the AI thinks as
+    usual. Tasks belong to the event loop that called ``start``.
+
+    Args:
+        play: Coroutine function returning the player's (move, comment) for a board.
+        width (int): Replies to ponder after each AI move; 0 disables pondering.
+        budget (PonderBudget): Shared cap on running speculative calls.
+        predictor: Coroutine function (board, width) -> likely moves,
+            predict_replies by default.
+    """
+
+    def __init__(self, play, width=3, budget=None, predictor=None):
+        self.play = play
+        self.width = width
+        self.budget = budget or PonderBudget(width)
+        self.predictor = predictor or predict_replies
+        self.predicting = None
+        # FEN after the user's reply -> task computing the answer
+        self.tasks = {}
+
+    def start(self, board):
+        """Start pondering the position after the AI move, the user to move."""
+        self.cancel()
+        if self.width > 0 and analyse(board).outcome is None:
+            self.predicting = asyncio.ensure_future(self.ponder(board.copy()))
+
+    async def ponder(self, board):
+        for move in await self.predictor(board, self.width):
+            board.push(move)
+            if analyse(board).outcome is None:
+                if not self.budget.try_acquire():
+                    board.pop()
+                    break
+                task = asyncio.ensure_future(self.play(board.copy()))
+                # Released however the task ends, even if cancelled before it ran.
+                task.add_done_callback(lambda task: self.budget.release())
+                self.tasks[board.fen()] = task
+            board.pop()
+
+    def played(self, board):
+        """The user moved to board: keep only the answer to that position."""
+        if self.predicting is None and not self.tasks:
+            return
+        task = self.tasks.pop(board.fen(), None)
+        self.cancel()
+        if task is None:
+            PONDER_SECONDS.observe(0.0, outcome="miss")
+        else:
+            self.tasks[board.fen()] = task
+
+    async def take(self, board):
+        """
+        Return the pondered (move, comment) for board, or None when it was
+        not pondered. Either way nothing is left running afterwards.
+        """
+        start = time.perf_counter()
+        pondering = self.predicting is not None or self.tasks
+        task = self.tasks.pop(board.fen(), None)
+        self.cancel()
+        if task is None:
+            if pondering:
+                PONDER_SECONDS.observe(0.0, outcome="miss")
+            return None
+        outcome = "hit" if task.done() else "wait"
+        try:
+            result = await task
+        except Exception as e:
+            logging.error(f"pondered move failed: {e}")
+            return None
+        PONDER_SECONDS.observe(time.perf_counter() - start, outcome=outcome)
+        return result
+
+    def cancel(self):
+        if self.predicting is not None:
+            self.predicting.cancel()
+            self.predicting = None
+        for task in self.tasks.values():
+            task.cancel()
+        self.tasks = {}
@@ -0,0 +1,107 @@
+import weakref
+from functools import cached_property, partial
+
+import chess
+import chess.polyglot
+
+
+def position_key(board):
+    """Everything a Position depends on, cheap to read from the board."""
+    return (board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings,
+            board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK], board.turn, board.castling_rights,
+            board.ep_square, board.halfmove_clock, board.fullmove_number, len(board.move_stack))
+
+
+class Position:
+    """
+    What a ply needs to know about the position on a board, each computed at
+    most once.
+
+    board_node checks whether the game is over, the prompt lists the legal
+    moves, make_move validates the answer and the move cache hashes the
+    position. Position generates the legal moves a single time for all of
+    them and caches the FEN, outcome, SAN and hash alike. Get it with
+    analyse(board): a push or any other change of the board makes the next
+    call start a new one.
+    """
+
+    def __init__(self, board, key):
+        # Weak, so the cache below does not keep the board alive; the
+        # callback drops the board's entry once it is collected.
+        self.board_ref = weakref.ref(board, partial(_forget, id(board)))
+        self.key = key
+
+    @property
+    def board(self):
+        return self.board_ref()
+
+    @cached_property
+    def legal_moves(self):
+        return list(self.board.generate_legal_moves())
+
+    @cached_property
+    def legal_set(self):
+        return frozenset(self.legal_moves)
+
+    @cached_property
+    def uci(self):
+        return [move.uci() for move in self.legal_moves]
+
+    @cached_property
+    def san(self):
+        return [self.board.san(move) for move in self.legal_moves]
+
+    @cached_property
+    def fen(self):
+        return self.board.fen()
+
+    @cached_property
+    def zobrist(self):
+        return chess.polyglot.zobrist_hash(self.board)
+
+    @cached_property
+    def is_check(self):
+        return self.board.is_check()
+
+    @cached_property
+    def outcome(self):
+        """The chess.Outcome if the game is over, as Board.outcome() decides it, else None."""
+        board = self.board
+        if not self.legal_moves and self.is_check:
+            return chess.Outcome(chess.Termination.CHECKMATE, not board.turn)
+        if board.is_insufficient_material():
+            return chess.Outcome(chess.Termination.INSUFFICIENT_MATERIAL, None)
+        if not self.legal_moves:
+            return chess.Outcome(chess.Termination.STALEMATE, None)
+        if board.halfmove_clock >= 150:
+            return chess.Outcome(chess.Termination.SEVENTYFIVE_MOVES, None)
+        if board.is_repetition(5):
+            return chess.Outcome(chess.Termination.FIVEFOLD_REPETITION, None)
+        return None
+
+    def is_legal(self, move):
+        if "legal_moves" in self.__dict__:
+            return move in self.legal_set
+        # Checking one move is cheaper than generating all of them.
+        return self.board.is_legal(move)
+
+
+# id(board) -> the last Position of that board. A chess.Board compares by
+# value and is unhashable, so it cannot key a WeakKeyDictionary; this is
+# one keyed on identity instead.
+_positions = {}
+
+
+def _forget(board_id, board_ref):
+    position = _positions.get(board_id)
+    if position is not None and position.board_ref is board_ref:
+        del _positions[board_id]
+
+
+def analyse(board):
+    """Return the Position of board, reusing the last one while the board is unchanged."""
+    key = position_key(board)
+    position = _positions.get(id(board))
+    if position is None or position.board_ref() is not board or position.key != key:
+        position = _positions[id(board)] = Position(board, key)
+    return position
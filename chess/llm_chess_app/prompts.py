@@ -0,0 +1,83 @@
+import chess
+
+from .metrics import estimate_tokens
+from .position import analyse
+
+
+class PromptBuilder:
+    """
+    Builds the prompt ChessAgent sends for a position.
+
+    The aim is fewer tokens per call: the position is given as FEN with the
+    legal moves in SAN, which is shorter than UCI and is the notation models
+    see most, after a short fixed ``prefix`` of instructions. The prefix is
+    far below the length providers need before they cache a prompt, so it
+    saves nothing there; a local server such as Ollama may still reuse it.
+    Answers may come back in SAN or UCI: resolve_move reads either, and only
+    the resolved legal move is cached.
+
+    Args:
+        history (int): Number of recent plies to list in SAN, 0 for none.
+            The model sees the game's direction without the whole move list.
+    """
+
+    # Bump whenever the prompt text changes so cached answers are not reused.
+    version = 3
+    prefix = ("You are a chess expert. Given a chess position and its legal moves in SAN, answer with one of the "
+              "legal moves and a short comment on it.\n\n")
+
+    def __init__(self, history=0):
+        self.history = history
+
+    @property
+    def key(self):
+        """Version of the prompts, including options that change their text."""
+        return f"{self.version}h{self.history}" if self.history else str(self.version)
+
+    @property
+    def prefix_tokens(self):
+        return estimate_tokens(self.prefix)
+
+    def build(self, board):
+        return self.prefix + self.position(board)
+
+    def position(self, board):
+        position = analyse(board)
+        lines = [f"FEN: {position.fen}", f"To move: {'white' if board.turn == chess.WHITE else 'black'}"]
+        recent = self.recent_moves(board)
+        if recent:
+            lines.append(f"Last moves: {recent}")
+        lines.append(f"Legal moves: {' '.join(position.san)}")
+        return "\n".join(lines)
+
+    def recent_moves(self, board):
+        plies = min(self.history, len(board.move_stack))
+        if not plies:
+            return ""
+        start = board.copy(stack=plies)
+        for _ in range(plies):
+            start.pop()
+        return start.variation_san(board.move_stack[-plies:])
+
+
+class LegacyPromptBuilder(PromptBuilder):
+    """
+    The original prompt: the FEN and every legal move in UCI, rebuilt whole
+    for every call. Kept to compare prompts in tournaments.
+    """
+
+    version = 1
+    prefix = ""
+    template = ("You are a chess expert, the current board's Forsyth–Edwards notation (FEN) is {board_state}, and it's {turn} turn. \n"
+                "                Possible next moves are: {legal_moves}. Please make next move based on current board position.")
+
+    def __init__(self, history=0):
+        super().__init__(history=0)
+
+    def position(self, board):
+        position = analyse(board)
+        return self.template.format(board_state=position.fen, turn='white' if board.turn == chess.WHITE else 'black',
+                                    legal_moves=", ".join(position.uci))
+
+
+PROMPT_BUILDERS = {"compact": PromptBuilder, "legacy": LegacyPromptBuilder}
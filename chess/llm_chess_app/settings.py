@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -56,6 +57,8 @@ MIDDLEWARE = [
 ]
 
 CORS_ORIGIN_ALLOW_ALL = True
+# No CORS headers for the analyze endpoint: it is for scripts, not other sites.
+CORS_URLS_REGEX = r'^(?!/api/analyze).*$'
 ROOT_URLCONF = 'llm_chess_app.urls'
 
 TEMPLATES = [
@@ -84,7 +87,8 @@ ASGI_APPLICATION = 'llm_chess_app.asgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # Workers of one host share this file; CHESS_DATABASE_PATH moves it.
+        'NAME': os.environ.get('CHESS_DATABASE_PATH', BASE_DIR / 'db.sqlite3'),
     }
 }
 
@@ -129,3 +133,115 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Transposition cache of LLM moves (llm_chess_app/move_cache.py).
+# Set MOVE_CACHE_PATH to None to keep the cache in memory only.
+MOVE_CACHE_PATH = BASE_DIR / 'move_cache.sqlite3'
+MOVE_CACHE_MAX_ENTRIES = 100000
+# Probability of asking the model even when a cached answer exists.
+MOVE_CACHE_EXPLORE = 0.1
+
+# Polyglot opening book played before asking the model (llm_chess_app/opening_book.py).
+# Build one with `python manage.py build_opening_book games.pgn --output book.bin`.
+OPENING_BOOK_PATH = None
+OPENING_BOOK_MAX_PLY = 16
+
+# Cross-game micro-batching of model requests (llm_chess_app/batching.py).
+# Off by default: the Ollama and OpenAI clients have no batch endpoint, so a
+# batch is still one call per prompt and only adds the wait below. Turn it on
+# for a backend whose abatch is a single request (e.g. the fake model).
+LLM_BATCHING = os.environ.get('LLM_BATCHING', '') == '1'
+LLM_BATCH_SIZE = 16
+# Seconds a request may wait for others to join its batch.
+LLM_BATCH_MAX_WAIT = 0.005
+
+# UCI engine players shared through a process pool (llm_chess_app/engine_pool.py).
+STOCKFISH_PATH = os.environ.get('STOCKFISH_PATH', 'stockfish')
+ENGINE_POOL_SIZE = 2
+# Default search limit; a start message may override depth, nodes or time.
+ENGINE_LIMIT = {'time': 0.05}
+# Engines that background searches (PONDER_PREDICTOR = 'engine') may hold at
+# once; games keep the rest of the pool.
+ENGINE_BACKGROUND_SIZE = 1
+
+# In-process fake model for load tests (llm_chess_app/fake_llm.py). Setting
+# FAKE_LLM_LATENCY (seconds per call) lets clients start games with model 'fake'.
+FAKE_LLM_LATENCY = float(os.environ['FAKE_LLM_LATENCY']) if os.environ.get('FAKE_LLM_LATENCY') else None
+
+# Write-behind persistence of games and moves (chessapi/recorder.py).
+GAME_RECORDING = True
+GAME_RECORDER_BATCH_SIZE = 200
+# Seconds an event may wait before its batch is written.
+GAME_RECORDER_FLUSH_INTERVAL = 0.5
+
+# Game checkpoints (llm_chess_app/checkpointer.py). Games kept at once in
+# process memory, the least recently played dropped first.
+CHECKPOINT_MAX_THREADS = int(os.environ.get('CHESS_CHECKPOINT_MAX_THREADS', 10000))
+# Seconds a game may go without a move before its checkpoints are dropped.
+CHECKPOINT_TTL = float(os.environ.get('CHESS_CHECKPOINT_TTL', 6 * 60 * 60))
+# Checkpoints kept per game; a game only resumes from its latest one.
+CHECKPOINT_KEEP = int(os.environ.get('CHESS_CHECKPOINT_KEEP', 4))
+
+# Shared state for running several workers behind one load balancer. Set
+# CHESS_CHECKPOINT_PATH so every worker keeps game checkpoints in one SQLite
+# file, and CHESS_CHANNEL_LAYER_PATH so their consumers can message each
+# other. Workers on several hosts need channels_redis.core.RedisChannelLayer
+# instead.
+CHECKPOINT_PATH = os.environ.get('CHESS_CHECKPOINT_PATH')
+CHANNEL_LAYER_PATH = os.environ.get('CHESS_CHANNEL_LAYER_PATH')
+if CHANNEL_LAYER_PATH:
+    CHANNEL_LAYERS = {'default': {'BACKEND': 'llm_chess_app.channel_layer.SQLiteChannelLayer',
+                                  'CONFIG': {'path': CHANNEL_LAYER_PATH}}}
+else:
+    CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+# How long Ollama keeps the model loaded between moves, so it is not loaded
+# again for every move.
+OLLAMA_KEEP_ALIVE = '30m'
+
+# Model clients shared by all games (llm_chess_app/llm_clients.py).
+# Used when a start message names an unknown model.
+DEFAULT_LLM_MODEL = 'ollama-llama3.1'
+# Seconds a client may go without being handed to a new game before it is dropped.
+LLM_CLIENT_IDLE_TTL = 600
+# Connections in the HTTP pool shared by the OpenAI clients.
+LLM_HTTP_MAX_CONNECTIONS = 100
+# Models readied when the ASGI server starts, e.g. ['ollama-llama3.1'].
+# OpenAI models are skipped: their clients use the key each game sends.
+LLM_WARM_UP = [model for model in os.environ.get('LLM_WARM_UP', '').split(',') if model]
+
+# Hedged model requests (create_hedged_player in llm_chess_app/ai_chess_app.py).
+# When a game's model has not answered after the hedge delay, the position is
+# also sent to this model and the first legal move wins. A start message may
+# name another one as llm_config['hedge_model']; '' turns hedging off.
+LLM_HEDGE_MODEL = os.environ.get('LLM_HEDGE_MODEL', '')
+# The delay is this quantile of the model's recent latencies (the last
+# LLM_HEDGE_WINDOW calls), within the bounds, and LLM_HEDGE_DELAY until
+# enough calls are known.
+LLM_HEDGE_QUANTILE = 0.9
+LLM_HEDGE_WINDOW = 200
+LLM_HEDGE_DELAY = 2.0
+LLM_HEDGE_MIN_DELAY = 0.25
+LLM_HEDGE_MAX_DELAY = 10.0
+
+# Pondering for model games whose client sends 'ponder': true (llm_chess_app/ponder.py).
+# Stockfish games never ponder: a search is as quick as a hit would be, and
+# speculative searches would hold the shared engines.
+# Likely user replies answered in advance after each AI move; 0 turns it off.
+PONDER_WIDTH = 3
+# Speculative player calls running at once in this process, over all games.
+PONDER_MAX_TASKS = 16
+# 'heuristic', or 'engine' to predict replies with a multi-PV search on the
+# engine pool (needs STOCKFISH_PATH).
+PONDER_PREDICTOR = 'heuristic'
+PONDER_ENGINE_LIMIT = {'time': 0.02}
+
+# Batch analysis over POST /api/analyze (llm_chess_app/analysis.py).
+# Positions analysed at once per request, unless the request asks for fewer or more.
+ANALYSIS_CONCURRENCY = 16
+ANALYSIS_MAX_CONCURRENCY = 64
+# Longer batches are cut off; the summary line then says truncated.
+ANALYSIS_MAX_POSITIONS = 100000
+# Largest JSON body analyze reads, in place of DATA_UPLOAD_MAX_MEMORY_SIZE
+# (2.5 MB). FENs sent one per line or as PGN are streamed and have no limit.
+ANALYSIS_MAX_JSON_BYTES = 64 * 1024 * 1024
@@ -0,0 +1,236 @@
+import contextlib
+import datetime
+import functools
+import itertools
+import math
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import chess
+import chess.pgn
+
+from .ai_chess_app import (Chess, ChessAgent, create_color_player, create_engine_ai_player, create_llm_ai_player,
+                           create_opening_book_player, create_random_player, get_moves)
+from .engine_pool import get_engine_pool
+from .opening_book import OpeningBook
+from .prompts import PROMPT_BUILDERS
+
+RESULTS = {"white": "1-0", "black": "0-1", "draw": "1/2-1/2"}
+SCORES = {"1-0": 1.0, "0-1": 0.0, "1/2-1/2": 0.5}
+
+
+def parse_player_spec(spec):
+    """
+    Parse a player spec such as ``random``, ``stockfish:skill=3,depth=8``,
+    ``llm:model=ollama-llama3.1`` or ``fake:latency=0.1,seed=2``.
+
+    Options are comma separated ``key=value`` pairs; ``name=`` sets the label
+    used in the PGN and the standings (the spec itself by default). Model
+    players also take ``prompt=compact|legacy`` and ``history=N`` to compare
+    prompts.
+
+    Returns:
+        dict: {"kind", "name", **options} with numeric values converted.
+    """
+    kind, _, rest = spec.partition(":")
+    if kind not in ("random", "stockfish", "llm", "fake"):
+        raise ValueError(f"unknown player kind {kind!r} in {spec!r}")
+    player = {"kind": kind, "name": spec}
+    for option in filter(None, rest.split(",")):
+        key, sep, value = option.partition("=")
+        if not sep:
+            raise ValueError(f"expected key=value, got {option!r} in {spec!r}")
+        player[key.strip()] = number(value.strip())
+    if player.get("prompt", "compact") not in PROMPT_BUILDERS:
+        raise ValueError(f"unknown prompt {player['prompt']!r} in {spec!r}, expected one of {', '.join(PROMPT_BUILDERS)}")
+    return player
+
+
+def number(value):
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+@functools.lru_cache(maxsize=None)
+def get_agent(kind, model, latency, seed, prompt="compact", history=0):
+    # One client per worker process and model, shared by all of its games.
+    prompt_builder = PROMPT_BUILDERS[prompt](history=history)
+    if kind == "fake":
+        from .fake_llm import FakeChessLLM
+        return ChessAgent(FakeChessLLM(latency=latency, seed=seed), prompt_builder=prompt_builder)
+    from .chessllm import get_llm
+    llm = get_llm({"model": model, "api_key": os.environ.get("OPENAI_API_KEY", "")})
+    if llm is None:
+        raise ValueError(f"unknown model {model!r}")
+    return ChessAgent(llm, prompt_builder=prompt_builder)
+
+
+def build_player(player, seed, engine_path, engine_limit):
+    kind = player["kind"]
+    if kind == "random":
+        return create_random_player(f"{player.get('seed', 0)}:{seed}")
+    if kind == "stockfish":
+        limit = {key: player[key] for key in ("depth", "nodes", "time") if key in player} or None
+        options = {"Skill Level": player["skill"]} if "skill" in player else None
+        pool = get_engine_pool(player.get("path", engine_path), size=1, limit=engine_limit)
+        return create_engine_ai_player(pool, limit=limit, options=options)
+    agent = get_agent(kind, player.get("model", "ollama-llama3.1"), player.get("latency", 0.0), player.get("seed", 0),
+                      player.get("prompt", "compact"), player.get("history", 0))
+    return create_llm_ai_player(agent)
+
+
+def play_game(task):
+    """
+    Play one game in a worker process.
+
+    Args:
+        task (dict): index, round, white, black (parsed player specs),
+            max_plies, start_fen, seed, book_path, engine_path, engine_limit.
+
+    Returns:
+        dict: The task's index, round and player names plus start_fen, moves
+        (UCI), result, termination, plies and elapsed seconds.
+    """
+    players = []
+    for player in (task["white"], task["black"]):
+        player = build_player(player, task["seed"], task["engine_path"], task["engine_limit"])
+        if task["book_path"]:
+            player = create_opening_book_player(player, get_book(task["book_path"]))
+        players.append(player)
+
+    start = time.perf_counter()
+    chess_app = Chess(ai_player=create_color_player(*players), board_state=task["start_fen"],
+                      comment=False, max_moves=task["max_plies"] - 1)
+    config = {"configurable": {"thread_id": f"tournament-{task['index']}"}, "recursion_limit": 4 * task["max_plies"] + 16}
+    chess_app.set_config(config)
+    # board_node prints every position; keep the workers quiet.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        state = chess_app.invoke()
+    elapsed = time.perf_counter() - start
+
+    winner = state["winner"]
+    moves = get_moves(state)
+    return {"index": task["index"], "round": task["round"], "white": task["white"]["name"],
+            "black": task["black"]["name"], "start_fen": state["start_fen"], "moves": moves,
+            "result": RESULTS.get(winner, "1/2-1/2"), "termination": "normal" if winner else "adjudication",
+            "plies": len(moves), "elapsed": elapsed}
+
+
+@functools.lru_cache(maxsize=None)
+def get_book(path):
+    return OpeningBook(path)
+
+
+def schedule(players, games_per_pair, max_plies, start_fen=None, seed=0, book_path=None,
+             engine_path="stockfish", engine_limit=None):
+    """
+    Build the task list of a round robin: every pair of players meets
+    ``games_per_pair`` times with colors alternating.
+    """
+    tasks = []
+    for (a, b) in itertools.combinations(players, 2):
+        for round_index in range(games_per_pair):
+            white, black = (a, b) if round_index % 2 == 0 else (b, a)
+            tasks.append({"index": len(tasks), "round": round_index + 1, "white": white, "black": black,
+                          "max_plies": max_plies, "start_fen": start_fen, "seed": f"{seed}:{len(tasks)}",
+                          "book_path": book_path, "engine_path": engine_path, "engine_limit": engine_limit})
+    return tasks
+
+
+def write_pgn(result, pgn_file, event="LLM Chessmaster tournament"):
+    board = chess.Board(result["start_fen"])
+    for move in result["moves"]:
+        board.push_uci(move)
+    game = chess.pgn.Game.from_board(board)
+    game.headers.update({"Event": event, "Site": "?", "Date": datetime.date.today().strftime("%Y.%m.%d"),
+                         "Round": str(result["round"]), "White": result["white"], "Black": result["black"],
+                         "Result": result["result"], "Termination": result["termination"],
+                         "PlyCount": str(result["plies"])})
+    print(game, file=pgn_file, end="\n\n")
+    pgn_file.flush()
+
+
+def run_tournament(tasks, workers=None, pgn_path=None, on_result=None):
+    """
+    Play all tasks on a process pool, appending each finished game to
+    ``pgn_path`` as soon as it completes.
+
+    Args:
+        tasks (list): Tasks from schedule.
+        workers (int): Worker processes, 0 to play in this process.
+        pgn_path (str): PGN file to append to, or None.
+        on_result: Optional callback called with every finished game.
+
+    Returns:
+        tuple: (results, elapsed wall seconds).
+    """
+    results = []
+    start = time.perf_counter()
+    with contextlib.ExitStack() as stack:
+        pgn_file = stack.enter_context(open(pgn_path, "a", encoding="utf-8")) if pgn_path else None
+        if workers == 0:
+            finished = map(play_game, tasks)
+        else:
+            pool = stack.enter_context(ProcessPoolExecutor(max_workers=workers))
+            finished = (future.result() for future in as_completed([pool.submit(play_game, task) for task in tasks]))
+        for result in finished:
+            results.append(result)
+            if pgn_file is not None:
+                write_pgn(result, pgn_file)
+            if on_result is not None:
+                on_result(result)
+    return results, time.perf_counter() - start
+
+
+def standings(results, anchor=1500.0, iterations=500):
+    """
+    Score table with Bradley-Terry ratings on the Elo scale.
+
+    Ratings are the maximum likelihood fit of all results (draws count half),
+    so they do not depend on the order games finished in. Every pair that met
+    gets one extra virtual draw, which keeps a perfect score finite. The
+    average rating is ``anchor``.
+
+    Returns:
+        list: One dict per player (name, games, wins, draws, losses, score,
+        elo), best first.
+    """
+    table = {}
+    pair_games = Counter()
+    for result in results:
+        for name in (result["white"], result["black"]):
+            table.setdefault(name, {"name": name, "games": 0, "wins": 0, "draws": 0, "losses": 0, "score": 0.0})
+        score = SCORES[result["result"]]
+        for name, points in ((result["white"], score), (result["black"], 1.0 - score)):
+            row = table[name]
+            row["games"] += 1
+            row["score"] += points
+            row["wins" if points == 1.0 else "losses" if points == 0.0 else "draws"] += 1
+        pair_games[frozenset((result["white"], result["black"]))] += 1
+
+    pair_games = {pair: games + 1 for pair, games in pair_games.items() if len(pair) == 2}
+    points = {name: row["score"] for name, row in table.items()}
+    for pair in pair_games:
+        for name in pair:
+            points[name] += 0.5
+
+    strength = dict.fromkeys(table, 1.0)
+    for _ in range(iterations):
+        updated = {}
+        for name in table:
+            denominator = sum(games / (strength[name] + strength[other])
+                              for pair, games in pair_games.items() if name in pair
+                              for other in pair if other != name)
+            updated[name] = points[name] / denominator if denominator else strength[name]
+        mean_log = sum(math.log(value) for value in updated.values()) / len(updated)
+        strength = {name: value / math.exp(mean_log) for name, value in updated.items()}
+
+    for name, row in table.items():
+        row["elo"] = anchor + 400 * math.log10(strength[name])
+    return sorted(table.values(), key=lambda row: row["elo"], reverse=True)